@@ -1,20 +1,51 @@
 import os
+import json
+import hmac
+import base64
 import logging
 import datetime
 import time
 import traceback
+import tracemalloc
 import threading
+import uuid
+from functools import partial
+from contextlib import ExitStack
+from concurrent.futures import ThreadPoolExecutor
 
-from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify
+# 載入計時起點（與 Config.BOOT_TIME_BUDGET 比較）
+_import_started = time.perf_counter()
+
+from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, Response, stream_with_context, g
 from flask_caching import Cache, logger
 from config import Config
-from utils.scraper import get_company_data, get_status
-from utils.data_processor import parse_range, prepare_chart_data, prepare_yearly_comparison_data
-from utils.database import Database
-from utils.auth import login_user, register_user
+from utils.scraper import (
+    get_company_data, get_status, fetch_and_process, crawl_scheduler, INTERACTIVE, PREFETCH, BACKFILL
+)
+from utils.data_processor import prepare_chart_data, prepare_yearly_comparison_data, prepare_all_charts
+from utils.database import get_db
+from utils.auth import login_user, register_user, admin_required
+from utils.coalescer import RequestCoalescer
+from utils.downsample import downsample_chart
+from utils.records import record_sort_key, to_records, to_dicts
+from utils.encoded_response import EncodedResponse
+from utils.metrics import metrics
+from utils import tracing
+from utils import profiler
+from utils import page_parser
+from utils.memory_budget import (
+    memory_budget, simple_cache_layer, estimate_size, process_rss, cgroup_memory, tracemalloc_snapshot
+)
+from utils.exporter import stream_csv, stream_parquet, parquet_available
+from utils.pagination import paginate_sorted, parse_page_size
+from utils.company_index import company_index, init_company_registry
+from utils.query_planner import (
+    QueryPlanner, UserQuota, QueryRejected, AsyncJobRequired, QuotaExceeded, REJECT, JOB, current_roc_year
+)
+from utils.prefetcher import QueryPrefetcher, parse_hours
 
-# 引入 Flask-Dance Google OAuth 模組
-from flask_dance.contrib.google import make_google_blueprint, google
+# 配置日誌（各模組只取得 logger，由 app 統一設定一次）
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 
 # 建立 Flask 應用，並從 Config 載入設定（config.py 中已使用 dotenv 載入環境變數）
 app = Flask(__name__)
@@ -30,25 +61,51 @@ cache_config = {
 app.config.from_mapping(cache_config)
 cache = Cache(app)
 
-# 建立 Google OAuth Blueprint
+# 建立 Google OAuth Blueprint（僅在設定 GOOGLE_CLIENT_ID 時載入 Flask-Dance 與 OAuth 模組）
 # 注意：此處使用 .env 中的 GOOGLE_CLIENT_ID 與 GOOGLE_CLIENT_SECRET
-google_bp = make_google_blueprint(
-    client_id=os.environ.get("GOOGLE_CLIENT_ID"),
-    client_secret=os.environ.get("GOOGLE_CLIENT_SECRET"),
-    scope=["openid", "https://www.googleapis.com/auth/userinfo.email", "https://www.googleapis.com/auth/userinfo.profile"],
-    # 設定的 redirect_url 必須與 Google Cloud Console 中已授權的重導向 URI 完全一致，
-    # 例如：http://localhost:5000/google_login_callback
-    redirect_url="/google_login_callback",
-    reprompt_consent=True,  # 新增這個參數
+GOOGLE_LOGIN_ENABLED = bool(os.environ.get("GOOGLE_CLIENT_ID"))
+if GOOGLE_LOGIN_ENABLED:
+    # 引入 Flask-Dance Google OAuth 模組
+    from flask_dance.contrib.google import make_google_blueprint
+
+    google_bp = make_google_blueprint(
+        client_id=os.environ.get("GOOGLE_CLIENT_ID"),
+        client_secret=os.environ.get("GOOGLE_CLIENT_SECRET"),
+        scope=["openid", "https://www.googleapis.com/auth/userinfo.email", "https://www.googleapis.com/auth/userinfo.profile"],
+        # 設定的 redirect_url 必須與 Google Cloud Console 中已授權的重導向 URI 完全一致，
+        # 例如：http://localhost:5000/google_login_callback
+        redirect_url="/google_login_callback",
+        reprompt_consent=True,  # 新增這個參數
+    )
+    # 註冊 Blueprint，預設授權路徑會變成 /login/google/authorized
+    app.register_blueprint(google_bp, url_prefix="/login")
+app.jinja_env.globals['google_login_enabled'] = GOOGLE_LOGIN_ENABLED
+
+# 資料庫：app、爬蟲與用戶驗證共用同一個實例（DATABASE_DIR 環境變數，預設為應用內的 data 資料夾）
+db = get_db()
+
+# 公司名錄：首次啟動由 stock_list.js 匯入資料庫，之後由爬蟲收錄新公司
+init_company_registry(db, os.path.join(app.root_path, 'static', 'js', 'stock_list.js'))
+
+def serialize_company_result(result):
+    """查詢結果寫入租約表前，將 RevenueRecord 轉為字典"""
+    return dict(result, data=to_dicts(result['data']))
+
+def deserialize_company_result(result):
+    """從租約表讀回的查詢結果還原為 RevenueRecord"""
+    return dict(result, data=to_records(result['data']))
+
+# 相同查詢的並行請求合併器（跨 worker 透過資料庫租約表協調）
+coalescer = RequestCoalescer(
+    db, serialize=serialize_company_result, deserialize=deserialize_company_result
 )
-# 註冊 Blueprint，預設授權路徑會變成 /login/google/authorized
-app.register_blueprint(google_bp, url_prefix="/login")
 
-# 初始化資料庫：如果環境變數中有 DATABASE_DIR 則使用之，否則預設於應用內的 data 資料夾
-db_base_path = os.environ.get('DATABASE_DIR', os.path.join(app.root_path, 'data'))
-os.makedirs(db_base_path, exist_ok=True)
-db_path = os.path.join(db_base_path, 'data.db')
-db = Database(db_path)
+# 查詢成本規劃、每位用戶的同時查詢配額與背景查詢工作執行緒
+planner = QueryPlanner(db, Config, company_index)
+# 配額以資料庫租約表計數，所有 gunicorn worker 共用同一個上限
+user_quota = UserQuota(app.config['MAX_CONCURRENT_QUERIES_PER_USER'], db=db, name='query')
+export_quota = UserQuota(app.config['MAX_CONCURRENT_EXPORTS_PER_USER'], label='匯出', db=db, name='export')
+job_executor = ThreadPoolExecutor(max_workers=1)
 
 # 系統狀態與初始化資訊
 system_status = {
@@ -56,25 +113,90 @@ system_status = {
     'is_initializing': True,
     'startup_count': 0,
     'last_ping': None,
-    'error_count': 0
+    'error_count': 0,
+    'warmup': None,
+    'boot_seconds': None
 }
 
+# 健康檢查的資料庫
+HEALTH_DATABASES = (('database', db),)
+
 def initialize_system():
-    """執行系統初始化流程"""
+    """
+    執行系統初始化流程：檢查資料庫連線、啟動頁面解析行程，並以熱門查詢預熱快取
+
+    每個 worker 載入時於背景執行；完成前 /health/ready 返回 503。
+    """
+    started = time.perf_counter()
     system_status['startup_time'] = datetime.datetime.now()
     system_status['is_initializing'] = True
     system_status['startup_count'] += 1
     logging.info("系統啟動中...")
-    time.sleep(0.5)  # 模擬連接資料庫
-    logging.info("資料庫連接成功")
-    time.sleep(0.5)  # 模擬載入配置
-    logging.info("應用程式配置載入完成")
-    time.sleep(0.5)  # 模擬檢查快取
-    logging.info("資料快取檢查完成")
-    system_status['is_initializing'] = False
-    logging.info(f"系統啟動完成，這是第 {system_status['startup_count']} 次啟動")
+    try:
+        for name, database in HEALTH_DATABASES:
+            if database.ping():
+                logging.info(f"資料庫連接成功: {name}")
+        page_parser.warm_up()
+        # 啟動時不向公開資訊觀測站抓取，只預熱資料已有效的熱門查詢
+        system_status['warmup'] = prefetcher.run_once(
+            app.config['WARMUP_QUERIES'], app.config['WARMUP_HISTORY_DAYS'], upstream_budget=0
+        )
+        logging.info(f"資料快取預熱完成: {system_status['warmup']}")
+    except Exception as e:
+        logging.error(f"系統初始化時出錯: {e}")
+    finally:
+        system_status['is_initializing'] = False
+    logging.info(f"系統啟動完成（{time.perf_counter() - started:.2f} 秒），這是第 {system_status['startup_count']} 次啟動")
     return True
 
+def prefetch_query(company_ids_input, year_range_input, month_range_input, refreshed=False):
+    """
+    建立查詢的快取：查詢結果、完整與首頁分頁回應，以及前端預設選項的圖表回應
+
+    Args:
+        refreshed (bool): 資料剛重新抓取，捨棄快取中的舊結果後重新計算
+
+    Returns:
+        int: 結果筆數
+    """
+    if refreshed:
+        # 捨棄舊結果（含租約表中保留的結果）與其產生時間；圖表快取鍵包含產生時間，重新計算後不再取用舊圖表
+        cache_key = company_result_cache_key(company_ids_input, year_range_input, month_range_input)
+        cache.delete_many(cache_key, f"{cache_key}_generated_at")
+        coalescer.discard(cache_key)
+    result, from_cache = load_company_result(company_ids_input, year_range_input, month_range_input,
+                                             allow_async=False)
+    get_encoded_result(result, from_cache)
+    get_encoded_page(result, from_cache, app.config['PREFETCH_PAGE_SIZE'], None)
+
+    # 圖表端點以 cache.cached 快取，於請求情境中呼叫即寫入快取
+    # （max_points 為 static/js/modules/chart-manager.js 的預設值：桌面不降採樣、行動裝置 60 點）
+    for max_points in (None, 60):
+        options = {'result_id': result['result_id']}
+        if max_points:
+            options['max_points'] = max_points
+        views = [('/api/revenue-chart', get_revenue_chart, options),
+                 ('/api/growth-rate-chart', get_growth_rate_chart, options)]
+        views.extend(
+            ('/api/yearly-comparison-chart', get_yearly_comparison_chart, dict(options, company_id=company_id))
+            for company_id in dict.fromkeys(record.company_id for record in result['data'])
+        )
+        for path, view, body in views:
+            with app.test_request_context(path, method='POST', json=body):
+                view()
+    return len(result['data'])
+
+# 熱門查詢預先抓取：離峰時段於上游預算內更新資料並建立快取，啟動時也以此預熱（不抓取）
+prefetcher = QueryPrefetcher(
+    db, planner,
+    refresh=partial(fetch_and_process, priority=PREFETCH, user_key='prefetch'),
+    warm=prefetch_query,
+    max_age_days=app.config['REVENUE_MAX_AGE_DAYS'],
+    half_life_days=app.config['PREFETCH_HALF_LIFE_DAYS'],
+    # 以抓取排程器的實際抓取數計算預算（含失敗的抓取；同一期間其他查詢的抓取也會計入，偏保守）
+    fetch_count=lambda: crawl_scheduler.stats['fetched'] + crawl_scheduler.stats['failed']
+)
+
 # 傳統帳號密碼登入路由
 @app.route('/login', methods=['GET', 'POST'])
 def login():
@@ -221,6 +343,10 @@ def register():
 # Google OAuth 回呼路由
 @app.route('/google_login_callback')
 def google_login_callback():
+    if not GOOGLE_LOGIN_ENABLED:
+        flash("尚未設定 Google 登入", "error")
+        return redirect(url_for("login"))
+    from flask_dance.contrib.google import google
     # 若尚未授權，轉到 Google 登入流程
     if not google.authorized:
         return redirect(url_for("google.login"))
@@ -258,21 +384,47 @@ def google_login_callback():
 # 首頁路由
 @app.route('/')
 def index():
-    if system_status['startup_time'] is None:
-        initialize_system()
-        return redirect(url_for('startup'))
     if system_status['is_initializing']:
         return redirect(url_for('startup'))
     if 'user_id' not in session:
         return redirect(url_for('login'))
-    # 取得該用戶的查詢歷史（假設 db.get_query_history 依據 user_id 返回資料）
-    query_history = db.get_query_history(user_id=session.get('user_id'))
-    return render_template('index.html', query_history=query_history)
+    # 取得該用戶最近的查詢歷史（第一頁），其餘由 /api/query-history 分頁載入
+    query_history, history_cursor = db.get_query_history(
+        user_id=session.get('user_id'), page_size=app.config['QUERY_HISTORY_PAGE_SIZE']
+    )
+    industries, markets = company_index.facets()
+    return render_template(
+        'index.html', query_history=query_history, history_cursor=history_cursor,
+        industries=industries, markets=markets, parquet_available=parquet_available()
+    )
 @app.route('/startup')
 def startup():
     if system_status['startup_time'] is not None and not system_status['is_initializing']:
         return redirect(url_for('index'))
     return render_template('startup.html')
+# 健康檢查：live 只確認行程可回應，ready 確認初始化完成、資料庫與快取可用
+@app.route('/health/live', methods=['GET'])
+def health_live():
+    return jsonify({'status': 'alive', 'pid': os.getpid()})
+
+@app.route('/health/ready', methods=['GET'])
+def health_ready():
+    checks = {name: database.ping() for name, database in HEALTH_DATABASES}
+    try:
+        cache.set('health_check', os.getpid(), timeout=60)
+        checks['cache'] = cache.get('health_check') == os.getpid()
+    except Exception as e:
+        logger.error(f"快取檢查失敗: {e}")
+        checks['cache'] = False
+    checks['initialized'] = not system_status['is_initializing']
+    ready = all(checks.values())
+    return jsonify({
+        'status': 'ready' if ready else 'not_ready',
+        'pid': os.getpid(),
+        'checks': checks,
+        'warmup': system_status['warmup']
+    }), 200 if ready else 503
+
 # 保活 API 端點
 @app.route('/api/keep-alive', methods=['GET'])
 def keep_alive():
@@ -285,6 +437,138 @@ def keep_alive():
         'uptime': str(datetime.datetime.now() - system_status['startup_time']) if system_status['startup_time'] else None
     })
 
+# ---- 請求追蹤 ----
+# 每個 API 請求一個 trace：回應附上 X-Trace-Id 與 Server-Timing（各階段耗時彙總），
+# 並依設定匯出至本機檔案或 OTLP 收集器
+@app.before_request
+def start_request_trace():
+    if app.config['TRACING_ENABLED'] and request.path.startswith('/api/'):
+        g.trace_root = tracing.start_trace(
+            f'{request.method} {request.url_rule.rule if request.url_rule else request.path}',
+            traceparent=request.headers.get('traceparent'), path=request.path
+        )
+
+@app.after_request
+def finish_request_trace(response):
+    root = g.pop('trace_root', None)
+    if root is not None:
+        root.set_attribute('status', response.status_code)
+        root.end()
+        response.headers['X-Trace-Id'] = root.trace.trace_id
+        if app.config['SERVER_TIMING']:
+            response.headers['Server-Timing'] = tracing.server_timing(root)
+        tracing.export(root)
+    return response
+
+@app.teardown_request
+def discard_request_trace(exc):
+    # 未處理的例外不會經過 after_request，仍需結束並匯出
+    root = g.pop('trace_root', None)
+    if root is not None:
+        root.end(error=exc)
+        tracing.export(root)
+
+# ---- 記憶體預算 ----
+# 登錄各層快取（依回收優先順序）；超出預算時由背景檢查回收，/api/admin/memory 查看用量
+memory_budget.configure(
+    budget_bytes=app.config['MEMORY_BUDGET_MB'] * 1024 * 1024 or None,
+    high_watermark=app.config['MEMORY_HIGH_WATERMARK']
+)
+memory_budget.register('flask_cache', *simple_cache_layer(cache.cache))
+memory_budget.register('db_cache', db.memory_cache_entries, db.estimate_memory_cache_bytes, db.evict_memory_cache)
+memory_budget.register(
+    'crawl_pages', crawl_scheduler.page_entries, crawl_scheduler.estimate_page_bytes, crawl_scheduler.evict_pages
+)
+# 以下只統計、不回收
+memory_budget.register(
+    'write_behind_pending',
+    lambda: db._write_queue.pending_count() if db._write_queue else 0,
+    lambda: estimate_size(list(db._write_queue._pending.values())) if db._write_queue else 0
+)
+memory_budget.register('company_index', lambda: len(company_index), lambda: estimate_size(company_index._state))
+
+# 效能指標（Prometheus 文字格式，每個 gunicorn worker 各自統計）
+metrics.register_gauge('app_errors', '路由累計錯誤數', lambda: system_status['error_count'])
+metrics.register_gauge(
+    'app_uptime_seconds', '自初始化起經過的秒數',
+    lambda: (datetime.datetime.now() - system_status['startup_time']).total_seconds()
+)
+metrics.register_gauge('app_boot_seconds', 'app 模組載入耗時', lambda: system_status['boot_seconds'])
+metrics.register_gauge('company_index_size', '公司名錄筆數', lambda: len(company_index))
+metrics.register_gauge('process_resident_memory_bytes', '行程常駐記憶體', process_rss)
+metrics.register_gauge('cgroup_memory_usage_bytes', '容器記憶體用量', lambda: cgroup_memory()[0])
+metrics.register_gauge('flask_cache_entries', 'Flask 快取項目數', lambda: len(cache.cache._cache))
+metrics.register_gauge('crawl_queued_pages', '抓取排程器排隊中的頁面數', lambda: sum(crawl_scheduler.status()['queued'].values()))
+metrics.register_gauge('crawl_active_fetches', '抓取排程器抓取中的頁面數', lambda: crawl_scheduler.status()['active'])
+metrics.register_gauge('write_behind_failed_batches', '延遲寫入重試後仍失敗的批次數', lambda: db.write_failures()['batches'])
+metrics.register_gauge('write_behind_failed_items', '延遲寫入重試後仍失敗的筆數', lambda: db.write_failures()['items'])
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    token = app.config['METRICS_TOKEN']
+    if token and not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return jsonify({'error': '未授權'}), 401
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+# 對目前的 worker 取樣分析 N 秒，返回 collapsed stack（可用 flamegraph.pl 或 speedscope 開啟）
+@app.route('/api/admin/profile', methods=['GET'])
+@admin_required
+def profile_worker():
+    try:
+        seconds = float(request.args.get('seconds', 10))
+        interval = float(request.args.get('interval', 0.01))
+        if not 0 < seconds <= app.config['PROFILE_MAX_SECONDS']:
+            raise ValueError(f"seconds 必須介於 0 與 {app.config['PROFILE_MAX_SECONDS']} 之間")
+        if not 0.001 <= interval <= 1:
+            raise ValueError('interval 必須介於 0.001 與 1 之間')
+
+        result = profiler.profile(seconds, interval, include_idle=request.args.get('idle') == '1')
+        if result is None:
+            return jsonify({'error': '此 worker 正在進行取樣分析，請稍後再試'}), 409
+
+        filename = f"profile-{os.getpid()}-{datetime.datetime.now().strftime('%Y%m%d%H%M%S')}.collapsed"
+        response = Response(result.collapsed(), mimetype='text/plain')
+        response.headers['Content-Disposition'] = f'attachment; filename={filename}'
+        response.headers['X-Profile-Samples'] = str(result.sample_count)
+        response.headers['X-Profile-Idle-Samples'] = str(result.idle_count)
+        return response
+
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        system_status['error_count'] += 1
+        logger.error(f"取樣分析時出錯: {e}")
+        return jsonify({'error': str(e)}), 500
+
+# 記憶體用量：各快取層項目數與估計大小、回收紀錄；可啟停 tracemalloc 與手動回收
+@app.route('/api/admin/memory', methods=['GET', 'POST'])
+@admin_required
+def memory_status():
+    try:
+        if request.method == 'POST':
+            data = request.get_json(silent=True) or {}
+            action = data.get('action')
+            if action == 'tracemalloc_start':
+                tracemalloc.start(int(data.get('frames', 1)))
+            elif action == 'tracemalloc_stop':
+                tracemalloc.stop()
+            elif action == 'evict':
+                memory_budget.enforce(force_bytes=int(float(data.get('mb', 0)) * 1024 * 1024))
+            else:
+                raise ValueError('action 必須為 tracemalloc_start、tracemalloc_stop 或 evict')
+
+        status = memory_budget.status()
+        if tracemalloc.is_tracing():
+            status['tracemalloc_top'] = tracemalloc_snapshot(limit=int(request.args.get('limit', 25)))
+        return jsonify(status)
+
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        system_status['error_count'] += 1
+        logger.error(f"獲取記憶體用量時出錯: {e}")
+        return jsonify({'error': str(e)}), 500
+
 # 系統狀態 API 端點
 @app.route('/api/system-status', methods=['GET'])
 def get_system_status():
@@ -295,20 +579,268 @@ def get_system_status():
         'startup_count': system_status['startup_count'],
         'last_ping': system_status['last_ping'].strftime('%Y-%m-%d %H:%M:%S') if system_status['last_ping'] else None,
         'uptime': str(datetime.datetime.now() - system_status['startup_time']) if system_status['startup_time'] else None,
-        'error_count': system_status['error_count']
+        'error_count': system_status['error_count'],
+        'prefetch': prefetcher.last_run,
+        'crawl': crawl_scheduler.status()
     })
 
+# ---- 查詢結果代號（result_id） ----
+# /api/company-data 回傳 result_id，圖表端點只需送回代號與圖表選項，
+# 由伺服器端取得完整結果（快取未命中時從資料庫重建，不需重新上傳整份資料）
+
+def encode_result_id(company_ids_input, year_range_input, month_range_input):
+    """將查詢參數編碼為不透明的結果代號（跨 worker 皆可解析）"""
+    payload = json.dumps([company_ids_input, year_range_input, month_range_input], ensure_ascii=False)
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_result_id(result_id):
+    """解析結果代號，格式錯誤時拋出 ValueError"""
+    try:
+        padded = result_id + '=' * (-len(result_id) % 4)
+        company_ids_input, year_range_input, month_range_input = json.loads(
+            base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8')
+        )
+    except Exception:
+        raise ValueError('無效的結果代號')
+    return company_ids_input, year_range_input, month_range_input
+
+def current_user_key():
+    """配額與背景工作使用的用戶識別：登入用戶以 ID，未登入以來源 IP"""
+    if session.get('user_id'):
+        return f"user:{session['user_id']}"
+    return f"ip:{request.remote_addr}"
+
+def company_result_cache_key(company_ids_input, year_range_input, month_range_input):
+    """查詢結果的快取鍵"""
+    company_ids = [company_id.strip() for company_id in company_ids_input.split(',')]
+    return f"company_data_{','.join(company_ids)}_{year_range_input}_{month_range_input}"
+
+def company_result_version(company_ids_input, year_range_input, month_range_input):
+    """快取中查詢結果的產生時間（不必讀取整份結果），不在快取中時返回 None"""
+    cache_key = company_result_cache_key(company_ids_input, year_range_input, month_range_input)
+    return cache.get(f"{cache_key}_generated_at")
+
+def load_company_result(company_ids_input, year_range_input, month_range_input, force_refresh=False,
+                        allow_async=True, user_key=None, priority=INTERACTIVE):
+    """
+    取得查詢結果（快取 → 查詢規劃 → 合併進行中的相同查詢 → 抓取）
+
+    Args:
+        allow_async (bool): 成本過高時是否轉為背景工作（背景工作本身執行時為 False）
+        user_key (str, optional): 同時查詢配額的用戶識別，未提供時不檢查配額；也是抓取排程器中輪流的用戶
+        priority (int): 向上游抓取的優先順序（背景查詢工作為 BACKFILL）
+
+    Returns:
+        tuple: (結果字典, 是否來自快取)；結果的 data 為已排序的 RevenueRecord 列表
+
+    Raises:
+        ValueError: 參數缺少或格式不正確（QueryRejected：查詢範圍過大）
+        AsyncJobRequired: 需轉為背景工作
+        QuotaExceeded: 該用戶同時進行中的查詢已達上限
+    """
+    # 建立請求的唯一緩存鍵
+    cache_key = company_result_cache_key(company_ids_input, year_range_input, month_range_input)
+
+    # 嘗試從緩存獲取數據
+    with tracing.span('cache.get'):
+        cached_result = None if force_refresh else cache.get(cache_key)
+    if cached_result is not None:
+        logger.info(f"從緩存獲取數據: {cache_key}")
+        return cached_result, True
+
+    # 展開並驗證查詢條件，估計需向上游抓取的次數後決定處理方式
+    with tracing.span('plan') as plan_span:
+        plan = planner.plan(company_ids_input, year_range_input, month_range_input, force_refresh)
+        if plan_span is not None:
+            plan_span.set_attribute('action', plan.action)
+            plan_span.set_attribute('upstream_fetches', plan.upstream_fetches)
+    if plan.action == REJECT:
+        raise QueryRejected(plan.message)
+    if plan.action == JOB and allow_async:
+        raise AsyncJobRequired(plan)
+
+    # 获取公司数据：相同查询并行到达时只计算一次，其余请求等待共用结果
+    def compute():
+        stale_items = []
+        company_data = []
+        # 大型查詢分批送入爬蟲，避免一次排入大量任務
+        for chunk_ids, years, months in plan.chunks():
+            company_data.extend(get_company_data(
+                chunk_ids, years, months,
+                force_fresh=force_refresh, stale_items=stale_items, priority=priority, user_key=user_key
+            ))
+        sorted_data = sorted(company_data, key=record_sort_key)
+        return {
+            'data': sorted_data,
+            'stale': bool(stale_items),
+            'stale_items': sorted(stale_items),
+            'result_id': encode_result_id(company_ids_input, year_range_input, month_range_input),
+            # 結果產生時間：分頁回應的快取鍵包含此值，重新計算後不會混用舊結果的頁面
+            'generated_at': time.time()
+        }
+
+    coalesce_key = f"{cache_key}_fresh" if force_refresh else cache_key
+    with tracing.span('coalesce'):
+        if user_key is None:
+            result = coalescer.run(coalesce_key, compute)
+        else:
+            with user_quota.acquire(user_key):
+                result = coalescer.run(coalesce_key, compute)
+
+    # 存入缓存：含过期资料的结果只短暂缓存，背景更新完成后即可取得新资料
+    timeout = app.config['STALE_RESULT_CACHE_TIMEOUT'] if result['stale'] else 3600
+    cache.set(cache_key, result, timeout=timeout)
+    # 圖表快取鍵包含結果產生時間，結果重新計算後舊圖表即不再使用
+    cache.set(f"{cache_key}_generated_at", result['generated_at'], timeout=timeout)
+    return result, False
+
+def submit_query_job(plan, company_ids_input, year_range_input, month_range_input, user_key):
+    """
+    建立背景查詢工作
+
+    Returns:
+        str: 工作代號
+
+    Raises:
+        QuotaExceeded: 該用戶未完成的背景工作已達上限
+    """
+    db.fail_interrupted_query_jobs()
+    max_jobs = app.config['MAX_ACTIVE_JOBS_PER_USER']
+    if db.count_active_query_jobs(user_key) >= max_jobs:
+        raise QuotaExceeded(f'已有 {max_jobs} 個背景查詢進行中，請等待完成後再試')
+
+    job_id = uuid.uuid4().hex
+    if not db.create_query_job(job_id, user_key, company_ids_input, year_range_input, month_range_input,
+                               plan.to_dict()):
+        raise RuntimeError('無法建立背景查詢工作')
+    job_executor.submit(run_query_job, job_id, company_ids_input, year_range_input, month_range_input)
+    logger.info(f"已建立背景查詢工作 {job_id}: {plan.to_dict()}")
+    return job_id
+
+def run_query_job(job_id, company_ids_input, year_range_input, month_range_input):
+    """背景執行查詢並將結果放入快取，客戶端完成後以 job_id 取回"""
+    db.update_query_job(job_id, 'running')
+    try:
+        with tracing.trace('query_job', job_id=job_id):
+            # 大型查詢的抓取排在用戶查詢、過期資料更新與預先抓取之後
+            result, _ = load_company_result(company_ids_input, year_range_input, month_range_input,
+                                            allow_async=False, priority=BACKFILL)
+        db.update_query_job(job_id, 'done', result_id=result['result_id'])
+    except Exception as e:
+        logger.error(f"背景查詢工作 {job_id} 失敗: {e}")
+        db.update_query_job(job_id, 'failed', error=str(e))
+
+def get_encoded_result(result, from_cache):
+    """
+    取得查詢結果的預先序列化回應（JSON bytes、gzip / brotli 版本與 ETag）
+
+    快取命中時直接取用已編碼的內容；結果重新計算時才重新編碼並覆寫快取。
+    """
+    response_key = f"company_data_response_{result['result_id']}"
+    payload = cache.get(response_key) if from_cache else None
+    if payload is None:
+        # 只在 API 邊界將 RevenueRecord 轉回舊版字典格式
+        with tracing.span('encode'):
+            payload = EncodedResponse(dict(result, data=to_dicts(result['data'])))
+        timeout = app.config['STALE_RESULT_CACHE_TIMEOUT'] if result['stale'] else 3600
+        cache.set(response_key, payload, timeout=timeout)
+    return payload
+
+def get_encoded_page(result, from_cache, page_size, cursor):
+    """取得查詢結果的單頁回應（以 公司代號、年、月 做 keyset 分頁）"""
+    response_key = (f"company_data_response_{result['result_id']}_{result['generated_at']}"
+                    f"_{page_size}_{cursor or ''}")
+    payload = cache.get(response_key) if from_cache else None
+    if payload is None:
+        page, next_cursor = paginate_sorted(result['data'], record_sort_key, page_size, cursor)
+        payload = EncodedResponse(dict(
+            result, data=to_dicts(page), page_size=page_size, next_cursor=next_cursor, total=len(result['data'])
+        ))
+        timeout = app.config['STALE_RESULT_CACHE_TIMEOUT'] if result['stale'] else 3600
+        cache.set(response_key, payload, timeout=timeout)
+    return payload
+
+def get_chart_records():
+    """取得圖表端點所需的資料：優先使用 result_id，否則沿用舊版直接上傳的 data"""
+    data = request.get_json(silent=True) or {}
+    result_id = data.get('result_id')
+    if result_id:
+        try:
+            result, _ = load_company_result(*decode_result_id(result_id), user_key=current_user_key())
+        except AsyncJobRequired:
+            raise ValueError('查詢結果已過期，請重新查詢')
+        except QuotaExceeded as e:
+            raise ValueError(str(e))
+        return result['data']
+    return data.get('data', [])
+
+def chart_result_version():
+    """圖表請求所依據查詢結果的產生時間；舊版請求或結果不在快取中時返回 None"""
+    data = request.get_json(silent=True) or {}
+    if not data.get('result_id'):
+        return None
+    try:
+        return company_result_version(*decode_result_id(data['result_id']))
+    except ValueError:
+        return None
+
+def chart_cache_key(prefix):
+    """圖表快取鍵：使用 result_id、結果產生時間與圖表選項，舊版請求才退回以請求內容雜湊"""
+    data = request.get_json(silent=True) or {}
+    result_id = data.get('result_id')
+    if result_id:
+        return (f"{prefix}_{result_id}_{chart_result_version()}_{data.get('company_id', '')}"
+                f"_{data.get('max_points', '')}_{data.get('downsample', '')}")
+    return f"{prefix}_{hash(request.data)}"
+
+def skip_chart_cache():
+    """查詢結果不在快取中時不快取圖表：本次請求才會重新計算結果，產生時間尚未確定"""
+    data = request.get_json(silent=True) or {}
+    return bool(data.get('result_id')) and chart_result_version() is None
+
+def is_cacheable_chart(response):
+    """只快取成功的圖表回應，錯誤（如配額已滿、參數錯誤）不快取"""
+    return getattr(response, 'status_code', None) == 200
+
+def get_downsample_options():
+    """
+    讀取圖表降採樣選項
+
+    Returns:
+        tuple: (max_points 或 None, 降採樣方法 'lttb' | 'quarterly')
+
+    Raises:
+        ValueError: 參數格式不正確
+    """
+    data = request.get_json(silent=True) or {}
+    max_points = data.get('max_points')
+    method = data.get('downsample') or 'lttb'
+    if method not in ('lttb', 'quarterly'):
+        raise ValueError('downsample 只支援 lttb 或 quarterly')
+    if max_points in (None, ''):
+        return None, method
+    try:
+        max_points = int(max_points)
+    except (TypeError, ValueError):
+        raise ValueError('max_points 必須為整數')
+    if max_points < 3:
+        raise ValueError('max_points 至少為 3')
+    return max_points, method
+
 @app.route('/api/revenue-chart', methods=['POST'])
-@cache.cached(timeout=3600, key_prefix=lambda: f"revenue_chart_{hash(request.data)}")
+@cache.cached(timeout=3600, key_prefix=lambda: chart_cache_key('revenue_chart'), unless=skip_chart_cache,
+              response_filter=is_cacheable_chart)
 def get_revenue_chart():
     try:
-        data = request.json
-        sorted_data = data.get('data', [])
+        sorted_data = get_chart_records()
         
         # 準備圖表數據
         chart_data = prepare_chart_data(sorted_data, 'revenue')
-        return jsonify(chart_data)
+        max_points, method = get_downsample_options()
+        return jsonify(downsample_chart(chart_data, max_points, method, how='sum'))
     
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         system_status['error_count'] += 1
         logger.error(f"處理營收圖表請求時出錯: {e}")
@@ -316,16 +848,19 @@ def get_revenue_chart():
 
 # 獲取增長率圖表數據
 @app.route('/api/growth-rate-chart', methods=['POST'])
-@cache.cached(timeout=3600, key_prefix=lambda: f"growth_rate_chart_{hash(request.data)}")
+@cache.cached(timeout=3600, key_prefix=lambda: chart_cache_key('growth_rate_chart'), unless=skip_chart_cache,
+              response_filter=is_cacheable_chart)
 def get_growth_rate_chart():
     try:
-        data = request.json
-        sorted_data = data.get('data', [])
+        sorted_data = get_chart_records()
         
         # 準備圖表數據
         chart_data = prepare_chart_data(sorted_data, 'growth_rate')
-        return jsonify(chart_data)
+        max_points, method = get_downsample_options()
+        return jsonify(downsample_chart(chart_data, max_points, method, how='mean'))
     
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         system_status['error_count'] += 1
         logger.error(f"處理增長率圖表請求時出錯: {e}")
@@ -333,15 +868,17 @@ def get_growth_rate_chart():
 
 # 獲取年度比較圖表數據
 @app.route('/api/yearly-comparison-chart', methods=['POST'])
-@cache.cached(timeout=3600, key_prefix=lambda: f"yearly_chart_{hash(request.data)}")
+@cache.cached(timeout=3600, key_prefix=lambda: chart_cache_key('yearly_chart'), unless=skip_chart_cache,
+              response_filter=is_cacheable_chart)
 def get_yearly_comparison_chart():
     try:
         data = request.json
-        sorted_data = data.get('data', [])
         company_id = data.get('company_id', '')
         
         if not company_id:
             return jsonify({'error': '缺少公司代號'}), 400
+
+        sorted_data = get_chart_records()
         
         # 準備圖表數據
         chart_data = prepare_yearly_comparison_data(sorted_data, company_id)
@@ -351,11 +888,189 @@ def get_yearly_comparison_chart():
             
         return jsonify(chart_data)
     
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         system_status['error_count'] += 1
         logger.error(f"處理年度比較圖表請求時出錯: {e}")
         return jsonify({'error': str(e)}), 500
 
+# 一次獲取營收、增長率與年度比較圖表數據（共用同一份樞紐矩陣）
+@app.route('/api/charts', methods=['POST'])
+@cache.cached(timeout=3600, key_prefix=lambda: chart_cache_key('all_charts'), unless=skip_chart_cache,
+              response_filter=is_cacheable_chart)
+def get_all_charts():
+    try:
+        data = request.json
+        sorted_data = get_chart_records()
+        company_id = data.get('company_id') or None
+
+        chart_data = prepare_all_charts(sorted_data, company_id)
+        if company_id and chart_data['yearly_comparison'][company_id] is None:
+            return jsonify({'error': f'未找到公司代號為 {company_id} 的數據'}), 404
+
+        max_points, method = get_downsample_options()
+        chart_data['revenue'] = downsample_chart(chart_data['revenue'], max_points, method, how='sum')
+        chart_data['growth_rate'] = downsample_chart(chart_data['growth_rate'], max_points, method, how='mean')
+
+        return jsonify(chart_data)
+
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        system_status['error_count'] += 1
+        logger.error(f"處理圖表請求時出錯: {e}")
+        return jsonify({'error': str(e)}), 500
+
+# 獲取營收彙總（年度、季度、年初至今、近十二個月），直接讀取預先計算的彙總表
+@app.route('/api/revenue-summary', methods=['POST'])
+def get_revenue_summary():
+    try:
+        data = request.json or {}
+        # 與查詢相同的代號與範圍驗證；未指定年份時返回所有年度
+        company_ids, years, _ = planner.expand(
+            data.get('company_ids', ''),
+            data.get('year_range') or f"{planner.min_year}-{current_roc_year()}",
+            '1-12'
+        )
+        if not data.get('year_range'):
+            years = None
+
+        summary = {}
+        for company_id in company_ids:
+            summary[company_id] = {
+                'yearly': db.get_yearly_revenue_summary(company_id, years),
+                'quarterly': db.get_quarterly_revenue_summary(company_id, years),
+                'monthly': db.get_monthly_revenue_rollup(company_id, years)
+            }
+        return jsonify(summary)
+
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        system_status['error_count'] += 1
+        logger.error(f"處理營收彙總請求時出錯: {e}")
+        return jsonify({'error': str(e)}), 500
+
+# 匯出營收資料（CSV / Parquet），直接由資料庫游標分批串流，記憶體用量與筆數無關
+@app.route('/api/export', methods=['GET', 'POST'])
+def export_revenue_data():
+    try:
+        data = request.get_json(silent=True) or request.values
+        export_format = (data.get('format') or 'csv').lower()
+        if export_format not in ('csv', 'parquet'):
+            return jsonify({'error': 'format 只支援 csv 或 parquet'}), 400
+        if export_format == 'parquet' and not parquet_available():
+            return jsonify({'error': '伺服器未安裝 pyarrow，無法匯出 Parquet'}), 501
+
+        # 與 /api/company-data 相同的查詢條件，或直接使用查詢結果代號
+        if data.get('result_id'):
+            company_ids_input, year_range_input, month_range_input = decode_result_id(data['result_id'])
+        else:
+            company_ids_input = data.get('company_ids', '')
+            year_range_input = data.get('year_range', '')
+            month_range_input = data.get('month_range', '')
+
+        # 與查詢相同的範圍驗證（匯出只讀取資料庫，不向上游抓取；未指定年月時匯出全部）
+        company_ids, years, months = planner.expand(
+            company_ids_input,
+            year_range_input or f"{planner.min_year}-{current_roc_year()}",
+            month_range_input or '1-12'
+        )
+
+        # 串流期間佔用一個匯出名額，回應關閉（含客戶端中斷）時釋放
+        quota = ExitStack()
+        quota.enter_context(export_quota.acquire(current_user_key()))
+
+        batches = db.iter_revenue_rows(company_ids, years, months)
+        filename = f"revenue_{'_'.join(company_ids)[:50]}"
+        if export_format == 'parquet':
+            response = Response(
+                stream_with_context(stream_parquet(batches)),
+                mimetype='application/vnd.apache.parquet',
+                headers={'Content-Disposition': f'attachment; filename="{filename}.parquet"'}
+            )
+        else:
+            response = Response(
+                stream_with_context(stream_csv(batches)),
+                mimetype='text/csv',
+                headers={'Content-Disposition': f'attachment; filename="{filename}.csv"'}
+            )
+        response.call_on_close(quota.close)
+        return response
+
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except QuotaExceeded as e:
+        return jsonify({'error': str(e)}), 429
+    except Exception as e:
+        system_status['error_count'] += 1
+        logger.error(f"匯出營收資料時出錯: {e}")
+        return jsonify({'error': str(e)}), 500
+
+# 背景查詢工作狀態
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_query_job_status(job_id):
+    try:
+        job = db.get_query_job(job_id)
+        if job is None or job['user_id'] != current_user_key():
+            return jsonify({'error': '找不到背景查詢工作'}), 404
+        return jsonify({
+            'id': job['id'],
+            'status': job['status'],
+            'plan': job['plan'],
+            'result_id': job['result_id'],
+            'error': job['error'],
+            'created_at': job['created_at'],
+            'updated_at': job['updated_at']
+        })
+    except Exception as e:
+        system_status['error_count'] += 1
+        logger.error(f"獲取背景查詢工作狀態時出錯: {e}")
+        return jsonify({'error': str(e)}), 500
+
+# 分頁獲取查詢歷史
+@app.route('/api/query-history', methods=['GET'])
+def get_query_history_api():
+    try:
+        if 'user_id' not in session:
+            return jsonify({'error': '請先登入'}), 401
+        page_size = parse_page_size(
+            request.args.get('page_size'), default=app.config['QUERY_HISTORY_PAGE_SIZE'],
+            max_size=app.config['MAX_PAGE_SIZE']
+        )
+        history, next_cursor = db.get_query_history(
+            user_id=session['user_id'], page_size=page_size, cursor=request.args.get('cursor') or None
+        )
+        return jsonify({'data': history, 'next_cursor': next_cursor})
+
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        system_status['error_count'] += 1
+        logger.error(f"獲取查詢歷史時出錯: {e}")
+        return jsonify({'error': str(e)}), 500
+
+# 公司代號／名稱搜尋（自動完成）
+@app.route('/api/companies', methods=['GET'])
+def search_companies():
+    try:
+        limit = parse_page_size(request.args.get('limit'), default=20, max_size=100)
+        company_index.refresh_if_stale()
+        results = company_index.search(
+            request.args.get('q', ''), limit=limit,
+            industry=request.args.get('industry') or None,
+            market=request.args.get('market') or None
+        )
+        return jsonify({'data': results})
+
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        system_status['error_count'] += 1
+        logger.error(f"搜尋公司時出錯: {e}")
+        return jsonify({'error': str(e)}), 500
+
 # 清除緩存
 @app.route('/api/clear-cache', methods=['POST'])
 def clear_cache():
@@ -422,13 +1137,15 @@ def get_company_data_api():
                 data = {
                     'company_ids': request.form.get('company_ids', ''),
                     'year_range': request.form.get('year_range', ''),
-                    'month_range': request.form.get('month_range', '')
+                    'month_range': request.form.get('month_range', ''),
+                    'force_refresh': request.form.get('force_refresh', '')
                 }
         else:
             data = {
                 'company_ids': request.form.get('company_ids', ''),
                 'year_range': request.form.get('year_range', ''),
-                'month_range': request.form.get('month_range', '')
+                'month_range': request.form.get('month_range', ''),
+                'force_refresh': request.form.get('force_refresh', '')
             }
         
         # 記錄接收到的數據
@@ -439,48 +1156,68 @@ def get_company_data_api():
         if not data or not data.get('company_ids'):
             return jsonify({'error': '请提供公司代号'}), 400
         
-        # 分割公司代號
-        company_ids = [company_id.strip() for company_id in data.get('company_ids', '').split(',')]
         year_range_input = data.get('year_range', '')
         month_range_input = data.get('month_range', '')
+        # 強制即時抓取：忽略快取與過期資料
+        force_refresh = str(data.get('force_refresh', '')).lower() in ('1', 'true', 'yes')
 
-        # 建立請求的唯一緩存鍵
-        cache_key = f"company_data_{','.join(company_ids)}_{year_range_input}_{month_range_input}"
-        
-        # 嘗試從緩存獲取數據
-        cached_result = cache.get(cache_key)
-        if cached_result is not None:
-            logger.info(f"從緩存獲取數據: {cache_key}")
-            return jsonify(cached_result)
-        
-        # 解析年份和月份范围
-        year_range = parse_range([year_range_input])
-        month_range = parse_range([month_range_input])
+        company_ids_input = data.get('company_ids', '')
+        user_key = current_user_key()
+        allow_async = True
 
-        # 验证解析后的数据
-        if not company_ids or not year_range or not month_range:
-            return jsonify({'error': '缺少必要参数或参数格式不正确'}), 400
-        
-        # 获取公司数据
-        company_data = get_company_data(company_ids, year_range, month_range)
+        # 背景工作完成後以 job_id 取回：沿用工作的查詢條件並同步回應
+        job_id = data.get('job_id')
+        if job_id:
+            job = db.get_query_job(job_id)
+            if job is None or job['user_id'] != user_key:
+                return jsonify({'error': '找不到背景查詢工作'}), 404
+            if job['status'] != 'done':
+                return jsonify({'error': '背景查詢尚未完成', 'status': job['status']}), 409
+            company_ids_input, year_range_input, month_range_input = (
+                job['company_ids'], job['year_range'], job['month_range']
+            )
+            allow_async = False
+
+        try:
+            # 分頁參數：未提供 page_size 時返回完整結果（與舊版相同）
+            page_size = parse_page_size(data.get('page_size'), max_size=app.config['MAX_PAGE_SIZE'])
+            cursor = data.get('cursor') or None
+            result, from_cache = load_company_result(
+                company_ids_input, year_range_input, month_range_input, force_refresh,
+                allow_async=allow_async, user_key=user_key
+            )
+            if page_size is not None:
+                payload = get_encoded_page(result, from_cache, page_size, cursor)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        except QuotaExceeded as e:
+            return jsonify({'error': str(e)}), 429
+        except AsyncJobRequired as e:
+            # 成本過高：轉為背景工作，客戶端輪詢 /api/jobs/<id>
+            try:
+                job_id = submit_query_job(e.plan, company_ids_input, year_range_input, month_range_input, user_key)
+            except QuotaExceeded as quota_error:
+                return jsonify({'error': str(quota_error)}), 429
+            return jsonify({
+                'job_id': job_id,
+                'status': 'queued',
+                'message': e.plan.message,
+                'plan': e.plan.to_dict()
+            }), 202
         
-        # 如果成功，添加到查询历史
-        if company_data:
+        # 如果成功，添加到查询历史（快取命中也記錄：查詢次數供預先抓取排名；
+        # 分頁查詢只在第一頁記錄，翻頁不重複計次）
+        if result['data'] and not cursor:
             db.add_query_history(
-                data.get('company_ids', ''),
-                data.get('year_range', ''),
-                data.get('month_range', ''),
+                company_ids_input,
+                year_range_input,
+                month_range_input,
                 user_id=session.get('user_id')  # 添加用戶 ID
             )
 
-        # 排序并返回数据
-        sorted_data = sorted(company_data, key=lambda x: (x['公司代號'], x['月份']))
-        result = {'data': sorted_data}
-        
-        # 存入缓存
-        cache.set(cache_key, result, timeout=3600)
-        
-        return jsonify(result)
+        if page_size is not None:
+            return payload.to_response()
+        return get_encoded_result(result, from_cache).to_response()
 
     except Exception as e:
         system_status['error_count'] += 1
@@ -530,7 +1267,42 @@ def internal_server_error(e):
     system_status['error_count'] += 1
     return render_template('500.html'), 500
 
+_worker_pid = None
+
+def start_worker():
+    """
+    啟動每個 worker 行程各自的背景工作：追蹤匯出、記憶體預算檢查、預先抓取與系統初始化（快取預熱）
+
+    執行緒無法跨 fork 保留：gunicorn --preload 時 app 於 master 載入，
+    由 gunicorn.conf.py 的 post_worker_init 在每個 worker 呼叫；其他情況於載入時呼叫。
+    """
+    global _worker_pid
+    if _worker_pid == os.getpid():
+        return
+    _worker_pid = os.getpid()
+    tracing.configure(
+        exporter=app.config['TRACE_EXPORTER'], file_path=app.config['TRACE_FILE'],
+        otlp_endpoint=app.config['OTLP_ENDPOINT'], sample_rate=app.config['TRACE_SAMPLE_RATE']
+    )
+    memory_budget.start(interval=app.config['MEMORY_CHECK_INTERVAL'])
+    if app.config['PREFETCH_ENABLED']:
+        prefetcher.start(
+            app.config['PREFETCH_INTERVAL'], app.config['PREFETCH_QUERIES'], app.config['PREFETCH_HISTORY_DAYS'],
+            app.config['PREFETCH_UPSTREAM_BUDGET'], hours=parse_hours(app.config['PREFETCH_HOURS']),
+            timezone=app.config['PREFETCH_TZ']
+        )
+    # 於背景初始化（gevent worker 下為 greenlet），不阻塞接受連線
+    threading.Thread(target=initialize_system, name='initialize-system', daemon=True).start()
+
+if not app.config['DEFER_WORKER_START']:
+    start_worker()
+
+# 載入耗時超過預算時警告（python -m benchmarks.bench_boot 可找出耗時的模組）
+system_status['boot_seconds'] = round(time.perf_counter() - _import_started, 3)
+if system_status['boot_seconds'] > app.config['BOOT_TIME_BUDGET']:
+    logging.warning(f"app 載入耗時 {system_status['boot_seconds']} 秒，超過預算 {app.config['BOOT_TIME_BUDGET']} 秒")
+else:
+    logging.info(f"app 載入耗時 {system_status['boot_seconds']} 秒")
+
 if __name__ == '__main__':
-    # 自動執行初始化
-    initialize_system()
     app.run(debug=True)
\ No newline at end of file
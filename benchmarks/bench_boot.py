@@ -0,0 +1,95 @@
+"""
+啟動效能測試：以新的 Python 行程匯入 app，量測載入耗時與最耗時的模組
+
+分別量測新資料庫（執行結構遷移）與既有資料庫（只讀取結構版本），
+並與 Config.BOOT_TIME_BUDGET 比較，超過預算時以非零狀態結束。
+
+執行方式（於專案根目錄）:
+    python -m benchmarks.bench_boot [--repeat 5]
+"""
+import os
+import sys
+import shutil
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+from config import Config
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# app 為總計；site 於直譯器啟動時載入，不計入匯入耗時
+_EXCLUDED = ('app', 'site')
+_IMPORT_SCRIPT = 'import time; t = time.perf_counter(); import app; print(time.perf_counter() - t)'
+
+
+def _boot(database_dir):
+    """
+    匯入 app 一次
+
+    Returns:
+        tuple: (載入秒數, -X importtime 輸出)
+    """
+    env = dict(os.environ, DATABASE_DIR=database_dir, DEFER_WORKER_START='true')
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', _IMPORT_SCRIPT],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    )
+    return float(result.stdout.strip().splitlines()[-1]), result.stderr
+
+
+def slowest_modules(importtime_output, limit=10):
+    """
+    -X importtime 輸出中累計耗時最高的頂層套件
+
+    Returns:
+        list: [(模組名稱, 累計毫秒), ...]
+    """
+    totals = {}
+    for line in importtime_output.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        # 格式: import time: 自身微秒 | 累計微秒 | 模組名稱（縮排表示層級）
+        _, cumulative, name = line[len('import time:'):].split('|')
+        package = name.strip().split('.')[0]
+        if package in _EXCLUDED:
+            continue
+        totals[package] = max(totals.get(package, 0), int(cumulative) / 1000)
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)[:limit]
+
+
+def run(repeat=5):
+    """執行效能測試並返回結果字典"""
+    database_dir = tempfile.mkdtemp(prefix='bench_boot_')
+    try:
+        # 第一次匯入建立資料庫並執行結構遷移
+        cold_seconds, _ = _boot(database_dir)
+        timings, importtime_output = [], ''
+        for _ in range(repeat):
+            seconds, importtime_output = _boot(database_dir)
+            timings.append(seconds)
+    finally:
+        shutil.rmtree(database_dir, ignore_errors=True)
+    return {
+        'new_database_s': cold_seconds,
+        'existing_database_s': statistics.median(timings),
+        'budget_s': Config.BOOT_TIME_BUDGET,
+        'slowest_modules': slowest_modules(importtime_output),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='app 載入耗時測試')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    result = run(args.repeat)
+    print(f"匯入 app（新資料庫，含結構遷移）: {result['new_database_s']:.3f} s")
+    print(f"匯入 app（既有資料庫，中位數）: {result['existing_database_s']:.3f} s"
+          f"（預算 {result['budget_s']} s）")
+    print("累計耗時最高的套件:")
+    for name, ms in result['slowest_modules']:
+        print(f"  {name:<24} {ms:8.1f} ms")
+    if result['existing_database_s'] > result['budget_s']:
+        print("超過載入耗時預算")
+        sys.exit(1)
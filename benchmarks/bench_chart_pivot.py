@@ -0,0 +1,198 @@
+"""
+圖表樞紐引擎效能測試：100 家公司 × 15 年
+
+比較舊版逐公司、逐月份搜尋的 prepare_chart_data 與 RevenuePivot 單次建表的耗時。
+
+執行方式（於專案根目錄）:
+    python -m benchmarks.bench_chart_pivot
+"""
+import time
+
+from benchmarks.datasets import make_records
+from utils.chart_pivot import RevenuePivot
+
+
+# ---- 舊版實作（僅作為效能基準） ----
+
+def legacy_prepare_chart_data(sorted_data, chart_type='revenue'):
+    """
+    準備 Highcharts 圖表所需的數據格式
+    
+    Args:
+        sorted_data (list): 排序後的公司資料列表
+        chart_type (str): 圖表類型，可選 'revenue', 'growth_rate', 'yearly'
+        
+    Returns:
+        dict: 圖表所需的數據
+    """
+    chart_data = {'categories': [], 'series': []}
+    
+    # 按公司代號分組
+    company_groups = {}
+    for item in sorted_data:
+        company_id = item['公司代號']
+        if company_id not in company_groups:
+            company_groups[company_id] = []
+        company_groups[company_id].append(item)
+    
+    # 確保每個組都按月份排序
+    for company_id, group in company_groups.items():
+        company_groups[company_id] = sorted(group, key=lambda x: x['月份'])
+    
+    # 收集所有月份作為類別
+    all_months = set()
+    for group in company_groups.values():
+        all_months.update(item['月份'] for item in group)
+    
+    # 將月份轉換為排序後的列表
+    chart_data['categories'] = sorted(list(all_months))
+    
+    # 根據圖表類型準備系列數據
+    for company_id, group in company_groups.items():
+        company_name = group[0]['公司名稱'] if group else company_id
+        
+        if chart_type == 'revenue':
+            # 營收數據
+            revenue_data = []
+            for month in chart_data['categories']:
+                found = False
+                for item in group:
+                    if item['月份'] == month:
+                        revenue_data.append(float(item['當月營收'].replace(',', '')))
+                        found = True
+                        break
+                if not found:
+                    revenue_data.append(None)  # 使用 None 表示缺失數據
+            
+            chart_data['series'].append({
+                'name': f"{company_id} {company_name}",
+                'data': revenue_data
+            })
+            
+        elif chart_type == 'growth_rate':
+            # 增長率數據
+            growth_data = []
+            for month in chart_data['categories']:
+                found = False
+                for item in group:
+                    if item['月份'] == month:
+                        try:
+                            growth_data.append(float(item['上月比較增減(%)']))
+                        except ValueError:
+                            growth_data.append(None)
+                        found = True
+                        break
+                if not found:
+                    growth_data.append(None)
+            
+            chart_data['series'].append({
+                'name': f"{company_id} {company_name}",
+                'data': growth_data
+            })
+    
+    return chart_data
+
+def legacy_prepare_yearly_comparison_data(sorted_data, company_id):
+    """
+    準備單一公司的年度比較數據
+    
+    Args:
+        sorted_data (list): 排序後的公司資料列表
+        company_id (str): 要比較的公司代號
+        
+    Returns:
+        dict: 年度比較圖表所需的數據
+    """
+    # 過濾選定公司的數據
+    company_data = [item for item in sorted_data if item['公司代號'] == company_id]
+    
+    if not company_data:
+        return None
+    
+    # 按年份分組
+    year_groups = {}
+    for item in company_data:
+        year = item['月份'].split('-')[0]
+        if year not in year_groups:
+            year_groups[year] = []
+        year_groups[year].append(item)
+    
+    # 準備圖表數據
+    chart_data = {
+        'categories': [f"{i:02d}" for i in range(1, 13)],  # 1-12 月
+        'series': []
+    }
+    
+    # 為每一年準備一個數據系列
+    for year, group in year_groups.items():
+        # 按月份排序
+        group = sorted(group, key=lambda x: int(x['月份'].split('-')[1]))
+        
+        # 收集每月數據
+        monthly_data = [None] * 12  # 初始化 12 個月的數據為 None
+        
+        for item in group:
+            month_idx = int(item['月份'].split('-')[1]) - 1  # 轉為 0-based index
+            if 0 <= month_idx < 12:  # 確保索引有效
+                try:
+                    monthly_data[month_idx] = float(item['當月營收'].replace(',', ''))
+                except ValueError:
+                    pass  # 保持為 None
+        
+        chart_data['series'].append({
+            'name': f"{year} 年",
+            'data': monthly_data
+        })
+    
+    return chart_data
+
+
+def _best_of(func, repeat=3):
+    """執行多次取最短耗時（秒）"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run(companies=100, years=15, repeat=3):
+    """執行效能測試並返回結果字典"""
+    records = make_records(companies, years)
+    company_id = records[0]['公司代號']
+
+    def legacy_all():
+        legacy_prepare_chart_data(records, 'revenue')
+        legacy_prepare_chart_data(records, 'growth_rate')
+        legacy_prepare_yearly_comparison_data(records, company_id)
+
+    def pivot_all():
+        pivot = RevenuePivot(records)
+        pivot.revenue_chart()
+        pivot.growth_rate_chart()
+        pivot.yearly_comparison(company_id)
+
+    pivot = RevenuePivot(records)
+    assert pivot.revenue_chart() == legacy_prepare_chart_data(records, 'revenue')
+    assert pivot.growth_rate_chart() == legacy_prepare_chart_data(records, 'growth_rate')
+    assert pivot.yearly_comparison(company_id) == legacy_prepare_yearly_comparison_data(records, company_id)
+
+    legacy_seconds = _best_of(legacy_all, repeat)
+    pivot_seconds = _best_of(pivot_all, repeat)
+    return {
+        'rows': len(records),
+        'legacy_seconds': legacy_seconds,
+        'pivot_seconds': pivot_seconds,
+        'combined_seconds': _best_of(lambda: RevenuePivot(records).all_charts(), repeat),
+        'speedup': legacy_seconds / pivot_seconds if pivot_seconds else None
+    }
+
+
+if __name__ == '__main__':
+    result = run()
+    print(f"資料筆數: {result['rows']}")
+    print(f"舊版三張圖表: {result['legacy_seconds']:.3f} 秒")
+    print(f"樞紐引擎三張圖表: {result['pivot_seconds']:.3f} 秒")
+    print(f"樞紐引擎全部圖表（含每家公司年度比較）: {result['combined_seconds']:.3f} 秒")
+    print(f"加速倍數: {result['speedup']:.1f}x")
@@ -0,0 +1,67 @@
+"""
+圖表降採樣效能測試：10 家公司 × 15 年的營收圖表
+
+比較完整輸出與 LTTB、季彙總降採樣後的處理時間與 JSON 大小。
+
+執行方式（於專案根目錄）:
+    python -m benchmarks.bench_downsample
+"""
+import json
+import time
+
+from benchmarks.datasets import make_records
+from utils.data_processor import prepare_chart_data
+from utils.downsample import downsample_chart
+
+
+def _measure(func, repeat=5):
+    """執行多次取最短耗時（秒），並返回最後一次的結果"""
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def run(companies=10, years=15, max_points=120, repeat=5):
+    """執行效能測試並返回結果字典"""
+    records = make_records(companies, years)
+
+    def full():
+        return json.dumps(prepare_chart_data(records, 'revenue'))
+
+    def lttb():
+        return json.dumps(downsample_chart(prepare_chart_data(records, 'revenue'), max_points, 'lttb'))
+
+    def quarterly():
+        return json.dumps(downsample_chart(prepare_chart_data(records, 'revenue'), max_points, 'quarterly'))
+
+    result = {'rows': len(records), 'max_points': max_points}
+    for name, func in (('full', full), ('lttb', lttb), ('quarterly', quarterly)):
+        seconds, body = _measure(func, repeat)
+        points = sum(len(series['data']) for series in json.loads(body)['series'])
+        result[name] = {'seconds': seconds, 'bytes': len(body.encode('utf-8')), 'points': points}
+    return result
+
+
+def check_point_limits(companies=10, years=15, limits=(30, 60, 120)):
+    """每條系列的點數不超過 max_points（季彙總後仍過多時需再降採樣），超過時拋出 AssertionError"""
+    chart_data = prepare_chart_data(make_records(companies, years), 'revenue')
+    for max_points in limits:
+        for method in ('lttb', 'quarterly'):
+            result = downsample_chart(chart_data, max_points, method)
+            points = max(len(series['data']) for series in result['series'])
+            assert points <= max_points, f"{method} max_points={max_points} 仍有 {points} 點"
+
+
+if __name__ == '__main__':
+    check_point_limits()
+    for max_points in (60, 120):
+        result = run(max_points=max_points)
+        print(f"資料筆數: {result['rows']}，max_points={result['max_points']}")
+        for name in ('full', 'lttb', 'quarterly'):
+            item = result[name]
+            print(f"  {name:10s} 耗時 {item['seconds'] * 1000:7.2f} ms  "
+                  f"JSON {item['bytes'] / 1024:7.1f} KB  點數 {item['points']}")
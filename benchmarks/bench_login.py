@@ -0,0 +1,112 @@
+"""
+登入吞吐量效能測試：密碼雜湊於請求中計算 vs 送入密碼雜湊執行緒池
+
+模擬 gunicorn gevent worker：同時送出大量登入請求，並持續量測
+/api/company-data（資料已在資料庫）的回應延遲。
+
+執行方式（於專案根目錄，需安裝 gevent）:
+    python -m benchmarks.bench_login
+"""
+from gevent import monkey
+
+# 與 gevent worker 相同，須在匯入其他模組前 patch
+monkey.patch_all()
+
+import os
+import time
+import tempfile
+
+import gevent
+
+os.environ.setdefault('DATABASE_DIR', tempfile.mkdtemp(prefix='bench_login_'))
+
+from config import Config
+from utils import auth
+from utils.records import RevenueRecord
+import app as web
+
+
+def _percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))] * 1000
+
+
+def _setup(username, password):
+    """建立測試帳號與 2330 一年的營收資料"""
+    with web.app.test_request_context():
+        auth.register_user(username, f'{username}@example.com', password)
+    for month in range(1, 13):
+        web.db.insert_revenue_data('2330', 112, month, RevenueRecord(
+            '2330', '台積電', 112, month, 200_000_000, 190_000_000, 180_000_000, 5.0, 11.0
+        ))
+    web.system_status['startup_time'] = time.time()
+    web.system_status['is_initializing'] = False
+
+
+def _run_mode(threads, logins, concurrency, username, password):
+    """以指定的雜湊執行緒數執行一輪測試"""
+    Config.PASSWORD_HASH_THREADS = threads
+    auth._hash_pool = None
+
+    probe_latencies = []
+    done = []
+
+    def login_worker(count):
+        client = web.app.test_client()
+        for _ in range(count):
+            response = client.post(
+                '/login', json={'username': username, 'password': password},
+                headers={'X-Requested-With': 'XMLHttpRequest'}
+            )
+            assert response.get_json()['success']
+
+    def probe():
+        client = web.app.test_client()
+        query = {'company_ids': '2330', 'year_range': '112', 'month_range': '1-12'}
+        # 每 10 ms 預定送出一次，延遲由預定送出時間起算：事件迴圈被卡住而錯過的
+        # 每個時間點都計入（否則只量到恰好沒被卡住的請求）
+        scheduled = time.perf_counter()
+        while True:
+            response = client.post('/api/company-data', json=query)
+            assert response.status_code == 200, response.get_data(as_text=True)
+            end = time.perf_counter()
+            while scheduled <= end:
+                probe_latencies.append(end - scheduled)
+                scheduled += 0.01
+            if done:
+                break
+            gevent.sleep(scheduled - end)
+
+    probe_greenlet = gevent.spawn(probe)
+    gevent.sleep(0.1)  # 先量測無登入時的基準延遲
+    start = time.perf_counter()
+    gevent.joinall([gevent.spawn(login_worker, logins // concurrency) for _ in range(concurrency)])
+    elapsed = time.perf_counter() - start
+    done.append(True)
+    probe_greenlet.join()
+
+    return {
+        'logins_per_s': logins / elapsed,
+        'probe_p50_ms': _percentile(probe_latencies, 50),
+        'probe_p99_ms': _percentile(probe_latencies, 99),
+        'probe_max_ms': max(probe_latencies) * 1000,
+    }
+
+
+def run(logins=200, concurrency=20, threads=2):
+    """執行效能測試並返回結果字典"""
+    username, password = 'bench_user', 'bench-password'
+    _setup(username, password)
+    return {
+        'inline': _run_mode(0, logins, concurrency, username, password),
+        'pool': _run_mode(threads, logins, concurrency, username, password),
+    }
+
+
+if __name__ == '__main__':
+    results = run()
+    for mode, label in (('inline', '請求中計算'), ('pool', '雜湊執行緒池')):
+        result = results[mode]
+        print(f"{label}: 登入 {result['logins_per_s']:.0f} 次/秒, /api/company-data 延遲"
+              f" p50 {result['probe_p50_ms']:.1f} ms, p99 {result['probe_p99_ms']:.1f} ms,"
+              f" 最大 {result['probe_max_ms']:.1f} ms")
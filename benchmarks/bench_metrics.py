@@ -0,0 +1,83 @@
+"""
+計時裝飾器效能測試：每次呼叫寫兩行日誌（舊版）vs 指標直方圖（新版）
+
+以資料庫記憶體快取命中這類微秒級的熱點函數為例，比較每次呼叫的額外耗時
+與產生的日誌量。
+
+執行方式（於專案根目錄）:
+    python -m benchmarks.bench_metrics
+"""
+import io
+import time
+import logging
+import functools
+
+from utils.metrics import metrics
+from utils.timer_decorator import timer_decorator, logger as timer_logger
+
+
+def legacy_timer_decorator(log_level='info', log_args=False):
+    """舊版：每次呼叫格式化開始與完成兩行日誌"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start_time = time.time()
+            start_msg = f"開始執行 {func.__module__}.{func.__qualname__}"
+            if log_args and (args or kwargs):
+                start_msg += f" 參數：{', '.join(repr(arg) for arg in args)}"
+            log_func = getattr(timer_logger, log_level)
+            log_func(start_msg)
+            result = func(*args, **kwargs)
+            log_func(f"完成執行 {func.__module__}.{func.__qualname__} - 耗時: {time.time() - start_time:.6f} 秒")
+            return result
+        return wrapper
+    return decorator
+
+
+def _lookup(cache, key):
+    return cache.get(key)
+
+
+def _per_call_us(func, calls):
+    cache = {f'2330_112_{month}': month for month in range(1, 13)}
+    start = time.perf_counter()
+    for i in range(calls):
+        func(cache, f'2330_112_{i % 12 + 1}')
+    return (time.perf_counter() - start) / calls * 1_000_000
+
+
+def run(calls=200_000):
+    """執行效能測試並返回結果字典"""
+    stream = io.StringIO()
+    handler = logging.StreamHandler(stream)
+    timer_logger.addHandler(handler)
+    timer_logger.propagate = False
+    try:
+        plain = _per_call_us(_lookup, calls)
+        legacy = _per_call_us(legacy_timer_decorator('info', log_args=True)(_lookup), calls)
+        legacy_log_bytes = len(stream.getvalue().encode('utf-8'))
+        stream.seek(0)
+        stream.truncate()
+        current = _per_call_us(timer_decorator('info', log_args=True)(_lookup), calls)
+        current_log_bytes = len(stream.getvalue().encode('utf-8'))
+    finally:
+        timer_logger.removeHandler(handler)
+        timer_logger.propagate = True
+
+    name = f'{_lookup.__module__}._lookup'
+    return {
+        'plain_us': plain,
+        'legacy_overhead_us': legacy - plain,
+        'current_overhead_us': current - plain,
+        'legacy_log_mb': legacy_log_bytes / 1024 / 1024,
+        'current_log_mb': current_log_bytes / 1024 / 1024,
+        'recorded_calls': metrics.histogram(name).count,
+    }
+
+
+if __name__ == '__main__':
+    result = run()
+    print(f"每次呼叫額外耗時: 舊版（每次寫日誌）{result['legacy_overhead_us']:.2f} µs"
+          f" → 指標直方圖 {result['current_overhead_us']:.2f} µs")
+    print(f"20 萬次呼叫產生日誌: {result['legacy_log_mb']:.1f} MB → {result['current_log_mb']:.2f} MB"
+          f"（直方圖記錄 {result['recorded_calls']} 次）")
@@ -0,0 +1,77 @@
+"""
+頁面解析效能測試：於目前行程解析 vs 送入解析行程池
+
+gevent worker 中，解析期間呼叫端佔用的 CPU 時間即為事件迴圈被卡住的時間。
+比較每頁的呼叫端 CPU 時間（thread_time）與多頁並行解析的總耗時。
+
+執行方式（於專案根目錄）:
+    python -m benchmarks.bench_page_parse
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from config import Config
+from utils import page_parser
+
+
+def make_page(companies=1000, seed_id=1101):
+    """產生與公開資訊觀測站月營收彙總頁面結構相同的 Big5 頁面"""
+    rows = []
+    for c in range(companies):
+        revenue = 1_000_000 + c * 137
+        rows.append(
+            f'<tr><td>{seed_id + c}</td><td>公司{c}</td><td>{revenue:,}</td>'
+            f'<td>{revenue - 1000:,}</td><td>{revenue - 5000:,}</td>'
+            f'<td>1.23</td><td>-4.56</td><td>{revenue * 3:,}</td><td>{revenue * 2:,}</td>'
+            f'<td>50.00</td><td>備註</td></tr>'
+        )
+    html = (
+        '<html><body><table><tr><th>公司代號</th></tr><tr><th>當月營收</th></tr>'
+        + ''.join(rows) + '</table></body></html>'
+    )
+    return html.encode('big5')
+
+
+def _caller_cost(parse, page, pages):
+    """依序解析多頁，返回（呼叫端平均 CPU 毫秒, 總耗時秒）"""
+    cpu_start = time.thread_time()
+    wall_start = time.perf_counter()
+    for _ in range(pages):
+        parse(page)
+    return (time.thread_time() - cpu_start) / pages * 1000, time.perf_counter() - wall_start
+
+
+def run(companies=1000, pages=20, processes=2):
+    """執行效能測試並返回結果字典"""
+    page = make_page(companies)
+    Config.PARSE_PROCESSES = processes
+    page_parser.parse_page(page)  # 預先啟動子行程
+
+    inline_cpu, inline_wall = _caller_cost(page_parser.parse_revenue_page, page, pages)
+    pool_cpu, pool_wall = _caller_cost(page_parser.parse_page, page, pages)
+
+    # 多個抓取執行緒同時送出解析（模擬爬蟲並行）
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=processes * 2) as executor:
+        list(executor.map(page_parser.parse_page, [page] * pages))
+    parallel_wall = time.perf_counter() - wall_start
+    page_parser.shutdown()
+
+    assert page_parser.parse_revenue_page(page)[0][1] == '公司0'
+    return {
+        'page_kb': len(page) / 1024,
+        'inline_caller_ms': inline_cpu,
+        'pool_caller_ms': pool_cpu,
+        'inline_wall_s': inline_wall,
+        'pool_wall_s': pool_wall,
+        'pool_parallel_wall_s': parallel_wall,
+    }
+
+
+if __name__ == '__main__':
+    result = run()
+    print(f"頁面大小: {result['page_kb']:.0f} KB")
+    print(f"每頁呼叫端 CPU（事件迴圈佔用）: 目前行程 {result['inline_caller_ms']:.1f} ms"
+          f" → 行程池 {result['pool_caller_ms']:.2f} ms")
+    print(f"20 頁依序解析: 目前行程 {result['inline_wall_s']:.2f} s, 行程池 {result['pool_wall_s']:.2f} s")
+    print(f"20 頁並行解析（行程池）: {result['pool_parallel_wall_s']:.2f} s")
@@ -0,0 +1,87 @@
+"""
+營收資料型別效能測試：舊版中文鍵字典 vs RevenueRecord（__slots__）
+
+比較每 10 萬筆的記憶體用量，以及排序分組、樞紐圖表的處理時間。
+
+執行方式（於專案根目錄）:
+    python -m benchmarks.bench_records
+"""
+import time
+import tracemalloc
+from itertools import groupby
+from operator import attrgetter, itemgetter
+
+from benchmarks.datasets import make_records
+from utils.chart_pivot import RevenuePivot
+from utils.records import record_sort_key, to_records, to_dicts
+
+
+def _measure(func, repeat=5):
+    """執行多次取最短耗時（秒），並返回最後一次的結果"""
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def _memory_per_100k(build):
+    """以 tracemalloc 量測建立資料的記憶體用量，換算為每 10 萬筆的 MB"""
+    tracemalloc.start()
+    data = build()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return current / len(data) * 100_000 / 1024 / 1024
+
+
+def _legacy_group_totals(items):
+    """舊版：依公司代號、月份字串排序後分組，逐筆解析營收字串"""
+    items = sorted(items, key=itemgetter('公司代號', '月份'))
+    return {
+        company_id: sum(float(item['當月營收'].replace(',', '')) for item in group)
+        for company_id, group in groupby(items, key=itemgetter('公司代號'))
+    }
+
+
+def _record_group_totals(records):
+    """新版：依數值鍵排序後分組，直接加總已解析的營收"""
+    records = sorted(records, key=record_sort_key)
+    return {
+        company_id: float(sum(record.revenue for record in group))
+        for company_id, group in groupby(records, key=attrgetter('company_id'))
+    }
+
+
+def run(companies=600, years=15, repeat=5):
+    """執行效能測試並返回結果字典"""
+    dicts = make_records(companies, years)
+    records = to_records(dicts)
+    assert to_dicts(records) == dicts
+
+    dict_mb = _memory_per_100k(lambda: make_records(companies, years))
+    record_mb = _memory_per_100k(lambda: to_records(dicts))
+
+    legacy_group, legacy_totals = _measure(lambda: _legacy_group_totals(dicts), repeat)
+    record_group, record_totals = _measure(lambda: _record_group_totals(records), repeat)
+    assert legacy_totals == record_totals
+
+    legacy_pivot, legacy_chart = _measure(lambda: RevenuePivot(dicts).revenue_chart(), repeat)
+    record_pivot, record_chart = _measure(lambda: RevenuePivot(records).revenue_chart(), repeat)
+    assert legacy_chart == record_chart
+
+    return {
+        'rows': len(dicts),
+        'memory_mb_per_100k': {'dict': dict_mb, 'record': record_mb},
+        'sort_group_s': {'dict': legacy_group, 'record': record_group},
+        'pivot_s': {'dict': legacy_pivot, 'record': record_pivot},
+    }
+
+
+if __name__ == '__main__':
+    result = run()
+    print(f"資料筆數: {result['rows']}")
+    for name in ('memory_mb_per_100k', 'sort_group_s', 'pivot_s'):
+        before, after = result[name]['dict'], result[name]['record']
+        print(f"{name:>20}: 字典 {before:.3f} / RevenueRecord {after:.3f} ({before / after:.1f}x)")
@@ -0,0 +1,37 @@
+import random
+
+
+def make_records(companies=100, years=15, start_year=100, seed=42):
+    """
+    產生與 /api/company-data 回傳格式相同的模擬營收資料
+
+    Args:
+        companies (int): 公司數量
+        years (int): 年數（每年 12 個月）
+        start_year (int): 起始民國年
+        seed (int): 亂數種子，確保每次產生相同資料
+
+    Returns:
+        list: 依公司代號、月份排序的資料列表
+    """
+    rng = random.Random(seed)
+    records = []
+    for c in range(companies):
+        company_id = str(1101 + c)
+        revenue = rng.randint(10_000, 50_000_000)
+        for year in range(start_year, start_year + years):
+            for month in range(1, 13):
+                last_month = revenue
+                revenue = max(1, int(revenue * rng.uniform(0.8, 1.25)))
+                last_year = max(1, int(revenue * rng.uniform(0.7, 1.3)))
+                records.append({
+                    '公司代號': company_id,
+                    '公司名稱': f'公司{company_id}',
+                    '當月營收': f'{revenue:,}',
+                    '上月營收': f'{last_month:,}',
+                    '去年當月營收': f'{last_year:,}',
+                    '上月比較增減(%)': f'{(revenue - last_month) / last_month * 100:.2f}',
+                    '去年同月增減(%)': f'{(revenue - last_year) / last_year * 100:.2f}',
+                    '月份': f'{year}-{month:02d}'
+                })
+    return records
@@ -0,0 +1,124 @@
+"""
+公開資訊觀測站月營收彙總頁面（t21sc03）的離線測試資料
+
+benchmarks/fixtures/ 下的 t21sc03_{年}_{月}_0.html.gz 為錄製的原始頁面（Big5）。
+沒有錄製檔的月份，以 static/js/stock_list.js 的公司名錄產生相同結構的 Big5 頁面，
+確保效能測試在無網路環境下仍可執行。
+
+錄製頁面（需要網路，於專案根目錄）:
+    python -m benchmarks.fixtures --record 112 1-12
+"""
+import os
+import gzip
+import random
+import argparse
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+STOCK_LIST_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'static', 'js', 'stock_list.js'
+)
+PAGE_URL = 'https://mopsov.twse.com.tw/nas/t21/sii/t21sc03_{year}_{month}_0.html'
+
+
+def fixture_path(year, month):
+    return os.path.join(FIXTURE_DIR, f't21sc03_{year}_{month}_0.html.gz')
+
+
+def companies():
+    """測試用公司名錄：[(公司代號, 公司名稱), ...]"""
+    from utils.company_index import parse_stock_list
+    return [(code, name) for code, name, _, _ in parse_stock_list(STOCK_LIST_PATH)]
+
+
+def synthesize_page(year, month, company_list=None):
+    """
+    產生與 t21sc03 頁面相同結構的 Big5 頁面（前兩列為標題，每列 11 欄）
+
+    營收以年月與公司代號為種子產生，同一年月每次產生的內容相同。
+    """
+    company_list = company_list or companies()
+    rows = []
+    for company_id, name in company_list:
+        rng = random.Random(f'{company_id}-{year}-{month}')
+        revenue = rng.randint(10_000, 50_000_000)
+        last_month = max(1, int(revenue * rng.uniform(0.8, 1.25)))
+        last_year = max(1, int(revenue * rng.uniform(0.7, 1.3)))
+        rows.append(
+            f'<tr align=right><td align=center>{company_id}</td><td align=center>{name}</td>'
+            f'<td>{revenue:,}</td><td>{last_month:,}</td><td>{last_year:,}</td>'
+            f'<td>{(revenue - last_month) / last_month * 100:.2f}</td>'
+            f'<td>{(revenue - last_year) / last_year * 100:.2f}</td>'
+            f'<td>{revenue * month:,}</td><td>{last_year * month:,}</td>'
+            f'<td>{(revenue - last_year) / last_year * 100:.2f}</td><td>-</td></tr>'
+        )
+    html = (
+        '<html><head><title>營業收入統計表</title></head><body>'
+        '<table border=1 width=100%>'
+        '<tr><th rowspan=2>公司代號</th><th rowspan=2>公司名稱</th><th colspan=5>營業收入</th>'
+        '<th colspan=3>累計營業收入</th><th rowspan=2>備註</th></tr>'
+        '<tr><th>當月營收</th><th>上月營收</th><th>去年當月營收</th><th>上月比較增減(%)</th>'
+        '<th>去年同月增減(%)</th><th>當月累計營收</th><th>去年累計營收</th><th>前期比較增減(%)</th></tr>'
+        + ''.join(rows) + '</table></body></html>'
+    )
+    return html.encode('big5', 'replace')
+
+
+def load_page(year, month):
+    """
+    取得指定年月的頁面：有錄製檔時使用錄製檔，否則產生測試頁面
+
+    Returns:
+        tuple: (頁面 bytes, 是否為錄製檔)
+    """
+    path = fixture_path(year, month)
+    if os.path.exists(path):
+        with gzip.open(path, 'rb') as f:
+            return f.read(), True
+    return synthesize_page(year, month), False
+
+
+def load_pages(year_months):
+    """
+    Returns:
+        tuple: ({(年, 月): 頁面 bytes}, 錄製檔數量)
+    """
+    pages = {}
+    recorded = 0
+    company_list = None
+    for year, month in year_months:
+        path = fixture_path(year, month)
+        if os.path.exists(path):
+            with gzip.open(path, 'rb') as f:
+                pages[(year, month)] = f.read()
+            recorded += 1
+        else:
+            company_list = company_list or companies()
+            pages[(year, month)] = synthesize_page(year, month, company_list)
+    return pages, recorded
+
+
+def record(year, month):
+    """從公開資訊觀測站下載頁面並以 gzip 保存原始位元組"""
+    import requests
+    response = requests.get(
+        PAGE_URL.format(year=year, month=month), timeout=30,
+        headers={'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64)'}
+    )
+    response.raise_for_status()
+    os.makedirs(FIXTURE_DIR, exist_ok=True)
+    with gzip.open(fixture_path(year, month), 'wb') as f:
+        f.write(response.content)
+    return len(response.content)
+
+
+if __name__ == '__main__':
+    from utils.data_processor import parse_range
+
+    parser = argparse.ArgumentParser(description='錄製 t21sc03 月營收頁面作為離線測試資料')
+    parser.add_argument('--record', nargs=2, metavar=('YEARS', 'MONTHS'), required=True,
+                        help='民國年與月份範圍，例如 112 1-12')
+    args = parser.parse_args()
+    for year in parse_range([args.record[0]]):
+        for month in parse_range([args.record[1]]):
+            size = record(year, month)
+            print(f"已錄製 {year}/{month}: {size / 1024:.0f} KB → {fixture_path(year, month)}")
@@ -0,0 +1,198 @@
+"""
+端對端負載測試：app 指向 MOPS 替身伺服器，依情境注入上游延遲與故障，
+量測 /api/company-data 與圖表端點的吞吐量與 p50/p95/p99 延遲
+
+每個模擬用戶依序送出查詢（隨機公司、年份與月份範圍），成功後再以 result_id 取得圖表。
+同一來源 IP 的同時查詢數受 MAX_CONCURRENT_QUERIES_PER_USER 限制，測試時需調高。
+
+執行方式（於專案根目錄）:
+    python -m benchmarks.mops_stub --port 8081
+    MOPS_PAGE_URL=http://127.0.0.1:8081/nas/t21/sii/t21sc03_{year}_{month}_0.html \\
+    MAX_CONCURRENT_QUERIES_PER_USER=100 PARSE_PROCESSES=2 \\
+        gunicorn --workers 2 --worker-class gevent --bind 127.0.0.1:8082 app:app
+    python -m benchmarks.load_test --app http://127.0.0.1:8082 --stub http://127.0.0.1:8081 \\
+        --duration 30 --concurrency 8 --output load.json
+"""
+import json
+import time
+import random
+import argparse
+import threading
+from collections import Counter, defaultdict
+
+import requests
+
+from benchmarks import fixtures
+
+# 各情境的上游行為（未列出的欄位為 0）
+BASE_LATENCY = {'latency_ms': 80, 'latency_sigma': 0.4}
+SCENARIOS = {
+    'baseline': dict(BASE_LATENCY),
+    'slow_tail': {'latency_ms': 300, 'latency_sigma': 1.0},
+    'server_errors': dict(BASE_LATENCY, error_rate=0.1),
+    'throttled': dict(BASE_LATENCY, throttle_rate=0.2),
+    'error_pages': dict(BASE_LATENCY, error_page_rate=0.1),
+    'resets': dict(BASE_LATENCY, reset_rate=0.05),
+}
+PROFILE_FIELDS = ('latency_ms', 'latency_sigma', 'reset_rate', 'error_rate', 'throttle_rate', 'error_page_rate')
+CHART_ENDPOINTS = ('/api/revenue-chart', '/api/growth-rate-chart', '/api/yearly-comparison-chart')
+
+
+def _percentile(values, pct):
+    values = sorted(values)
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+class LoadResult:
+    """各端點的延遲與狀態碼統計"""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+        self._lock = threading.Lock()
+
+    def add(self, endpoint, seconds, status):
+        with self._lock:
+            self.latencies[endpoint].append(seconds)
+            self.statuses[endpoint][status] += 1
+
+    def summary(self, duration):
+        result = {}
+        for endpoint, values in self.latencies.items():
+            ok = self.statuses[endpoint].get(200, 0)
+            result[endpoint] = {
+                'requests': len(values),
+                'ok_per_s': round(ok / duration, 2),
+                'p50_ms': round(_percentile(values, 50) * 1000, 1),
+                'p95_ms': round(_percentile(values, 95) * 1000, 1),
+                'p99_ms': round(_percentile(values, 99) * 1000, 1),
+                'statuses': {str(status): count for status, count in self.statuses[endpoint].items()}
+            }
+        return result
+
+
+def make_query(rng, company_ids, years, force_refresh_ratio):
+    """隨機查詢條件：1-3 家公司、單一年份、隨機月份範圍"""
+    start = rng.randint(1, 12)
+    end = rng.randint(start, 12)
+    return {
+        'company_ids': ','.join(rng.sample(company_ids, rng.randint(1, 3))),
+        'year_range': str(rng.choice(years)),
+        'month_range': f'{start}-{end}' if start != end else str(start),
+        'force_refresh': rng.random() < force_refresh_ratio
+    }
+
+
+def _timed_post(session, result, base_url, endpoint, payload, timeout):
+    start = time.perf_counter()
+    try:
+        response = session.post(base_url + endpoint, json=payload, timeout=timeout)
+        status = response.status_code
+    except requests.RequestException as e:
+        response, status = None, type(e).__name__
+    result.add(endpoint, time.perf_counter() - start, status)
+    return response
+
+
+def user_loop(base_url, deadline, result, rng, company_ids, years, force_refresh_ratio, timeout):
+    """單一模擬用戶：查詢 → 圖表，直到測試結束"""
+    session = requests.Session()
+    while time.time() < deadline:
+        query = make_query(rng, company_ids, years, force_refresh_ratio)
+        response = _timed_post(session, result, base_url, '/api/company-data', query, timeout)
+        if response is None or response.status_code != 200:
+            continue
+        result_id = response.json().get('result_id')
+        if not result_id:
+            continue
+        company_id = query['company_ids'].split(',')[0]
+        for endpoint in CHART_ENDPOINTS:
+            if time.time() >= deadline:
+                break
+            _timed_post(session, result, base_url, endpoint,
+                        {'result_id': result_id, 'company_id': company_id}, timeout)
+
+
+def set_scenario(stub_url, scenario):
+    """設定替身伺服器的故障情境並清除統計"""
+    profile = {field: 0 for field in PROFILE_FIELDS}
+    profile.update(SCENARIOS[scenario])
+    requests.post(f'{stub_url}/_control', json=profile, timeout=5).raise_for_status()
+    requests.get(f'{stub_url}/_stats?reset=1', timeout=5).raise_for_status()
+
+
+def run_scenario(app_url, stub_url, scenario, duration=30, concurrency=8, companies=30,
+                 years=range(100, 113), force_refresh_ratio=0.1, timeout=120, seed=0):
+    """
+    執行單一情境
+
+    Returns:
+        dict: {'scenario', 'profile', 'endpoints': {端點: 統計}, 'upstream': 替身伺服器回應次數}
+    """
+    set_scenario(stub_url, scenario)
+    company_ids = [company_id for company_id, _ in fixtures.companies()[:companies]]
+    result = LoadResult()
+    deadline = time.time() + duration
+    started = time.perf_counter()
+    threads = [
+        threading.Thread(
+            target=user_loop,
+            args=(app_url, deadline, result, random.Random(f'{seed}-{scenario}-{i}'), company_ids,
+                  list(years), force_refresh_ratio, timeout),
+            daemon=True
+        )
+        for i in range(concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # 進行中的請求可能超過 duration，以實際耗時計算吞吐量
+    elapsed = time.perf_counter() - started
+    return {
+        'scenario': scenario,
+        'profile': SCENARIOS[scenario],
+        'duration_s': round(elapsed, 1),
+        'endpoints': result.summary(elapsed),
+        'upstream': requests.get(f'{stub_url}/_stats', timeout=5).json()
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='端對端負載測試（app + MOPS 替身伺服器）')
+    parser.add_argument('--app', default='http://127.0.0.1:8082', help='app 網址')
+    parser.add_argument('--stub', default='http://127.0.0.1:8081', help='MOPS 替身伺服器網址')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help='逗號分隔的情境名稱')
+    parser.add_argument('--duration', type=float, default=30, help='每個情境的秒數')
+    parser.add_argument('--concurrency', type=int, default=8, help='同時模擬的用戶數')
+    parser.add_argument('--companies', type=int, default=30, help='查詢的公司範圍（名錄前 N 家）')
+    parser.add_argument('--force-refresh', type=float, default=0.1, help='強制即時抓取的查詢比例')
+    parser.add_argument('--output', help='結果 JSON 檔案路徑')
+    args = parser.parse_args()
+
+    try:
+        requests.get(f'{args.app}/api/keep-alive', timeout=10).raise_for_status()
+        requests.get(f'{args.stub}/_control', timeout=10).raise_for_status()
+    except requests.RequestException as e:
+        parser.error(f"無法連線至 app 或替身伺服器: {e}")
+
+    results = []
+    for name in args.scenarios.split(','):
+        if name not in SCENARIOS:
+            parser.error(f"未知的情境: {name}（可用: {', '.join(SCENARIOS)}）")
+        print(f"\n情境 {name}: {SCENARIOS[name]}")
+        summary = run_scenario(args.app, args.stub, name, args.duration, args.concurrency,
+                               args.companies, force_refresh_ratio=args.force_refresh)
+        results.append(summary)
+        for endpoint, stats in summary['endpoints'].items():
+            print(f"  {endpoint:<32} {stats['requests']:>6} 次  {stats['ok_per_s']:>7.2f} 成功/s  "
+                  f"p50 {stats['p50_ms']:>8.1f}  p95 {stats['p95_ms']:>8.1f}  p99 {stats['p99_ms']:>8.1f} ms  "
+                  f"{stats['statuses']}")
+        print(f"  上游回應: {summary['upstream']}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"\n結果已保存至 {args.output}")
@@ -0,0 +1,217 @@
+"""
+公開資訊觀測站（MOPS）替身伺服器：提供 t21sc03 月營收頁面，並可注入延遲與故障
+
+頁面來自 benchmarks.fixtures（錄製檔或同結構的測試頁面）。故障設定可於啟動時指定，
+或於執行中以 POST /_control（JSON）調整；GET /_stats 返回各種回應的次數。
+
+執行方式（於專案根目錄）:
+    python -m benchmarks.mops_stub --port 8081 --latency-ms 50 --error-rate 0.05
+
+app 以 MOPS_PAGE_URL 指向替身:
+    MOPS_PAGE_URL=http://127.0.0.1:8081/nas/t21/sii/t21sc03_{year}_{month}_0.html
+"""
+import re
+import json
+import time
+import random
+import socket
+import struct
+import argparse
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks import fixtures
+
+_PAGE_PATTERN = re.compile(r'/t21sc03_(\d+)_(\d+)_0\.html$')
+
+# 公開資訊觀測站查詢過於頻繁時返回的錯誤頁面（fetch_url 依內容判斷並重試）
+ERROR_PAGE = (
+    '<html><body><center><h3>資料庫查詢中，請稍後再試</h3>'
+    '<p>抱歉，您要求的網頁出現錯誤</p></center></body></html>'
+).encode('big5')
+
+
+class FaultProfile:
+    """
+    替身伺服器的回應行為
+
+    每個請求先等待延遲（對數常態分布：中位數 latency_ms、形狀 latency_sigma，0 為固定延遲），
+    再依各比例決定回應：連線重置、5xx、429、錯誤頁面，其餘返回正常頁面。
+    """
+
+    FIELDS = ('latency_ms', 'latency_sigma', 'reset_rate', 'error_rate', 'throttle_rate', 'error_page_rate')
+
+    def __init__(self, latency_ms=0.0, latency_sigma=0.0, reset_rate=0.0, error_rate=0.0,
+                 throttle_rate=0.0, error_page_rate=0.0):
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.reset_rate = reset_rate
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.error_page_rate = error_page_rate
+
+    def update(self, values):
+        """以字典更新設定，未知欄位拋出 ValueError"""
+        unknown = set(values) - set(self.FIELDS)
+        if unknown:
+            raise ValueError(f"未知的設定: {', '.join(sorted(unknown))}")
+        for key, value in values.items():
+            setattr(self, key, float(value))
+
+    def to_dict(self):
+        return {key: getattr(self, key) for key in self.FIELDS}
+
+    def delay(self, rng):
+        if self.latency_ms <= 0:
+            return 0.0
+        if self.latency_sigma <= 0:
+            return self.latency_ms / 1000
+        return rng.lognormvariate(0, self.latency_sigma) * self.latency_ms / 1000
+
+    def outcome(self, rng):
+        """依比例抽出回應類型：reset、5xx、429、error_page 或 ok"""
+        roll = rng.random()
+        for name, rate in (('reset', self.reset_rate), ('5xx', self.error_rate),
+                           ('429', self.throttle_rate), ('error_page', self.error_page_rate)):
+            if roll < rate:
+                return name
+            roll -= rate
+        return 'ok'
+
+
+class MopsStub:
+    """替身伺服器的狀態：故障設定、頁面快取與回應統計"""
+
+    def __init__(self, profile=None, seed=None):
+        self.profile = profile or FaultProfile()
+        self.stats = Counter()
+        self._pages = {}
+        self._lock = threading.Lock()
+        self._rng = random.Random(seed)
+
+    def page(self, year, month):
+        with self._lock:
+            page = self._pages.get((year, month))
+        if page is None:
+            page, _ = fixtures.load_page(year, month)
+            with self._lock:
+                self._pages[(year, month)] = page
+        return page
+
+    def draw(self):
+        """抽出本次請求的延遲與回應類型"""
+        with self._lock:
+            return self.profile.delay(self._rng), self.profile.outcome(self._rng)
+
+    def record(self, outcome):
+        with self._lock:
+            self.stats[outcome] += 1
+
+    def snapshot(self, reset=False):
+        with self._lock:
+            stats = dict(self.stats)
+            if reset:
+                self.stats.clear()
+        return stats
+
+
+def make_handler(stub):
+    class MopsStubHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def _send(self, status, body, content_type='text/html; charset=big5', headers=None):
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _send_json(self, status, payload):
+            self._send(status, json.dumps(payload, ensure_ascii=False).encode('utf-8'),
+                       'application/json; charset=utf-8')
+
+        def _reset(self):
+            # SO_LINGER 0：關閉時送出 RST，客戶端收到 ConnectionResetError
+            self.connection.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack('ii', 1, 0))
+            self.connection.close()
+            self.close_connection = True
+
+        def do_GET(self):
+            if self.path == '/_control':
+                return self._send_json(200, stub.profile.to_dict())
+            if self.path.startswith('/_stats'):
+                return self._send_json(200, stub.snapshot(reset='reset=1' in self.path))
+
+            match = _PAGE_PATTERN.search(self.path)
+            if not match:
+                stub.record('404')
+                return self._send(404, b'not found', 'text/plain')
+
+            delay, outcome = stub.draw()
+            if delay:
+                time.sleep(delay)
+            stub.record(outcome)
+            if outcome == 'reset':
+                return self._reset()
+            if outcome == '5xx':
+                return self._send(random.choice((500, 502, 503)), b'server error', 'text/plain')
+            if outcome == '429':
+                return self._send(429, b'too many requests', 'text/plain', {'Retry-After': '1'})
+            if outcome == 'error_page':
+                return self._send(200, ERROR_PAGE)
+            self._send(200, stub.page(int(match.group(1)), int(match.group(2))))
+
+        def do_POST(self):
+            if self.path != '/_control':
+                return self._send(404, b'not found', 'text/plain')
+            try:
+                values = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+                with stub._lock:
+                    stub.profile.update(values)
+            except ValueError as e:
+                return self._send_json(400, {'error': str(e)})
+            self._send_json(200, stub.profile.to_dict())
+
+        def log_message(self, format, *args):
+            pass
+
+    return MopsStubHandler
+
+
+def serve(port=8081, profile=None, host='127.0.0.1', seed=None):
+    """
+    於背景執行緒啟動替身伺服器
+
+    Returns:
+        tuple: (ThreadingHTTPServer, MopsStub)
+    """
+    stub = MopsStub(profile, seed)
+    server = ThreadingHTTPServer((host, port), make_handler(stub))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='mops-stub', daemon=True).start()
+    return server, stub
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='公開資訊觀測站替身伺服器')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='延遲中位數（毫秒）')
+    parser.add_argument('--latency-sigma', type=float, default=0.0, help='對數常態分布形狀，0 為固定延遲')
+    parser.add_argument('--reset-rate', type=float, default=0.0, help='連線重置比例')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='5xx 比例')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='429 比例')
+    parser.add_argument('--error-page-rate', type=float, default=0.0, help='「資料庫查詢」錯誤頁面比例')
+    parser.add_argument('--seed', type=int, help='亂數種子')
+    args = parser.parse_args()
+
+    profile = FaultProfile(args.latency_ms, args.latency_sigma, args.reset_rate, args.error_rate,
+                           args.throttle_rate, args.error_page_rate)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(MopsStub(profile, args.seed)))
+    server.daemon_threads = True
+    print(f"MOPS 替身伺服器監聽 http://{args.host}:{args.port}，設定: {profile.to_dict()}")
+    print(f"MOPS_PAGE_URL=http://{args.host}:{args.port}/nas/t21/sii/t21sc03_{{year}}_{{month}}_0.html")
+    server.serve_forever()
@@ -0,0 +1,308 @@
+"""
+離線效能測試套件：頁面解析、資料庫讀寫、圖表資料準備與完整查詢流程
+
+頁面來自 benchmarks.fixtures（錄製檔或同結構的測試頁面），抓取以測試頁面取代，
+不需要網路。結果可保存為 JSON，與其他 commit 的結果比較。
+
+執行方式（於專案根目錄）:
+    python -m benchmarks.suite --output results.json
+    python -m benchmarks.suite --compare results.json --threshold 20
+"""
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import logging
+import platform
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+# 資料庫須在匯入 utils.scraper 前指向暫存目錄
+_DB_DIR = tempfile.mkdtemp(prefix='bench_suite_')
+os.environ['DATABASE_DIR'] = _DB_DIR
+
+from config import Config
+
+# 於目前行程解析，結果不受行程池啟動與排程影響
+Config.PARSE_PROCESSES = 0
+
+from benchmarks import fixtures
+from benchmarks.datasets import make_records
+from utils import scraper
+from utils.database import Database, get_db
+from utils.page_parser import parse_revenue_page
+from utils.records import RevenueRecord, record_sort_key, to_records
+from utils.data_processor import prepare_chart_data, prepare_yearly_comparison_data
+from utils.query_planner import QueryPlan
+
+FIXTURE_YEAR = 112
+FIXTURE_MONTHS = list(range(1, 13))
+# 抓取次數測試的年份：月份頁面數（36）需超過抓取排程器的頁面快取（CRAWL_PAGE_CACHE_SIZE）
+CRAWL_YEARS = [110, 111, 112]
+# 圖表資料規模：(公司數, 年數)
+CHART_SIZES = [(5, 3), (20, 10), (50, 15)]
+_URL_PATTERN = re.compile(r't21sc03_(\d+)_(\d+)_0\.html')
+
+
+def _timeit(func, repeat):
+    """執行 repeat 次，返回每次耗時（秒）的中位數"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def _metric(value, unit, better='lower'):
+    return {'value': round(value, 4), 'unit': unit, 'better': better}
+
+
+def bench_parse(pages, repeat):
+    """月營收頁面解析速度"""
+    page_list = list(pages.values())
+    rows = sum(len(parse_revenue_page(page)) for page in page_list)
+    seconds = _timeit(lambda: [parse_revenue_page(page) for page in page_list], repeat)
+    return {
+        'parse.ms_per_page': _metric(seconds / len(page_list) * 1000, 'ms'),
+        'parse.rows_per_s': _metric(rows / seconds, 'rows/s', 'higher'),
+    }
+
+
+def bench_database(pages, repeat, companies=200):
+    """營收資料寫入吞吐量，與冷（僅資料庫）／熱（記憶體快取）讀取延遲"""
+    items = []
+    for (year, month), page in pages.items():
+        for row in parse_revenue_page(page)[:companies]:
+            items.append(((row[0], year, month), RevenueRecord(row[0], row[1], year, month, *row[2:])))
+
+    results = {}
+    db_dir = tempfile.mkdtemp(dir=_DB_DIR)
+    try:
+        # 逐筆寫入（未啟用延遲寫入的 app 資料庫）
+        database = Database(os.path.join(db_dir, 'single.db'))
+        sample = items[:500]
+        start = time.perf_counter()
+        for (company_id, year, month), data in sample:
+            database.insert_revenue_data(company_id, year, month, data)
+        results['db.insert_rows_per_s'] = _metric(len(sample) / (time.perf_counter() - start),
+                                                  'rows/s', 'higher')
+
+        # 批次寫入（延遲寫入佇列的每批交易）
+        database = Database(os.path.join(db_dir, 'batch.db'))
+        batch_size = Config.WRITE_BEHIND_BATCH_SIZE
+        start = time.perf_counter()
+        for i in range(0, len(items), batch_size):
+            database._write_revenue_batch(items[i:i + batch_size])
+        results['db.batch_insert_rows_per_s'] = _metric(len(items) / (time.perf_counter() - start),
+                                                        'rows/s', 'higher')
+
+        keys = [key for key, _ in items[::max(1, len(items) // 500)]]
+
+        def read_all():
+            for company_id, year, month in keys:
+                assert database.get_revenue_data(company_id, year, month, max_age_days=30) is not None
+
+        def read_cold():
+            database.clear_memory_cache()
+            read_all()
+
+        results['db.get_cold_us'] = _metric(_timeit(read_cold, repeat) / len(keys) * 1e6, 'us')
+        read_all()
+        results['db.get_warm_us'] = _metric(_timeit(read_all, repeat) / len(keys) * 1e6, 'us')
+    finally:
+        shutil.rmtree(db_dir, ignore_errors=True)
+    return results
+
+
+def bench_charts(repeat):
+    """prepare_chart_data / prepare_yearly_comparison_data 於不同資料規模的耗時"""
+    results = {}
+    for companies, years in CHART_SIZES:
+        records = sorted(to_records(make_records(companies, years)), key=record_sort_key)
+        company_id = records[0].company_id
+        label = f'{companies}x{years}y'
+        for chart_type in ('revenue', 'growth_rate'):
+            seconds = _timeit(lambda: prepare_chart_data(records, chart_type), repeat)
+            results[f'chart.{chart_type}.{label}_ms'] = _metric(seconds * 1000, 'ms')
+        seconds = _timeit(lambda: prepare_yearly_comparison_data(records, company_id), repeat)
+        results[f'chart.yearly_comparison.{label}_ms'] = _metric(seconds * 1000, 'ms')
+    return results
+
+
+def bench_end_to_end(pages, repeat, companies=4, months=3):
+    """
+    完整的 get_company_data：抓取（以測試頁面取代）、解析、入庫與讀取
+
+    cold 為強制重新抓取（每個月份頁面經抓取排程器抓取、解析一次），warm 為資料已在資料庫與記憶體快取。
+    """
+    company_ids = [row[0] for row in parse_revenue_page(next(iter(pages.values())))[:companies]]
+    months = sorted({month for _, month in pages})[:months]
+    years = sorted({year for year, _ in pages})
+
+    def fetch_fixture(url, timeout=30):
+        year, month = (int(part) for part in _URL_PATTERN.search(url).groups())
+        return pages.get((year, month))
+
+    original_fetch = scraper.fetch_url
+    scraper.fetch_url = fetch_fixture
+    try:
+        def query(force_fresh=False):
+            if force_fresh:
+                scraper.crawl_scheduler.clear_pages()
+            data = scraper.get_company_data(company_ids, years, months, force_fresh=force_fresh)
+            assert len(data) == len(company_ids) * len(years) * len(months)
+
+        cold = _timeit(lambda: query(force_fresh=True), repeat)
+        get_db().flush_writes()
+        query()
+        warm = _timeit(query, repeat)
+    finally:
+        scraper.fetch_url = original_fetch
+    tasks = len(company_ids) * len(years) * len(months)
+    return {
+        'e2e.cold_ms_per_task': _metric(cold / tasks * 1000, 'ms'),
+        'e2e.warm_ms_per_task': _metric(warm / tasks * 1000, 'ms'),
+    }
+
+
+def bench_crawl_fetches(companies=3, chunk_size=30):
+    """
+    強制重新抓取時每個月份頁面的上游抓取次數（應為 1）
+
+    月份頁面數超過抓取排程器的頁面快取，任務若依公司排序，後面的公司會在頁面被淘汰後重新抓取；
+    另以小的 chunk_size 驗證分批查詢（QueryPlan.chunks）也不會重複抓取同一頁面。
+    """
+    pages, _ = fixtures.load_pages([(year, month) for year in CRAWL_YEARS for month in range(1, 13)])
+    assert len(pages) > Config.CRAWL_PAGE_CACHE_SIZE
+    company_ids = [row[0] for row in parse_revenue_page(next(iter(pages.values())))[:companies]]
+    tasks = companies * len(pages)
+
+    def fetch_fixture(url, timeout=30):
+        year, month = (int(part) for part in _URL_PATTERN.search(url).groups())
+        return pages.get((year, month))
+
+    def count_fetches(chunks):
+        scheduler = scraper.crawl_scheduler
+        scheduler.clear_pages()
+        fetched_before = scheduler.stats['fetched']
+        data = []
+        for chunk_ids, years, months in chunks:
+            data.extend(scraper.get_company_data(chunk_ids, years, months, force_fresh=True))
+        assert len(data) == tasks
+        return scheduler.stats['fetched'] - fetched_before
+
+    original_fetch = scraper.fetch_url
+    scraper.fetch_url = fetch_fixture
+    try:
+        plan = QueryPlan(company_ids, CRAWL_YEARS, list(range(1, 13)), tasks, 0, tasks, len(pages))
+        fetches = count_fetches(plan.chunks())
+        plan.chunk_size = chunk_size
+        chunked_fetches = count_fetches(plan.chunks())
+    finally:
+        scraper.fetch_url = original_fetch
+    for name, count in (('未分批', fetches), ('分批', chunked_fetches)):
+        assert count == len(pages), f"{name}查詢抓取 {count} 次，月份頁面只有 {len(pages)} 個"
+    return {
+        'crawl.fetches_per_page': _metric(fetches / len(pages), 'fetches'),
+        'crawl.chunked_fetches_per_page': _metric(chunked_fetches / len(pages), 'fetches'),
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(repeat=5):
+    """執行所有測試並返回結果字典（meta 與各項指標）"""
+    pages, recorded = fixtures.load_pages([(FIXTURE_YEAR, month) for month in FIXTURE_MONTHS])
+    results = {}
+    results.update(bench_parse(pages, repeat))
+    results.update(bench_database(pages, repeat))
+    results.update(bench_charts(repeat))
+    results.update(bench_end_to_end(pages, max(1, repeat // 2)))
+    results.update(bench_crawl_fetches())
+    return {
+        'meta': {
+            'commit': _git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'pages': len(pages),
+            'recorded_pages': recorded,
+            'repeat': repeat
+        },
+        'results': results
+    }
+
+
+def compare(current, baseline, threshold=20.0):
+    """
+    比較兩次結果
+
+    Returns:
+        tuple: ([(名稱, 基準值, 目前值, 變化%, 是否退步), ...], 退步項目數)
+    """
+    rows = []
+    regressions = 0
+    for name, metric in current['results'].items():
+        base = baseline['results'].get(name)
+        if not base or not base['value']:
+            continue
+        change = (metric['value'] - base['value']) / base['value'] * 100
+        worse = change if metric['better'] == 'lower' else -change
+        regressed = worse > threshold
+        regressions += regressed
+        rows.append((name, base['value'], metric['value'], change, regressed))
+    return rows, regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='離線效能測試套件')
+    parser.add_argument('--output', help='結果 JSON 檔案路徑')
+    parser.add_argument('--compare', help='與此基準結果 JSON 比較')
+    parser.add_argument('--threshold', type=float, default=20.0, help='視為退步的變化百分比')
+    parser.add_argument('--repeat', type=int, default=5, help='每項測試重複次數（取中位數）')
+    args = parser.parse_args()
+
+    # 慢呼叫警告等日誌會干擾輸出，只保留錯誤
+    logging.disable(logging.WARNING)
+    try:
+        result = run(args.repeat)
+    finally:
+        get_db().flush_writes()
+        shutil.rmtree(_DB_DIR, ignore_errors=True)
+
+    meta = result['meta']
+    source = '錄製頁面' if meta['recorded_pages'] == meta['pages'] else \
+        f"測試頁面（錄製 {meta['recorded_pages']}/{meta['pages']}）"
+    print(f"commit {meta['commit']}，Python {meta['python']}，{source}")
+    for name, metric in result['results'].items():
+        print(f"  {name:<40} {metric['value']:>14,.3f} {metric['unit']}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"結果已保存至 {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        rows, regressions = compare(result, baseline, args.threshold)
+        print(f"\n與 {args.compare}（commit {baseline['meta'].get('commit')}）比較:")
+        for name, base, value, change, regressed in rows:
+            mark = '  ← 退步' if regressed else ''
+            print(f"  {name:<40} {base:>12,.3f} → {value:>12,.3f} ({change:+.1f}%){mark}")
+        if regressions:
+            print(f"{regressions} 項退步超過 {args.threshold}%")
+            sys.exit(1)
@@ -0,0 +1,75 @@
+"""
+本機 OTLP/HTTP 收集器替身：接收 /v1/traces（JSON），依 trace 列印各 span 耗時
+
+搭配 TRACE_EXPORTER=otlp、OTLP_ENDPOINT=http://localhost:4318/v1/traces 使用，
+不需架設完整的 OpenTelemetry Collector 即可檢視慢請求的時間分布。
+
+執行方式（於專案根目錄）:
+    python -m benchmarks.trace_collector [--port 4318] [--output traces.jsonl]
+"""
+import json
+import argparse
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def summarize(payload):
+    """
+    將 OTLP JSON 依 trace 彙總
+
+    Returns:
+        dict: {trace_id: [(span 名稱, 毫秒, span_id, parent span), ...]}
+    """
+    traces = defaultdict(list)
+    for resource_spans in payload.get('resourceSpans', []):
+        for scope_spans in resource_spans.get('scopeSpans', []):
+            for span in scope_spans.get('spans', []):
+                duration_ms = (int(span['endTimeUnixNano']) - int(span['startTimeUnixNano'])) / 1e6
+                traces[span['traceId']].append(
+                    (span['name'], duration_ms, span['spanId'], span.get('parentSpanId'))
+                )
+    return traces
+
+
+def make_handler(output=None):
+    class CollectorHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            if self.path != '/v1/traces':
+                self.send_response(404)
+                self.end_headers()
+                return
+            body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            payload = json.loads(body)
+            if output:
+                with open(output, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(payload, ensure_ascii=False) + '\n')
+            for trace_id, spans in summarize(payload).items():
+                # 根 span：parent 不在此 trace 內（可能沿用上游的 traceparent）
+                span_ids = {span[2] for span in spans}
+                root = next((span for span in spans if span[3] not in span_ids), spans[0])
+                totals = defaultdict(lambda: [0.0, 0])
+                for name, duration_ms, _, _ in spans:
+                    totals[name][0] += duration_ms
+                    totals[name][1] += 1
+                print(f"{trace_id} {root[0]} {root[1]:.1f} ms, {len(spans)} spans")
+                for name, (total, count) in sorted(totals.items(), key=lambda item: -item[1][0])[:10]:
+                    print(f"    {name:<40} {total:10.1f} ms  x{count}")
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.end_headers()
+            self.wfile.write(b'{}')
+
+        def log_message(self, format, *args):
+            pass
+
+    return CollectorHandler
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='本機 OTLP/HTTP 收集器替身')
+    parser.add_argument('--port', type=int, default=4318)
+    parser.add_argument('--output', help='將收到的原始 OTLP JSON 追加寫入此檔案')
+    args = parser.parse_args()
+    server = ThreadingHTTPServer(('127.0.0.1', args.port), make_handler(args.output))
+    print(f"OTLP 收集器替身監聽 http://127.0.0.1:{args.port}/v1/traces")
+    server.serve_forever()
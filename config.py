@@ -7,6 +7,10 @@ load_dotenv()
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'hard-to-guess-string'
     BASE_URL = 'https://mops.twse.com.tw/nas/t21/sii/t21sc03_{year}_{month}_0.html'
+    # 爬蟲抓取的月營收彙總頁面網址（負載測試時可指向本機替身伺服器 benchmarks.mops_stub）
+    MOPS_PAGE_URL = os.environ.get(
+        'MOPS_PAGE_URL', 'https://mopsov.twse.com.tw/nas/t21/sii/t21sc03_{year}_{month}_0.html'
+    )
     
     # 資料庫配置（未來擴充用）
     # SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///stock_app.db'
@@ -14,4 +18,101 @@ class Config:
     
     # 快取設定（未來擴充用）
     # CACHE_TYPE = 'SimpleCache'
-    # CACHE_DEFAULT_TIMEOUT = 300
\ No newline at end of file
+    # CACHE_DEFAULT_TIMEOUT = 300
+
+    # 營收資料有效期限（天），超過即視為過期
+    REVENUE_MAX_AGE_DAYS = int(os.environ.get('REVENUE_MAX_AGE_DAYS', 30))
+    # 過期資料先返回、背景更新（stale-while-revalidate）
+    STALE_WHILE_REVALIDATE = os.environ.get('STALE_WHILE_REVALIDATE', 'true').lower() == 'true'
+    # 過期資料可直接返回的最長天數，超過則必須即時抓取
+    REVENUE_MAX_STALE_DAYS = int(os.environ.get('REVENUE_MAX_STALE_DAYS', 365))
+    # 含過期資料的查詢結果快取秒數（背景更新後可盡快取得新資料）
+    STALE_RESULT_CACHE_TIMEOUT = int(os.environ.get('STALE_RESULT_CACHE_TIMEOUT', 60))
+
+    # 營收資料延遲批次寫入：每批最多筆數與最長等待秒數
+    WRITE_BEHIND_BATCH_SIZE = int(os.environ.get('WRITE_BEHIND_BATCH_SIZE', 200))
+    WRITE_BEHIND_FLUSH_INTERVAL = float(os.environ.get('WRITE_BEHIND_FLUSH_INTERVAL', 0.5))
+
+    # 分頁設定：首頁查詢紀錄每頁筆數、公司資料 API 單頁上限
+    QUERY_HISTORY_PAGE_SIZE = int(os.environ.get('QUERY_HISTORY_PAGE_SIZE', 20))
+    MAX_PAGE_SIZE = int(os.environ.get('MAX_PAGE_SIZE', 1000))
+
+    # 查詢規劃與准入控制
+    # 公開資訊觀測站月營收彙總頁面提供的最早民國年
+    MOPS_MIN_YEAR = int(os.environ.get('MOPS_MIN_YEAR', 91))
+    # 單次查詢的公司數與任務數（公司 × 年 × 月）上限
+    MAX_QUERY_COMPANIES = int(os.environ.get('MAX_QUERY_COMPANIES', 50))
+    MAX_QUERY_TASKS = int(os.environ.get('MAX_QUERY_TASKS', 20000))
+    # 任務數超過此值時分批送入爬蟲
+    QUERY_CHUNK_TASKS = int(os.environ.get('QUERY_CHUNK_TASKS', 600))
+    # 需向上游抓取的月份頁面數（相同頁面只抓一次）：超過同步上限轉為背景工作，超過背景上限則拒絕
+    SYNC_FETCH_LIMIT = int(os.environ.get('SYNC_FETCH_LIMIT', 120))
+    ASYNC_FETCH_LIMIT = int(os.environ.get('ASYNC_FETCH_LIMIT', 3000))
+    # 每位用戶同時進行中的同步查詢數與背景工作數（所有 worker 合計，以資料庫租約表計數）
+    MAX_CONCURRENT_QUERIES_PER_USER = int(os.environ.get('MAX_CONCURRENT_QUERIES_PER_USER', 2))
+    MAX_ACTIVE_JOBS_PER_USER = int(os.environ.get('MAX_ACTIVE_JOBS_PER_USER', 1))
+    # 每位用戶同時進行中的匯出串流數（所有 worker 合計；匯出不需登入，以此限制佔用資料庫讀取）
+    MAX_CONCURRENT_EXPORTS_PER_USER = int(os.environ.get('MAX_CONCURRENT_EXPORTS_PER_USER', 1))
+
+    # 頁面解析行程數（每個 gunicorn worker 各自建立），0 表示於目前行程解析
+    PARSE_PROCESSES = int(os.environ.get('PARSE_PROCESSES', 1))
+    # 等待單一頁面解析完成的最長秒數
+    PARSE_TIMEOUT = float(os.environ.get('PARSE_TIMEOUT', 30))
+
+    # 密碼雜湊：PBKDF2 迭代次數（既有密碼沿用建立時的次數）、執行緒數（0 表示於請求中計算）、
+    # 排隊上限與等待秒數
+    PASSWORD_HASH_ITERATIONS = int(os.environ.get('PASSWORD_HASH_ITERATIONS', 100000))
+    PASSWORD_HASH_THREADS = int(os.environ.get('PASSWORD_HASH_THREADS', 2))
+    PASSWORD_HASH_QUEUE_SIZE = int(os.environ.get('PASSWORD_HASH_QUEUE_SIZE', 32))
+    PASSWORD_HASH_TIMEOUT = float(os.environ.get('PASSWORD_HASH_TIMEOUT', 10))
+
+    # 效能指標：超過此秒數的函數呼叫才寫入日誌；設定 METRICS_TOKEN 時 /metrics 需 Bearer 權杖
+    SLOW_CALL_THRESHOLD = float(os.environ.get('SLOW_CALL_THRESHOLD', 1.0))
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+    # 請求追蹤：API 回應附上 Server-Timing；TRACE_EXPORTER 為 file 時寫入 TRACE_FILE（JSON Lines），
+    # 為 otlp 時送至 OTLP_ENDPOINT（OTLP/HTTP JSON，例如 http://localhost:4318/v1/traces）
+    TRACING_ENABLED = os.environ.get('TRACING_ENABLED', 'true').lower() == 'true'
+    SERVER_TIMING = os.environ.get('SERVER_TIMING', 'true').lower() == 'true'
+    TRACE_EXPORTER = os.environ.get('TRACE_EXPORTER')
+    TRACE_FILE = os.environ.get('TRACE_FILE', os.path.join('data', 'traces.jsonl'))
+    OTLP_ENDPOINT = os.environ.get('OTLP_ENDPOINT')
+    TRACE_SAMPLE_RATE = float(os.environ.get('TRACE_SAMPLE_RATE', 1.0))
+
+    # 管理員帳號（逗號分隔的用戶名），可使用 /api/admin/* 端點
+    ADMIN_USERNAMES = [name.strip() for name in os.environ.get('ADMIN_USERNAMES', '').split(',') if name.strip()]
+    # 取樣分析最長秒數
+    PROFILE_MAX_SECONDS = int(os.environ.get('PROFILE_MAX_SECONDS', 60))
+
+    # 記憶體預算：單一 worker 的 RSS 上限（MB，0 表示不限制）、容器用量達 cgroup 上限的比例時開始回收快取
+    MEMORY_BUDGET_MB = int(os.environ.get('MEMORY_BUDGET_MB', 200))
+    MEMORY_HIGH_WATERMARK = float(os.environ.get('MEMORY_HIGH_WATERMARK', 0.85))
+    MEMORY_CHECK_INTERVAL = float(os.environ.get('MEMORY_CHECK_INTERVAL', 5))
+
+    # 啟動預熱：以最近 WARMUP_HISTORY_DAYS 天內最熱門的查詢預熱快取（0 表示不預熱）
+    WARMUP_QUERIES = int(os.environ.get('WARMUP_QUERIES', 20))
+    WARMUP_HISTORY_DAYS = int(os.environ.get('WARMUP_HISTORY_DAYS', 30))
+
+    # 啟動：app 模組載入耗時預算（秒，超過時記錄警告）；DEFER_WORKER_START 由 gunicorn.conf.py 設定，
+    # 背景工作改由 post_worker_init 於每個 worker 啟動（支援 --preload）
+    BOOT_TIME_BUDGET = float(os.environ.get('BOOT_TIME_BUDGET', 2.0))
+    DEFER_WORKER_START = os.environ.get('DEFER_WORKER_START', 'false').lower() == 'true'
+
+    # 預先抓取：每 PREFETCH_INTERVAL 秒（於 PREFETCH_HOURS 離峰時段，如 "1-6" 或 "22-5"，空字串為不限；
+    # 小時以 PREFETCH_TZ 時區計算，預設台灣時間，不受容器時區（UTC）影響）
+    # 依查詢次數與近期程度（PREFETCH_HALF_LIFE_DAYS 半衰期）取前 PREFETCH_QUERIES 個熱門查詢，
+    # 於 PREFETCH_UPSTREAM_BUDGET 個上游頁面內更新過期資料，並建立查詢結果、首頁分頁與圖表快取
+    PREFETCH_ENABLED = os.environ.get('PREFETCH_ENABLED', 'true').lower() == 'true'
+    PREFETCH_INTERVAL = float(os.environ.get('PREFETCH_INTERVAL', 3600))
+    PREFETCH_HOURS = os.environ.get('PREFETCH_HOURS', '1-6')
+    PREFETCH_TZ = os.environ.get('PREFETCH_TZ', 'Asia/Taipei')
+    PREFETCH_QUERIES = int(os.environ.get('PREFETCH_QUERIES', 20))
+    PREFETCH_HISTORY_DAYS = int(os.environ.get('PREFETCH_HISTORY_DAYS', 30))
+    PREFETCH_HALF_LIFE_DAYS = float(os.environ.get('PREFETCH_HALF_LIFE_DAYS', 7))
+    PREFETCH_UPSTREAM_BUDGET = int(os.environ.get('PREFETCH_UPSTREAM_BUDGET', 200))
+    # 與 static/js/main.js 的 RESULT_PAGE_SIZE 相同
+    PREFETCH_PAGE_SIZE = int(os.environ.get('PREFETCH_PAGE_SIZE', 500))
+
+    # 抓取排程器：已解析的月份頁面保留秒數與頁數（同一查詢的其他公司、其他用戶的相同頁面直接取用）
+    CRAWL_PAGE_TTL = float(os.environ.get('CRAWL_PAGE_TTL', 120))
+    CRAWL_PAGE_CACHE_SIZE = int(os.environ.get('CRAWL_PAGE_CACHE_SIZE', 24))
@@ -0,0 +1,32 @@
+"""
+gunicorn 設定（gunicorn -c gunicorn.conf.py app:app）
+
+預設使用 --preload：app 只在 master 載入一次（資料庫結構檢查、公司名錄、numpy 等模組），
+worker 以 fork 共用這些記憶體（copy-on-write），--max-requests 回收 worker 時也不必重新載入。
+各 worker 的背景執行緒（記憶體預算、追蹤匯出、快取預熱）於 post_worker_init 啟動。
+"""
+import os
+
+bind = os.environ.get('BIND', '0.0.0.0:8082')
+workers = int(os.environ.get('WORKERS', 2))
+worker_class = os.environ.get('WORKER_CLASS', 'gevent')
+worker_connections = int(os.environ.get('WORKER_CONNECTIONS', 1000))
+timeout = int(os.environ.get('TIMEOUT', 120))
+max_requests = int(os.environ.get('MAX_REQUESTS', 1000))
+max_requests_jitter = int(os.environ.get('MAX_REQUESTS_JITTER', 50))
+preload_app = os.environ.get('PRELOAD', 'true').lower() == 'true'
+accesslog = os.environ.get('ACCESS_LOG', '-')
+errorlog = '-'
+
+# 背景工作由 post_worker_init 啟動，app 載入時不啟動（master 的執行緒不會保留到 fork 出的 worker）
+os.environ['DEFER_WORKER_START'] = 'true'
+
+if preload_app and worker_class == 'gevent':
+    # app 於 master 載入前先 patch，模組層級建立的鎖與 socket 才會是 gevent 版本
+    from gevent import monkey
+    monkey.patch_all()
+
+
+def post_worker_init(worker):
+    from app import start_worker
+    start_worker()
@@ -4,20 +4,18 @@ import ChartManager from './modules/chart-manager.js';
 
 
 let currentData = [];
+let currentResultId = null;  // 伺服器端查詢結果代號
+const RESULT_PAGE_SIZE = 500; // 查詢結果每頁筆數
 // 建立圖表管理器實例
 const chartManager = new ChartManager({
   currentDataGetter: () => currentData,  // 提供函數來獲取最新的 currentData
+  resultIdGetter: () => currentResultId, // 圖表請求只需送出結果代號
   chartContainer: 'chart-container',     // 圖表容器的 ID
   chartSection: 'chart-section',         // 圖表區域的 ID
   chartTitle: 'chart-title'              // 圖表標題的 ID
 });
 document.addEventListener('DOMContentLoaded', function () {
   // === 自動補全與標籤功能開始 ===
-  if (!window.STOCK_LIST || !Array.isArray(window.STOCK_LIST)) {
-    console.error("STOCK_LIST 未正確載入！");
-    return;
-  }
-
   // 獲取必要的 DOM 元素
   const inputField = document.getElementById("company-ids");
   const autocompleteList = document.getElementById("autocomplete-results");
@@ -27,60 +25,43 @@ document.addEventListener('DOMContentLoaded', function () {
   const marketFilter = document.getElementById('market-filter');
 
   let selectedCompanies = [];
+  let autocompleteTimer = null;
+  let autocompleteRequest = 0;  // 只渲染最後一次請求的結果
 
-  // 初始化篩選選項
-  function populateStockFilters() {
-    if (!industryFilter || !marketFilter) return;
-
-    const industries = [...new Set(window.STOCK_LIST.map(stock => stock.industry))].sort();
-    const markets = [...new Set(window.STOCK_LIST.map(stock => stock.market))].sort();
-    
-    industries.forEach(industry => {
-      const option = document.createElement('option');
-      option.value = industry;
-      option.textContent = industry;
-      industryFilter.appendChild(option);
-    });
-    
-    markets.forEach(market => {
-      const option = document.createElement('option');
-      option.value = market;
-      option.textContent = market;
-      marketFilter.appendChild(option);
-    });
+  // 自動補全和篩選函數（行業、市場選項已由伺服器端渲染）
+  function updateAutoCompleteResults() {
+    clearTimeout(autocompleteTimer);
+    autocompleteTimer = setTimeout(fetchAutoCompleteResults, 150);
   }
 
-  // 自動補全和篩選函數
-  function updateAutoCompleteResults() {
+  async function fetchAutoCompleteResults() {
     const query = inputField.value.trim();
     const selectedIndustry = industryFilter.value;
     const selectedMarket = marketFilter.value;
-    
-    autocompleteList.innerHTML = "";
-    
+    const requestId = ++autocompleteRequest;
+
     // 如果沒有任何篩選條件，不顯示結果
-    if (!query && !selectedIndustry && !selectedMarket) return;
-    
-    // 篩選邏輯
-    const matches = window.STOCK_LIST.filter(company => {
-      const matchesQuery = !query || 
-                           company.code.includes(query) || 
-                           company.name.includes(query);
-      
-      const matchesIndustry = !selectedIndustry || 
-                              company.industry === selectedIndustry;
-      
-      const matchesMarket = !selectedMarket || 
-                            company.market === selectedMarket;
-      
-      return matchesQuery && matchesIndustry && matchesMarket;
-    });
-    
-    // 限制結果數量
-    const displayMatches = matches.slice(0, 20);
-    
+    if (!query && !selectedIndustry && !selectedMarket) {
+      autocompleteList.innerHTML = "";
+      return;
+    }
+
+    const params = new URLSearchParams({ q: query, industry: selectedIndustry, market: selectedMarket, limit: 20 });
+    let matches = [];
+    try {
+      const response = await fetch(`/api/companies?${params}`);
+      if (!response.ok) return;
+      matches = (await response.json()).data || [];
+    } catch (error) {
+      console.error('搜尋公司時出錯:', error);
+      return;
+    }
+    if (requestId !== autocompleteRequest) return;
+
+    autocompleteList.innerHTML = "";
+
     // 渲染結果
-    displayMatches.forEach((company) => {
+    matches.forEach((company) => {
       const item = document.createElement("div");
       item.classList.add("autocomplete-item");
       item.innerHTML = `
@@ -156,9 +137,6 @@ document.addEventListener('DOMContentLoaded', function () {
     }
   });
 
-  // 初始化行業和市場篩選選項
-  populateStockFilters();
-
   // 移動端導航功能
   setupMobileNavigation();
 
@@ -289,8 +267,8 @@ document.addEventListener('DOMContentLoaded', function () {
   }
 });
 
-// 獲取公司數據
-function fetchCompanyData() {
+// 獲取公司數據（jobId：已完成的背景查詢工作，伺服器直接同步回應）
+function fetchCompanyData(jobId = null) {
   const companyIds = document.getElementById('company-ids-hidden').value;
   const startYear = document.getElementById('start-year').value;
   const endYear = document.getElementById('end-year').value;
@@ -340,16 +318,29 @@ function fetchCompanyData() {
     body: JSON.stringify({
       company_ids: companyIds,
       year_range: yearRange,
-      month_range: monthRange
+      month_range: monthRange,
+      page_size: RESULT_PAGE_SIZE,
+      job_id: jobId
     }),
   })
     .then(response => {
-      if (!response.ok) {
-        throw new Error('網路回應不正常');
+      // 大型查詢轉為背景工作（202），完成後重新送出查詢即可由資料庫快速取得
+      if (response.status === 202) {
+        return response.json().then(job => waitForQueryJob(job)).then(job => {
+          progressTracker.stopProgressPolling();
+          fetchCompanyData(job.id);
+          return null;
+        });
       }
-      return response.json();
+      // 錯誤回應仍含 JSON 說明（例如查詢範圍過大、超過同時查詢上限）
+      return response.json().catch(() => {
+        throw new Error('網路回應不正常');
+      });
     })
     .then(data => {
+      if (data === null) {
+        return;
+      }
       // 從第二個版本採用：先停止輪詢再隱藏消息
       progressTracker.stopProgressPolling();
       document.querySelector('.loading-message').style.display = 'none';
@@ -360,9 +351,14 @@ function fetchCompanyData() {
 
       // 儲存當前數據
       currentData = data.data;
+      currentResultId = data.result_id || null;
+      updateExportLinks(currentResultId);
 
-      // 填充表格
+      // 填充表格，其餘頁面在背景依游標接續載入
       populateTable(currentData);
+      if (data.next_cursor) {
+        loadRemainingPages({ company_ids: companyIds, year_range: yearRange, month_range: monthRange }, data.next_cursor, currentResultId);
+      }
     })
     .catch(error => {
       // 從第二個版本採用：確保錯誤時也停止輪詢
@@ -374,6 +370,73 @@ function fetchCompanyData() {
     });
 }
 
+// 輪詢背景查詢工作直到完成
+function waitForQueryJob(job) {
+  const loadingText = document.querySelector('.loading-message div div:last-child');
+  if (loadingText && job.message) {
+    loadingText.textContent = job.message;
+  }
+  return new Promise((resolve, reject) => {
+    const poll = () => {
+      fetch(`/api/jobs/${encodeURIComponent(job.job_id)}`)
+        .then(response => response.json())
+        .then(status => {
+          if (status.error && !status.status) {
+            reject(new Error(status.error));
+          } else if (status.status === 'done') {
+            resolve(status);
+          } else if (status.status === 'failed') {
+            reject(new Error(status.error || '背景查詢失敗'));
+          } else {
+            setTimeout(poll, 3000);
+          }
+        })
+        .catch(reject);
+    };
+    poll();
+  });
+}
+
+// 更新匯出按鈕連結（由伺服器依結果代號串流匯出）
+function updateExportLinks(resultId) {
+  [['export-csv-btn', 'csv'], ['export-parquet-btn', 'parquet']].forEach(([id, format]) => {
+    const link = document.getElementById(id);
+    if (!link) return;
+    // 伺服器未安裝 pyarrow 時 Parquet 按鈕維持停用（提示文字由模板設定）
+    if (resultId && link.dataset.available !== 'false') {
+      link.href = `/api/export?format=${format}&result_id=${encodeURIComponent(resultId)}`;
+      link.classList.remove('disabled');
+    } else {
+      link.href = '#';
+      link.classList.add('disabled');
+    }
+  });
+}
+
+// 依游標逐頁載入剩餘資料並附加到表格
+function loadRemainingPages(query, cursor, resultId) {
+  fetch('/api/company-data', {
+    method: 'POST',
+    headers: {
+      'Content-Type': 'application/json',
+    },
+    body: JSON.stringify({ ...query, page_size: RESULT_PAGE_SIZE, cursor }),
+  })
+    .then(response => response.json())
+    .then(page => {
+      // 使用者已發出新的查詢時停止載入舊結果
+      if (page.error || resultId !== currentResultId) {
+        return;
+      }
+      currentData = currentData.concat(page.data);
+      appendTableRows(page.data);
+      if (page.next_cursor) {
+        loadRemainingPages(query, page.next_cursor, resultId);
+      }
+    })
+    .catch(error => console.error('載入分頁資料失敗:', error));
+}
+
 // 填充表格
 function populateTable(data) {
   const tableBody = document.querySelector('#results-table tbody');
@@ -388,6 +451,13 @@ function populateTable(data) {
   });
 
   // 填充表格
+  appendTableRows(data);
+}
+
+// 將資料列附加到表格（分頁載入時使用，伺服器已依公司代號、月份排序）
+function appendTableRows(data) {
+  const tableBody = document.querySelector('#results-table tbody');
+  const fragment = document.createDocumentFragment();
   data.forEach(item => {
     const row = document.createElement('tr');
 
@@ -398,8 +468,9 @@ function populateTable(data) {
       row.appendChild(cell);
     });
 
-    tableBody.appendChild(row);
+    fragment.appendChild(row);
   });
+  tableBody.appendChild(fragment);
 }
 
 
@@ -510,51 +581,103 @@ document.addEventListener('DOMContentLoaded', function () {
   }
 
   // 確保所有歷史項目的事件處理（包括折疊區域內的）
-  const allHistoryItems = document.querySelectorAll('.history-item');
-  allHistoryItems.forEach(item => {
-    item.addEventListener('click', function (e) {
-      e.preventDefault();
-
-      // 設定公司代號
-      const companyIds = this.dataset.companyIds;
-      document.getElementById('company-ids').value = companyIds;
-      document.getElementById('company-ids-hidden').value = companyIds;
+  document.querySelectorAll('.history-item').forEach(bindHistoryItem);
+
+  // 分頁載入更早的查詢紀錄
+  const loadMoreHistory = document.getElementById('load-more-history');
+  if (loadMoreHistory) {
+    loadMoreHistory.addEventListener('click', function () {
+      const cursor = this.dataset.cursor;
+      this.disabled = true;
+      fetch(`/api/query-history?cursor=${encodeURIComponent(cursor)}`)
+        .then(response => response.json())
+        .then(result => {
+          if (result.error) {
+            throw new Error(result.error);
+          }
+          const list = document.querySelector('.history-list-more');
+          result.data.forEach(query => {
+            const item = createHistoryItem(query);
+            list.appendChild(item);
+            bindHistoryItem(item);
+          });
+          if (result.next_cursor) {
+            this.dataset.cursor = result.next_cursor;
+            this.disabled = false;
+          } else {
+            this.remove();
+          }
+        })
+        .catch(error => {
+          console.error('載入查詢紀錄失敗:', error);
+          this.disabled = false;
+        });
+    });
+  }
+});
 
-      // 處理公司標籤（如果您使用標籤顯示選擇的公司）
-      updateCompanyTags(companyIds);
+// 建立查詢紀錄項目（與 index.html 的模板結構相同）
+function createHistoryItem(query) {
+  const item = document.createElement('a');
+  item.href = '#';
+  item.className = 'list-group-item list-group-item-action history-item border-start border-custom-info border-1';
+  item.dataset.companyIds = query.company_ids;
+  item.dataset.yearRange = query.year_range;
+  item.dataset.monthRange = query.month_range;
+
+  const wrapper = document.createElement('div');
+  wrapper.className = 'd-flex w-100 justify-content-between';
+  const title = document.createElement('h6');
+  title.className = 'mb-1';
+  title.textContent = query.company_ids;
+  const range = document.createElement('small');
+  range.className = 'text-muted';
+  range.textContent = `${query.year_range}, ${query.month_range}`;
+  wrapper.appendChild(title);
+  wrapper.appendChild(range);
+  item.appendChild(wrapper);
+  return item;
+}
 
-      // 解析年份範圍 (例如 "111-112" 或 "112")
-      const yearRange = this.dataset.yearRange;
-      if (yearRange.includes('-')) {
-        const years = yearRange.split('-');
-        document.getElementById('start-year').value = years[0];
-        document.getElementById('end-year').value = years[1];
-      } else {
-        document.getElementById('start-year').value = yearRange;
-        document.getElementById('end-year').value = yearRange;
-      }
+// 點擊查詢紀錄時帶入表單
+function bindHistoryItem(item) {
+  item.addEventListener('click', function (e) {
+    e.preventDefault();
+
+    // 設定公司代號
+    const companyIds = this.dataset.companyIds;
+    document.getElementById('company-ids').value = companyIds;
+    document.getElementById('company-ids-hidden').value = companyIds;
+
+    // 處理公司標籤（如果您使用標籤顯示選擇的公司）
+    updateCompanyTags(companyIds);
+
+    // 解析年份範圍 (例如 "111-112" 或 "112")
+    const yearRange = this.dataset.yearRange;
+    if (yearRange.includes('-')) {
+      const years = yearRange.split('-');
+      document.getElementById('start-year').value = years[0];
+      document.getElementById('end-year').value = years[1];
+    } else {
+      document.getElementById('start-year').value = yearRange;
+      document.getElementById('end-year').value = yearRange;
+    }
 
-      // 解析月份範圍 (例如 "1-3" 或 "6")
-      const monthRange = this.dataset.monthRange;
-      if (monthRange.includes('-')) {
-        const months = monthRange.split('-');
-        document.getElementById('start-month').value = months[0];
-        document.getElementById('end-month').value = months[1];
-      } else {
-        document.getElementById('start-month').value = monthRange;
-        document.getElementById('end-month').value = monthRange;
-      }
-    });
+    // 解析月份範圍 (例如 "1-3" 或 "6")
+    const monthRange = this.dataset.monthRange;
+    if (monthRange.includes('-')) {
+      const months = monthRange.split('-');
+      document.getElementById('start-month').value = months[0];
+      document.getElementById('end-month').value = months[1];
+    } else {
+      document.getElementById('start-month').value = monthRange;
+      document.getElementById('end-month').value = monthRange;
+    }
   });
-});
+}
 
 // 更新公司標籤的輔助函數（如果您使用標籤顯示選擇的公司）
 function updateCompanyTags(companyIdsStr) {
-  // 如果不需要處理標籤，可以移除此函數
-  if (!window.STOCK_LIST || !Array.isArray(window.STOCK_LIST)) {
-    return;
-  }
-
   // 清空現有標籤
   const selectedCompaniesContainer = document.getElementById('selected-companies');
   if (selectedCompaniesContainer) {
@@ -572,16 +695,22 @@ function updateCompanyTags(companyIdsStr) {
     if (trimmedId) {
       selectedCompanies.push(trimmedId);
 
-      // 找到對應的公司資訊
-      const companyInfo = window.STOCK_LIST.find(company => company.code === trimmedId);
-
-      if (companyInfo && selectedCompaniesContainer) {
-        // 創建新標籤
+      if (selectedCompaniesContainer) {
+        // 創建新標籤，先顯示代號，再向伺服器查詢公司名稱
         const tag = document.createElement('span');
         tag.classList.add('company-tag');
 
         const tagText = document.createElement('span');
-        tagText.textContent = `${companyInfo.code} ${companyInfo.name}`;
+        tagText.textContent = trimmedId;
+        fetch(`/api/companies?${new URLSearchParams({ q: trimmedId, limit: 1 })}`)
+          .then(response => response.ok ? response.json() : { data: [] })
+          .then(result => {
+            const companyInfo = (result.data || [])[0];
+            if (companyInfo && companyInfo.code === trimmedId) {
+              tagText.textContent = `${companyInfo.code} ${companyInfo.name}`;
+            }
+          })
+          .catch(error => console.error('查詢公司名稱時出錯:', error));
 
         const removeButton = document.createElement('span');
         removeButton.classList.add('remove-btn');
@@ -9,18 +9,36 @@ class ChartManager {
   constructor(options = {}) {
     // 保存對 currentData 的參考
     this.currentDataGetter = options.currentDataGetter || (() => []);
+    // 查詢結果代號：有代號時只送代號，由伺服器端取得完整資料
+    this.resultIdGetter = options.resultIdGetter || (() => null);
+    // 每條系列最大點數：行動裝置預設由伺服器端降採樣，減少傳輸與繪製時間
+    this.maxPoints = options.maxPoints !== undefined
+      ? options.maxPoints
+      : (window.matchMedia('(max-width: 768px)').matches ? 60 : null);
     this.chartContainer = options.chartContainer || 'chart-container';
     this.chartSection = options.chartSection || 'chart-section';
     this.chartTitle = options.chartTitle || 'chart-title';
   }
 
+  /**
+   * 建立圖表請求內容：優先使用結果代號，避免重新上傳整份查詢結果
+   * @param {Object} options - 其他圖表選項（例如 company_id）
+   */
+  buildChartRequestBody(options = {}) {
+    const resultId = this.resultIdGetter();
+    if (this.maxPoints) {
+      options = { max_points: this.maxPoints, ...options };
+    }
+    if (resultId) {
+      return JSON.stringify({ result_id: resultId, ...options });
+    }
+    return JSON.stringify({ data: this.currentDataGetter(), ...options });
+  }
+
   /**
    * 獲取營收圖表數據
    */
   fetchRevenueChartData() {
-    // 獲取當前數據
-    const currentData = this.currentDataGetter();
-    
     // 顯示圖表區域和加載訊息
     document.getElementById(this.chartSection).style.display = 'block';
     document.getElementById(this.chartTitle).textContent = '公司營收比較圖';
@@ -31,9 +49,7 @@ class ChartManager {
       headers: {
         'Content-Type': 'application/json',
       },
-      body: JSON.stringify({
-        data: currentData
-      }),
+      body: this.buildChartRequestBody(),
     })
       .then(response => response.json())
       .then(data => {
@@ -94,8 +110,6 @@ class ChartManager {
    * 獲取增長率圖表數據
    */
   fetchGrowthRateChartData() {
-    const currentData = this.currentDataGetter();
-    
     // 顯示圖表區域和加載訊息
     document.getElementById(this.chartSection).style.display = 'block';
     document.getElementById(this.chartTitle).textContent = '公司營收增減率比較圖';
@@ -106,9 +120,7 @@ class ChartManager {
       headers: {
         'Content-Type': 'application/json',
       },
-      body: JSON.stringify({
-        data: currentData
-      }),
+      body: this.buildChartRequestBody(),
     })
       .then(response => response.json())
       .then(data => {
@@ -219,8 +231,6 @@ class ChartManager {
    * 獲取年度比較圖表數據
    */
   fetchYearlyComparisonData(companyId) {
-    const currentData = this.currentDataGetter();
-    
     // 顯示圖表區域和加載訊息
     document.getElementById(this.chartSection).style.display = 'block';
     document.getElementById(this.chartTitle).textContent = `${companyId} 歷年營收比較圖`;
@@ -231,10 +241,7 @@ class ChartManager {
       headers: {
         'Content-Type': 'application/json',
       },
-      body: JSON.stringify({
-        data: currentData,
-        company_id: companyId
-      }),
+      body: this.buildChartRequestBody({ company_id: companyId }),
     })
       .then(response => response.json())
       .then(data => {
@@ -1,28 +1,110 @@
 import os
+import hmac
+import functools
 import sqlite3
 import hashlib
-from flask import session, request, redirect, url_for, flash
-from utils.database import Database
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import session, request, redirect, url_for, flash, jsonify
+from config import Config
+from utils.database import get_db
 import logging
 
 logger = logging.getLogger(__name__)
 
-# 初始化資料庫物件
-db = Database(os.path.join(os.environ.get("DATABASE_DIR", "./data"), "data.db"))
+# 密碼雜湊格式：迭代次數（4 bytes）+ salt（32 bytes）+ 雜湊值（32 bytes）
+# 舊格式為 salt + 雜湊值（64 bytes），固定 100000 次迭代
+SALT_SIZE = 32
+LEGACY_ITERATIONS = 100000
+_ITERATIONS_SIZE = 4
 
-def hash_password(password, salt=None):
-    """密碼加密函數，使用 PBKDF2_HMAC 搭配 SHA256"""
+# 密碼雜湊執行緒池（延遲建立）；PBKDF2 會釋放 GIL，在真實執行緒中計算時
+# gevent 事件迴圈可繼續處理其他連線
+_hash_pool = None
+_hash_slots = None
+_hash_pool_lock = threading.Lock()
+
+
+class PasswordHashBusy(Exception):
+    """等待中的密碼雜湊數量已達上限"""
+
+
+def _pbkdf2(password, salt, iterations):
+    return hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt, iterations)
+
+
+def _gevent_patched():
+    """目前行程是否已由 gevent monkey patch（gunicorn gevent worker）"""
+    try:
+        from gevent import monkey
+    except ImportError:
+        return False
+    return monkey.is_module_patched('threading')
+
+
+def _get_hash_pool():
+    """建立密碼雜湊執行緒池與排隊名額；PASSWORD_HASH_THREADS 為 0 時返回 None"""
+    global _hash_pool, _hash_slots
+    if Config.PASSWORD_HASH_THREADS <= 0:
+        return None
+    with _hash_pool_lock:
+        if _hash_pool is None:
+            if _gevent_patched():
+                # gevent 的 ThreadPool 使用真實執行緒，等待結果時讓出事件迴圈
+                from gevent.threadpool import ThreadPool
+                _hash_pool = ThreadPool(Config.PASSWORD_HASH_THREADS)
+            else:
+                _hash_pool = ThreadPoolExecutor(
+                    max_workers=Config.PASSWORD_HASH_THREADS, thread_name_prefix='password-hash'
+                )
+            _hash_slots = threading.BoundedSemaphore(
+                Config.PASSWORD_HASH_THREADS + Config.PASSWORD_HASH_QUEUE_SIZE
+            )
+        return _hash_pool
+
+
+def _run_hash(password, salt, iterations):
+    """
+    於密碼雜湊執行緒池計算 PBKDF2，排隊已滿時等待至多 PASSWORD_HASH_TIMEOUT 秒
+
+    Raises:
+        PasswordHashBusy: 等待逾時
+    """
+    pool = _get_hash_pool()
+    if pool is None:
+        return _pbkdf2(password, salt, iterations)
+    if not _hash_slots.acquire(timeout=Config.PASSWORD_HASH_TIMEOUT):
+        raise PasswordHashBusy('登入人數過多，請稍後再試')
+    try:
+        if isinstance(pool, ThreadPoolExecutor):
+            return pool.submit(_pbkdf2, password, salt, iterations).result()
+        return pool.apply(_pbkdf2, (password, salt, iterations))
+    finally:
+        _hash_slots.release()
+
+
+def hash_password(password, salt=None, iterations=None):
+    """密碼加密函數，使用 PBKDF2_HMAC 搭配 SHA256（迭代次數一併保存）"""
     if not salt:
-        salt = os.urandom(32)  # 產生 32 bytes 的隨機 salt
-    pw_hash = hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt, 100000)
-    return salt + pw_hash  # 回傳 salt 與雜湊值的組合
+        salt = os.urandom(SALT_SIZE)  # 產生 32 bytes 的隨機 salt
+    iterations = iterations or Config.PASSWORD_HASH_ITERATIONS
+    pw_hash = _run_hash(password, salt, iterations)
+    return iterations.to_bytes(_ITERATIONS_SIZE, 'big') + salt + pw_hash
 
 def verify_password(stored_password, provided_password):
-    """驗證密碼是否正確"""
-    salt = stored_password[:32]  # 前32位為 salt
-    stored_pw_hash = stored_password[32:]
-    pw_hash = hashlib.pbkdf2_hmac('sha256', provided_password.encode('utf-8'), salt, 100000)
-    return pw_hash == stored_pw_hash
+    """驗證密碼是否正確（相容舊版不含迭代次數的格式，以常數時間比較）"""
+    if not stored_password:
+        return False  # Google 登入的帳號沒有密碼
+    stored_password = bytes(stored_password)
+    if len(stored_password) == SALT_SIZE * 2:
+        iterations = LEGACY_ITERATIONS
+    else:
+        iterations = int.from_bytes(stored_password[:_ITERATIONS_SIZE], 'big')
+        stored_password = stored_password[_ITERATIONS_SIZE:]
+    salt = stored_password[:SALT_SIZE]
+    stored_pw_hash = stored_password[SALT_SIZE:]
+    pw_hash = _run_hash(provided_password, salt, iterations)
+    return hmac.compare_digest(pw_hash, stored_pw_hash)
 
 def login_user(username, password):
     """驗證用戶登入
@@ -36,7 +118,7 @@ def login_user(username, password):
     """
     try:
         # 從數據庫尋找指定用戶名的用戶
-        with sqlite3.connect(db.db_path) as conn:
+        with sqlite3.connect(get_db().db_path) as conn:
             conn.row_factory = sqlite3.Row
             cursor = conn.cursor()
             cursor.execute("SELECT * FROM users WHERE username = ?", (username,))
@@ -50,13 +132,15 @@ def login_user(username, password):
             return False, "用戶名或密碼不正確"
         
         # 更新登入時間
-        db.update_user_login(user['id'])
+        get_db().update_user_login(user['id'])
         
         # 將用戶ID存入session
         session['user_id'] = user['id']
         session['username'] = user['username']
         
         return True, user['id']
+    except PasswordHashBusy as e:
+        return False, str(e)
     except Exception as e:
         logger.error(f"用戶登入時出錯: {e}")
         return False, "登入過程中出現錯誤，請稍後再試"
@@ -78,7 +162,7 @@ def register_user(username, email, password):
             return False, "所有欄位都必須填寫"
         
         # 連接到資料庫並檢查是否已存在相同的 email 或 username
-        with sqlite3.connect(db.db_path) as conn:
+        with sqlite3.connect(get_db().db_path) as conn:
             cursor = conn.cursor()
             
             # 檢查電子郵件是否已被註冊
@@ -117,4 +201,15 @@ def logout_user():
     """登出用戶"""
     session.pop('user_id', None)
     session.pop('username', None)
-    return True
\ No newline at end of file
+    return True
+
+def admin_required(view):
+    """限管理員（Config.ADMIN_USERNAMES）使用的 API 端點：未登入返回 401，非管理員返回 403"""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if 'user_id' not in session:
+            return jsonify({'error': '請先登入'}), 401
+        if session.get('username') not in Config.ADMIN_USERNAMES:
+            return jsonify({'error': '需要管理員權限'}), 403
+        return view(*args, **kwargs)
+    return wrapper
@@ -0,0 +1,183 @@
+import logging
+
+import numpy as np
+
+from utils.records import RevenueRecord
+
+# 配置日誌
+logger = logging.getLogger(__name__)
+
+
+def _to_float(value):
+    """將含千分位逗號的數字字串轉為浮點數，無法解析時返回 NaN"""
+    try:
+        return float(str(value).replace(',', ''))
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _to_json_list(row):
+    """將 NumPy 陣列轉為 JSON 可用的列表，NaN 轉為 None（Highcharts 的缺失值）"""
+    return [value if value == value else None for value in row.tolist()]
+
+
+class RevenuePivot:
+    """
+    營收樞紐表：一次掃描資料建立「公司 × 月份」矩陣，
+    營收、增長率與年度比較圖表都由同一份矩陣產生，不再逐圖表重複分組與解析。
+
+    Example:
+        pivot = RevenuePivot(sorted_data)
+        revenue_chart = pivot.revenue_chart()
+        growth_chart = pivot.growth_rate_chart()
+        yearly_chart = pivot.yearly_comparison('2330')
+    """
+
+    def __init__(self, records):
+        """
+        Args:
+            records (list): RevenueRecord 或舊版字典格式的公司營收資料列表
+        """
+        company_index = {}
+        month_index = {}
+        company_names = []
+        name_months = []
+        company_pos = []
+        month_pos = []
+        revenue_values = []
+        growth_values = []
+        periods = {}
+
+        # 單次掃描：建立公司與月份索引並取得數值
+        for item in records:
+            if isinstance(item, RevenueRecord):
+                # 已解析的數值欄位直接使用
+                company_id = item.company_id
+                company_name = item.company_name
+                # 相同年月只格式化一次月份字串
+                month = periods.get((item.year, item.month))
+                if month is None:
+                    month = periods[(item.year, item.month)] = item.period
+                revenue = np.nan if item.revenue is None else item.revenue
+                growth = np.nan if item.mom_change is None else item.mom_change
+            else:
+                company_id = item['公司代號']
+                company_name = item['公司名稱']
+                month = item['月份']
+                revenue = _to_float(item['當月營收'])
+                growth = _to_float(item['上月比較增減(%)'])
+
+            ci = company_index.get(company_id)
+            if ci is None:
+                ci = company_index[company_id] = len(company_names)
+                company_names.append(company_name)
+                name_months.append(month)
+            elif month < name_months[ci]:
+                # 與舊版一致：公司名稱取最早月份的資料
+                company_names[ci] = company_name
+                name_months[ci] = month
+
+            mi = month_index.get(month)
+            if mi is None:
+                mi = month_index[month] = len(month_index)
+
+            company_pos.append(ci)
+            month_pos.append(mi)
+            revenue_values.append(revenue)
+            growth_values.append(growth)
+
+        self.company_ids = list(company_index)
+        self.company_names = company_names
+        self._company_index = company_index
+
+        # 月份排序後重新對應欄位位置
+        unsorted_months = list(month_index)
+        order = sorted(range(len(unsorted_months)), key=unsorted_months.__getitem__)
+        self.categories = [unsorted_months[i] for i in order]
+        remap = np.empty(len(unsorted_months), dtype=np.intp)
+        remap[order] = np.arange(len(unsorted_months))
+
+        shape = (len(self.company_ids), len(self.categories))
+        self.revenue = np.full(shape, np.nan)
+        self.growth_rate = np.full(shape, np.nan)
+        self._present = np.zeros(shape, dtype=bool)
+
+        if company_pos:
+            rows = np.asarray(company_pos, dtype=np.intp)
+            cols = remap[np.asarray(month_pos, dtype=np.intp)]
+            self._present[rows, cols] = True
+            # 反向寫入，重複的公司月份以第一筆為準（與舊版逐筆搜尋的結果相同）
+            self.revenue[rows[::-1], cols[::-1]] = np.asarray(revenue_values)[::-1]
+            self.growth_rate[rows[::-1], cols[::-1]] = np.asarray(growth_values)[::-1]
+
+        # 由類別字串解析年份與月份，供年度比較使用
+        self._years = np.array([int(month.split('-')[0]) for month in self.categories], dtype=int)
+        self._months = np.array([int(month.split('-')[1]) for month in self.categories], dtype=int)
+
+    def _series(self, matrix):
+        return [
+            {'name': f"{company_id} {self.company_names[ci]}", 'data': _to_json_list(matrix[ci])}
+            for ci, company_id in enumerate(self.company_ids)
+        ]
+
+    def revenue_chart(self):
+        """營收比較圖表數據"""
+        return {'categories': list(self.categories), 'series': self._series(self.revenue)}
+
+    def growth_rate_chart(self):
+        """營收增長率比較圖表數據"""
+        return {'categories': list(self.categories), 'series': self._series(self.growth_rate)}
+
+    def chart(self, chart_type='revenue'):
+        """依圖表類型返回數據，格式同 data_processor.prepare_chart_data"""
+        if chart_type == 'revenue':
+            return self.revenue_chart()
+        if chart_type == 'growth_rate':
+            return self.growth_rate_chart()
+        return {'categories': list(self.categories), 'series': []}
+
+    def yearly_comparison(self, company_id):
+        """
+        單一公司的年度比較圖表數據（每年一條 1-12 月的營收線）
+
+        Returns:
+            dict or None: 圖表數據，找不到公司時返回 None
+        """
+        ci = self._company_index.get(company_id)
+        if ci is None:
+            return None
+
+        row = self.revenue[ci]
+        # 只保留該公司有資料的月份（含營收無法解析者，與舊版相同）
+        present = self._present[ci]
+        valid = present & (self._months >= 1) & (self._months <= 12)
+        years = np.unique(self._years[present])
+
+        grid = np.full((len(years), 12), np.nan)
+        year_pos = np.searchsorted(years, self._years[valid])
+        grid[year_pos, self._months[valid] - 1] = row[valid]
+
+        return {
+            'categories': [f"{i:02d}" for i in range(1, 13)],
+            'series': [
+                {'name': f"{year} 年", 'data': _to_json_list(grid[i])}
+                for i, year in enumerate(years.tolist())
+            ]
+        }
+
+    def all_charts(self, company_id=None):
+        """
+        一次產生所有圖表數據
+
+        Args:
+            company_id (str, optional): 年度比較的公司代號，未提供時為每家公司各產生一份
+
+        Returns:
+            dict: {'revenue': ..., 'growth_rate': ..., 'yearly_comparison': {公司代號: ...}}
+        """
+        company_ids = [company_id] if company_id else self.company_ids
+        return {
+            'revenue': self.revenue_chart(),
+            'growth_rate': self.growth_rate_chart(),
+            'yearly_comparison': {cid: self.yearly_comparison(cid) for cid in company_ids}
+        }
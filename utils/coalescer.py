@@ -0,0 +1,130 @@
+import os
+import time
+import uuid
+import logging
+import threading
+
+# 配置日誌
+logger = logging.getLogger(__name__)
+
+
+class _InFlight:
+    """同一行程內進行中的查詢，等待者共用同一份結果"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class RequestCoalescer:
+    """
+    相同查詢的請求合併器
+
+    第一個請求負責計算，其餘相同的並行請求等待並取得同一份結果：
+    1. 同一行程內以 threading.Event 等待（gevent 下為協作式等待）
+    2. 跨 worker 以資料庫的 query_leases 租約表協調，
+       取得租約者計算並寫回結果，其他 worker 以唯讀查詢輪詢租約狀態（間隔逐次加倍），
+       只在租約不存在或已過期時才嘗試取得（寫入交易）
+
+    Example:
+        coalescer = RequestCoalescer(db)
+        result = coalescer.run(cache_key, lambda: expensive_query())
+    """
+
+    def __init__(self, db, lease_ttl=300, result_ttl=30, poll_interval=0.2, wait_timeout=150,
+                 serialize=None, deserialize=None, max_poll_interval=2.0):
+        """
+        Args:
+            db (Database): 提供租約表存取的資料庫物件
+            lease_ttl (float): 計算中租約的有效秒數，需大於單次查詢的最長耗時
+            result_ttl (float): 完成後結果保留在租約表的秒數
+            poll_interval (float): 跨 worker 等待時的初始輪詢間隔（秒），之後逐次加倍
+            wait_timeout (float): 最長等待秒數，逾時後改為自行計算
+            serialize (callable, optional): 結果寫入租約表前轉為可 JSON 序列化的格式
+            deserialize (callable, optional): 從租約表讀回結果時還原
+            max_poll_interval (float): 輪詢間隔上限（秒）
+        """
+        self.db = db
+        self.lease_ttl = lease_ttl
+        self.result_ttl = result_ttl
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.wait_timeout = wait_timeout
+        self.serialize = serialize or (lambda result: result)
+        self.deserialize = deserialize or (lambda result: result)
+        self._owner_prefix = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def run(self, key, compute):
+        """
+        執行或等待相同鍵的查詢
+
+        Args:
+            key (str): 查詢的唯一鍵
+            compute (callable): 無參數的計算函數，返回值經 serialize 後需可 JSON 序列化
+
+        Returns:
+            計算結果（等待者與計算者取得相同內容）
+        """
+        with self._lock:
+            flight = self._inflight.get(key)
+            is_leader = flight is None
+            if is_leader:
+                flight = _InFlight()
+                self._inflight[key] = flight
+
+        if not is_leader:
+            logger.info(f"合併進行中的相同查詢: {key}")
+            if not flight.event.wait(self.wait_timeout):
+                logger.warning(f"等待合併查詢逾時，改為自行計算: {key}")
+                return compute()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = self._run_with_lease(key, compute)
+            return flight.result
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.event.set()
+
+    def discard(self, key):
+        """捨棄其他 worker 已完成、仍保留在租約表中的結果（資料更新後使用）"""
+        self.db.discard_query_result(key)
+
+    def _run_with_lease(self, key, compute):
+        """透過租約表與其他 worker 協調，確保每個查詢只計算一次"""
+        owner = f"{self._owner_prefix}-{threading.get_ident()}"
+        deadline = time.time() + self.wait_timeout
+        interval = self.poll_interval
+
+        while True:
+            lease = self.db.get_query_lease(key)
+            if lease is None and self.db.acquire_query_lease(key, owner, self.lease_ttl):
+                try:
+                    result = compute()
+                except Exception:
+                    self.db.release_query_lease(key, owner)
+                    raise
+                self.db.complete_query_lease(key, owner, self.serialize(result), self.result_ttl)
+                return result
+
+            if lease and lease['status'] == 'done':
+                lease = self.db.get_query_lease(key, include_result=True)
+                if lease and lease['result'] is not None:
+                    logger.info(f"取用其他 worker 的查詢結果: {key}")
+                    return self.deserialize(lease['result'])
+
+            if time.time() >= deadline:
+                logger.warning(f"等待其他 worker 逾時，改為自行計算: {key}")
+                return compute()
+
+            time.sleep(interval)
+            interval = min(interval * 2, self.max_poll_interval)
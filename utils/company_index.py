@@ -0,0 +1,232 @@
+import re
+import time
+import logging
+import threading
+
+# 配置日誌
+logger = logging.getLogger(__name__)
+
+# stock_list.js 的單筆格式：{ code: "1101", name: "台泥", industry: "水泥工業", market: "國內上市" }
+_STOCK_LIST_PATTERN = re.compile(
+    r'\{\s*code:\s*"([^"]+)",\s*name:\s*"([^"]*)",\s*industry:\s*"([^"]*)",\s*market:\s*"([^"]*)"\s*\}'
+)
+
+# 月營收彙總頁面（sii）皆為上市公司
+HARVEST_MARKET = '國內上市'
+
+
+def parse_stock_list(path):
+    """
+    解析 stock_list.js 作為公司名錄的初始資料
+
+    Returns:
+        list: [(company_id, name, industry, market), ...]
+    """
+    try:
+        with open(path, encoding='utf-8') as f:
+            return _STOCK_LIST_PATTERN.findall(f.read())
+    except OSError as e:
+        logger.warning(f"無法讀取公司清單 {path}: {e}")
+        return []
+
+
+def _ngrams(text, n):
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+class CompanyIndex:
+    """
+    公司名錄的記憶體索引：代號前綴索引與名稱 n-gram（單字、雙字）索引
+
+    名錄資料保存在資料庫 companies 表，由 stock_list.js 初始化，
+    並在解析月營收頁面時收錄新公司。
+
+    Example:
+        company_index.load(db)
+        company_index.search('台積', limit=10)
+        company_index.unknown_ids(['2330', '9999'])  # ['9999']
+    """
+
+    def __init__(self, refresh_interval=600):
+        """
+        Args:
+            refresh_interval (float): 從資料庫重新載入的間隔秒數（同步其他 worker 收錄的公司）
+        """
+        self.refresh_interval = refresh_interval
+        self._db = None
+        # (公司資料, 代號前綴索引, 名稱 n-gram 索引)，整份替換以確保讀取端看到一致的快照
+        self._state = ({}, {}, {})
+        self._loaded_at = 0
+        self._lock = threading.Lock()
+
+    def load(self, db):
+        """從資料庫載入名錄並重建索引，之後收錄的公司會寫回此資料庫"""
+        self._db = db
+        rows = db.get_companies()
+        companies = {row['company_id']: row for row in rows}
+        code_prefix = {}
+        name_grams = {}
+        for company_id, company in companies.items():
+            for i in range(1, len(company_id) + 1):
+                code_prefix.setdefault(company_id[:i], set()).add(company_id)
+            for gram in _ngrams(company['name'], 1) | _ngrams(company['name'], 2):
+                name_grams.setdefault(gram, set()).add(company_id)
+
+        with self._lock:
+            self._state = (companies, code_prefix, name_grams)
+            self._loaded_at = time.time()
+        logger.info(f"已載入公司名錄，共 {len(companies)} 家")
+
+    def refresh_if_stale(self):
+        """超過 refresh_interval 未載入時重新載入"""
+        if self._db is not None and time.time() - self._loaded_at > self.refresh_interval:
+            self.load(self._db)
+
+    @property
+    def _companies(self):
+        return self._state[0]
+
+    def __len__(self):
+        return len(self._companies)
+
+    def get(self, company_id):
+        return self._companies.get(company_id)
+
+    def register(self, companies, market=HARVEST_MARKET):
+        """
+        收錄解析頁面時看到的新公司（含已下市公司，歷史查詢仍有效）
+
+        既有公司的名稱不覆寫：舊月份頁面上的名稱可能是更名前的舊名。
+
+        Args:
+            companies (list): [(company_id, name), ...]
+            market (str): 市場別
+        """
+        known = self._companies
+        new_companies = {
+            company_id: name for company_id, name in companies
+            if company_id and name and company_id not in known
+        }
+        if not new_companies:
+            return
+
+        # 寫入時複製（copy-on-write），搜尋中的執行緒不會看到修改到一半的索引
+        with self._lock:
+            companies, code_prefix, name_grams = (dict(part) for part in self._state)
+            for company_id, name in new_companies.items():
+                companies[company_id] = {'company_id': company_id, 'name': name, 'industry': None, 'market': market}
+                for i in range(1, len(company_id) + 1):
+                    code_prefix[company_id[:i]] = code_prefix.get(company_id[:i], set()) | {company_id}
+                for gram in _ngrams(name, 1) | _ngrams(name, 2):
+                    name_grams[gram] = name_grams.get(gram, set()) | {company_id}
+            self._state = (companies, code_prefix, name_grams)
+
+        if self._db is not None:
+            self._db.upsert_companies(
+                [(company_id, name, None, market) for company_id, name in new_companies.items()],
+                update_existing=False
+            )
+        logger.info(f"收錄 {len(new_companies)} 家新公司至名錄")
+
+    def unknown_ids(self, company_ids):
+        """
+        返回名錄中不存在的公司代號；名錄尚未建立時不做檢查
+
+        Returns:
+            list: 不存在的公司代號
+        """
+        if not self._companies:
+            return []
+        return [company_id for company_id in company_ids if company_id not in self._companies]
+
+    def _name_matches(self, companies, name_grams, query):
+        grams = _ngrams(query, 2) if len(query) >= 2 else {query}
+        candidates = None
+        for gram in grams:
+            postings = name_grams.get(gram)
+            if not postings:
+                return set()
+            candidates = set(postings) if candidates is None else candidates & postings
+        # n-gram 交集可能含非連續的組合，最後以子字串確認
+        return {company_id for company_id in candidates or () if query in companies[company_id]['name']}
+
+    def search(self, query, limit=20, industry=None, market=None):
+        """
+        代號前綴與名稱模糊搜尋
+
+        排序：代號完全相符 → 代號前綴 → 名稱開頭 → 名稱包含，同級依代號排序
+
+        Args:
+            query (str): 搜尋字串（代號或名稱片段）
+            limit (int): 最多筆數
+            industry (str, optional): 產業別篩選
+            market (str, optional): 市場別篩選
+
+        Returns:
+            list: [{'code', 'name', 'industry', 'market'}, ...]
+        """
+        query = (query or '').strip()
+        # 取得索引快照，收錄新公司時整份替換，不影響進行中的搜尋
+        companies, code_prefix, name_grams = self._state
+
+        if query:
+            ranked = {}
+            for company_id in code_prefix.get(query.upper(), ()):
+                ranked[company_id] = 0 if company_id == query.upper() else 1
+            for company_id in self._name_matches(companies, name_grams, query):
+                rank = 2 if companies[company_id]['name'].startswith(query) else 3
+                ranked[company_id] = min(ranked.get(company_id, rank), rank)
+            candidates = sorted(ranked, key=lambda company_id: (ranked[company_id], company_id))
+        elif industry or market:
+            candidates = sorted(companies)
+        else:
+            return []
+
+        results = []
+        for company_id in candidates:
+            company = companies[company_id]
+            if industry and company['industry'] != industry:
+                continue
+            if market and company['market'] != market:
+                continue
+            results.append({
+                'code': company_id,
+                'name': company['name'],
+                'industry': company['industry'] or '',
+                'market': company['market'] or ''
+            })
+            if len(results) >= limit:
+                break
+        return results
+
+    def facets(self):
+        """
+        產業別與市場別選項（供篩選下拉選單）
+
+        Returns:
+            tuple: (產業別列表, 市場別列表)
+        """
+        companies = list(self._companies.values())
+        industries = sorted({company['industry'] for company in companies if company['industry']})
+        markets = sorted({company['market'] for company in companies if company['market']})
+        return industries, markets
+
+
+# 全域公司名錄索引（app 啟動時載入，爬蟲解析頁面時收錄）
+company_index = CompanyIndex()
+
+
+def init_company_registry(db, seed_path):
+    """
+    初始化公司名錄：資料庫為空時由 stock_list.js 匯入，再載入記憶體索引
+
+    Args:
+        db (Database): 資料庫物件
+        seed_path (str): stock_list.js 路徑
+    """
+    if db.count_companies() == 0:
+        seed = parse_stock_list(seed_path)
+        if seed:
+            db.upsert_companies(seed)
+            logger.info(f"已由 {seed_path} 匯入 {len(seed)} 家公司")
+    company_index.load(db)
@@ -1,8 +1,10 @@
 from itertools import groupby
+from operator import attrgetter
 import logging
+from utils.chart_pivot import RevenuePivot
+from utils.records import to_records
 
 # 配置日誌
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 def parse_range(input_range):
@@ -29,7 +31,7 @@ def calculate_yearly_averages(sorted_data, year_range):
     計算每年度的平均營收
     
     Args:
-        sorted_data (list): 排序後的公司資料列表
+        sorted_data (list): 排序後的公司資料列表（RevenueRecord 或舊版字典）
         year_range (list): 年份範圍
         
     Returns:
@@ -37,8 +39,8 @@ def calculate_yearly_averages(sorted_data, year_range):
     """
     result = {}
     
-    # 按公司代號分組
-    for company_id, group in groupby(sorted_data, key=lambda x: x['公司代號']):
+    # 按公司代號分組（數值欄位已在 RevenueRecord 中解析完成）
+    for company_id, group in groupby(to_records(sorted_data), key=attrgetter('company_id')):
         group_list = list(group)
         
         # 初始化該公司的年度資料
@@ -49,16 +51,12 @@ def calculate_yearly_averages(sorted_data, year_range):
         yearly_data = {year: [] for year in year_range}
         
         for company in group_list:
-            year = int(company['月份'].split('-')[0])
-            
             # 確保年份在範圍內
-            if year in yearly_data:
-                try:
-                    # 去除逗號並轉換為浮點數
-                    revenue = float(company['當月營收'].replace(',', ''))
-                    yearly_data[year].append(revenue)
-                except (ValueError, KeyError) as e:
-                    logger.warning(f"處理 {company_id} {year} 年數據時出錯: {e}")
+            if company.year in yearly_data:
+                if company.revenue is None:
+                    logger.warning(f"處理 {company_id} {company.year} 年數據時出錯: 營收無法解析")
+                    continue
+                yearly_data[company.year].append(company.revenue)
         
         # 計算平均值
         for year, revenues in yearly_data.items():
@@ -80,72 +78,7 @@ def prepare_chart_data(sorted_data, chart_type='revenue'):
     Returns:
         dict: 圖表所需的數據
     """
-    chart_data = {'categories': [], 'series': []}
-    
-    # 按公司代號分組
-    company_groups = {}
-    for item in sorted_data:
-        company_id = item['公司代號']
-        if company_id not in company_groups:
-            company_groups[company_id] = []
-        company_groups[company_id].append(item)
-    
-    # 確保每個組都按月份排序
-    for company_id, group in company_groups.items():
-        company_groups[company_id] = sorted(group, key=lambda x: x['月份'])
-    
-    # 收集所有月份作為類別
-    all_months = set()
-    for group in company_groups.values():
-        all_months.update(item['月份'] for item in group)
-    
-    # 將月份轉換為排序後的列表
-    chart_data['categories'] = sorted(list(all_months))
-    
-    # 根據圖表類型準備系列數據
-    for company_id, group in company_groups.items():
-        company_name = group[0]['公司名稱'] if group else company_id
-        
-        if chart_type == 'revenue':
-            # 營收數據
-            revenue_data = []
-            for month in chart_data['categories']:
-                found = False
-                for item in group:
-                    if item['月份'] == month:
-                        revenue_data.append(float(item['當月營收'].replace(',', '')))
-                        found = True
-                        break
-                if not found:
-                    revenue_data.append(None)  # 使用 None 表示缺失數據
-            
-            chart_data['series'].append({
-                'name': f"{company_id} {company_name}",
-                'data': revenue_data
-            })
-            
-        elif chart_type == 'growth_rate':
-            # 增長率數據
-            growth_data = []
-            for month in chart_data['categories']:
-                found = False
-                for item in group:
-                    if item['月份'] == month:
-                        try:
-                            growth_data.append(float(item['上月比較增減(%)']))
-                        except ValueError:
-                            growth_data.append(None)
-                        found = True
-                        break
-                if not found:
-                    growth_data.append(None)
-            
-            chart_data['series'].append({
-                'name': f"{company_id} {company_name}",
-                'data': growth_data
-            })
-    
-    return chart_data
+    return RevenuePivot(sorted_data).chart(chart_type)
 
 def prepare_yearly_comparison_data(sorted_data, company_id):
     """
@@ -158,45 +91,17 @@ def prepare_yearly_comparison_data(sorted_data, company_id):
     Returns:
         dict: 年度比較圖表所需的數據
     """
-    # 過濾選定公司的數據
-    company_data = [item for item in sorted_data if item['公司代號'] == company_id]
-    
-    if not company_data:
-        return None
-    
-    # 按年份分組
-    year_groups = {}
-    for item in company_data:
-        year = item['月份'].split('-')[0]
-        if year not in year_groups:
-            year_groups[year] = []
-        year_groups[year].append(item)
-    
-    # 準備圖表數據
-    chart_data = {
-        'categories': [f"{i:02d}" for i in range(1, 13)],  # 1-12 月
-        'series': []
-    }
+    return RevenuePivot(sorted_data).yearly_comparison(company_id)
+
+def prepare_all_charts(sorted_data, company_id=None):
+    """
+    由同一份樞紐矩陣一次準備營收、增長率與年度比較圖表
     
-    # 為每一年準備一個數據系列
-    for year, group in year_groups.items():
-        # 按月份排序
-        group = sorted(group, key=lambda x: int(x['月份'].split('-')[1]))
-        
-        # 收集每月數據
-        monthly_data = [None] * 12  # 初始化 12 個月的數據為 None
-        
-        for item in group:
-            month_idx = int(item['月份'].split('-')[1]) - 1  # 轉為 0-based index
-            if 0 <= month_idx < 12:  # 確保索引有效
-                try:
-                    monthly_data[month_idx] = float(item['當月營收'].replace(',', ''))
-                except ValueError:
-                    pass  # 保持為 None
+    Args:
+        sorted_data (list): 排序後的公司資料列表
+        company_id (str, optional): 年度比較的公司代號，未提供時為每家公司各產生一份
         
-        chart_data['series'].append({
-            'name': f"{year} 年",
-            'data': monthly_data
-        })
-    
-    return chart_data
\ No newline at end of file
+    Returns:
+        dict: {'revenue': ..., 'growth_rate': ..., 'yearly_comparison': {公司代號: ...}}
+    """
+    return RevenuePivot(sorted_data).all_charts(company_id)
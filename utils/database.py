@@ -1,43 +1,66 @@
 import sqlite3
 import os
 import json
+import zlib
 import logging
 import time
+import threading
+from config import Config
 from utils.timer_decorator import timer_decorator
+from utils.write_behind import WriteBehindQueue
+from utils.records import RevenueRecord
+from utils.pagination import encode_cursor, decode_cursor
+from utils.memory_budget import estimate_size
 
 # 配置日誌
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-class Database:
-    def __init__(self, db_path):
-        self.db_path = db_path
-        self.init_db()
-        # 增加記憶體快取import sqlite3
-import os
-import json
-import logging
-import time
-
-# 配置日誌
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
+# 資料庫結構版本（PRAGMA user_version）：修改 init_db 的資料表、索引或資料遷移時加一，
+# 已是最新版本的資料庫啟動時只讀取版本號，不再逐一執行 DDL 與遷移檢查
+# 版本 2：query_history.hit_count（查詢次數，預先抓取排名用）
+SCHEMA_VERSION = 2
 
 class Database:
-    def __init__(self, db_path):
+    def __init__(self, db_path, write_behind=False, batch_size=200, flush_interval=0.5,
+                 cache_max_entries=20000):
+        """
+        Args:
+            db_path (str): SQLite 資料庫路徑
+            write_behind (bool): 營收資料是否改為延遲批次寫入（由單一寫入執行緒合併交易）
+            batch_size (int): 延遲寫入每批最多筆數
+            flush_interval (float): 延遲寫入最長等待秒數
+            cache_max_entries (int): 記憶體快取最多項目數
+        """
         self.db_path = db_path
         self.init_db()
         # 增加記憶體快取
         self._query_cache = {}
         self._cache_timeout = 600  # 10分鐘快取過期
+        self._cache_max_entries = cache_max_entries
+        # 營收資料延遲寫入佇列
+        self._write_queue = None
+        if write_behind:
+            self._write_queue = WriteBehindQueue(
+                self._write_revenue_batch,
+                batch_size=batch_size,
+                flush_interval=flush_interval,
+                name='revenue-writer'
+            )
     
     @timer_decorator(log_level='info')
     def init_db(self):
-        """初始化數據庫表"""
+        """初始化數據庫表（已是 SCHEMA_VERSION 時略過）"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with sqlite3.connect(self.db_path, timeout=30) as conn:
+                if conn.execute('PRAGMA user_version').fetchone()[0] >= SCHEMA_VERSION:
+                    return
                 cursor = conn.cursor()
-                
+                # 取得寫入鎖後再確認一次：多個 worker 同時啟動時只由一個執行遷移
+                cursor.execute('BEGIN IMMEDIATE')
+                if cursor.execute('PRAGMA user_version').fetchone()[0] >= SCHEMA_VERSION:
+                    conn.rollback()
+                    return
+
                 # 建立查詢歷史表
                 cursor.execute('''
                 CREATE TABLE IF NOT EXISTS query_history (
@@ -46,6 +69,7 @@ class Database:
                     year_range TEXT NOT NULL,
                     month_range TEXT NOT NULL,
                     user_id INTEGER DEFAULT NULL,
+                    hit_count INTEGER DEFAULT 1,
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                 )
                 ''')
@@ -68,7 +92,83 @@ class Database:
                 CREATE INDEX IF NOT EXISTS idx_revenue_data_lookup 
                 ON revenue_data(company_id, year, month)
                 ''')
-                
+
+                # 建立查詢租約表（跨 worker 合併相同的進行中查詢）
+                cursor.execute('''
+                CREATE TABLE IF NOT EXISTS query_leases (
+                    query_key TEXT PRIMARY KEY,
+                    owner TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'running',
+                    result TEXT,
+                    expires_at REAL NOT NULL
+                )
+                ''')
+
+                # 建立公司名錄表（由 stock_list.js 初始化，解析月營收頁面時收錄）
+                cursor.execute('''
+                CREATE TABLE IF NOT EXISTS companies (
+                    company_id TEXT PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    industry TEXT,
+                    market TEXT,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+                ''')
+
+                # 建立背景查詢工作表（大型查詢改為非同步執行）
+                cursor.execute('''
+                CREATE TABLE IF NOT EXISTS query_jobs (
+                    id TEXT PRIMARY KEY,
+                    user_id TEXT,
+                    company_ids TEXT NOT NULL,
+                    year_range TEXT NOT NULL,
+                    month_range TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'queued',
+                    plan TEXT,
+                    result_id TEXT,
+                    error TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+                ''')
+                cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_query_jobs_user_status
+                ON query_jobs(user_id, status)
+                ''')
+
+                # 建立營收彙總表：月度（含年初至今、近十二個月）、季度、年度
+                cursor.execute('''
+                CREATE TABLE IF NOT EXISTS revenue_monthly_rollup (
+                    company_id TEXT NOT NULL,
+                    year INTEGER NOT NULL,
+                    month INTEGER NOT NULL,
+                    revenue REAL,
+                    ytd REAL,
+                    ttm REAL,
+                    PRIMARY KEY (company_id, year, month)
+                )
+                ''')
+                cursor.execute('''
+                CREATE TABLE IF NOT EXISTS revenue_quarterly_rollup (
+                    company_id TEXT NOT NULL,
+                    year INTEGER NOT NULL,
+                    quarter INTEGER NOT NULL,
+                    total REAL,
+                    months INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (company_id, year, quarter)
+                )
+                ''')
+                cursor.execute('''
+                CREATE TABLE IF NOT EXISTS revenue_yearly_rollup (
+                    company_id TEXT NOT NULL,
+                    year INTEGER NOT NULL,
+                    total REAL,
+                    months INTEGER NOT NULL DEFAULT 0,
+                    average REAL,
+                    PRIMARY KEY (company_id, year)
+                )
+                ''')
+
                 # 建立用戶表
                 cursor.execute('''
                 CREATE TABLE IF NOT EXISTS users (
@@ -100,118 +200,187 @@ class Database:
                 except sqlite3.OperationalError:
                     # 如果列不存在，則添加它
                     cursor.execute('ALTER TABLE query_history ADD COLUMN user_id INTEGER DEFAULT NULL')
-                
+
+                # 查詢次數（相同查詢 upsert 時累加）
+                try:
+                    cursor.execute('SELECT hit_count FROM query_history LIMIT 1')
+                except sqlite3.OperationalError:
+                    cursor.execute('ALTER TABLE query_history ADD COLUMN hit_count INTEGER DEFAULT 1')
+
+                # 查詢歷史改為依唯一鍵 upsert：建立唯一索引前先合併既有的重複記錄（保留最新一筆）
+                cursor.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_query_history_unique'"
+                )
+                if cursor.fetchone() is None:
+                    cursor.execute('''
+                    DELETE FROM query_history WHERE id NOT IN (
+                        SELECT id FROM (
+                            SELECT id, ROW_NUMBER() OVER (
+                                PARTITION BY company_ids, year_range, month_range, IFNULL(user_id, 0)
+                                ORDER BY created_at DESC, id DESC
+                            ) AS rn
+                            FROM query_history
+                        ) WHERE rn = 1
+                    )
+                    ''')
+                    if cursor.rowcount:
+                        logger.info(f"已合併 {cursor.rowcount} 筆重複的查詢歷史")
+                cursor.execute('''
+                CREATE UNIQUE INDEX IF NOT EXISTS idx_query_history_unique
+                ON query_history(company_ids, year_range, month_range, IFNULL(user_id, 0))
+                ''')
+
+                # 依用戶分頁列出查詢歷史（created_at DESC, id DESC）
+                cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_query_history_user_created
+                ON query_history(user_id, created_at)
+                ''')
+
+                # 既有營收資料尚未建立彙總時，補建一次
+                cursor.execute('SELECT 1 FROM revenue_monthly_rollup LIMIT 1')
+                if cursor.fetchone() is None:
+                    cursor.execute('SELECT 1 FROM revenue_data LIMIT 1')
+                    if cursor.fetchone() is not None:
+                        self._rebuild_revenue_rollups(cursor)
+
+                cursor.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
                 conn.commit()
-            logger.info("數據庫初始化完成")
+            logger.info(f"數據庫初始化完成（結構版本 {SCHEMA_VERSION}）")
         except sqlite3.Error as e:
             logger.error(f"初始化數據庫時出錯: {e}")
     
     @timer_decorator(log_level='debug')
     def add_query_history(self, company_ids, year_range, month_range, user_id=None):
-        """添加查詢歷史記錄，可選關聯用戶ID"""
+        """添加查詢歷史記錄，可選關聯用戶ID（相同查詢只更新時間戳並累加查詢次數）"""
         try:
             with sqlite3.connect(self.db_path) as conn:
                 cursor = conn.cursor()
-                
-                # 檢查是否已存在相同查詢
-                if user_id:
-                    cursor.execute('''
-                    SELECT id FROM query_history 
-                    WHERE company_ids = ? AND year_range = ? AND month_range = ? AND user_id = ?
-                    ''', (company_ids, year_range, month_range, user_id))
-                else:
-                    cursor.execute('''
-                    SELECT id FROM query_history 
-                    WHERE company_ids = ? AND year_range = ? AND month_range = ? AND user_id IS NULL
-                    ''', (company_ids, year_range, month_range))
-                
-                existing = cursor.fetchone()
-                if existing:
-                    # 如果存在，更新時間戳
-                    cursor.execute('''
-                    UPDATE query_history 
-                    SET created_at = CURRENT_TIMESTAMP
-                    WHERE id = ?
-                    ''', (existing[0],))
-                else:
-                    # 如果不存在，添加新記錄
-                    if user_id:
-                        cursor.execute('''
-                        INSERT INTO query_history (company_ids, year_range, month_range, user_id)
-                        VALUES (?, ?, ?, ?)
-                        ''', (company_ids, year_range, month_range, user_id))
-                    else:
-                        cursor.execute('''
-                        INSERT INTO query_history (company_ids, year_range, month_range)
-                        VALUES (?, ?, ?)
-                        ''', (company_ids, year_range, month_range))
-                    
+                cursor.execute('''
+                INSERT INTO query_history (company_ids, year_range, month_range, user_id)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(company_ids, year_range, month_range, IFNULL(user_id, 0))
+                DO UPDATE SET created_at = CURRENT_TIMESTAMP, hit_count = hit_count + 1
+                ''', (company_ids, year_range, month_range, user_id or None))
                 conn.commit()
                 
                 # 重要改進：清除查詢歷史的快取，確保下次獲取時能拿到最新數據
                 for key in list(self._query_cache.keys()):
                     if 'query_history' in key:
-                        del self._query_cache[key]
+                        self._query_cache.pop(key, None)
                     
         except sqlite3.Error as e:
             logger.error(f"添加查詢歷史時出錯: {e}")
 
     @timer_decorator(log_level='debug')
-    def get_query_history(self, user_id=None, force_refresh=False):
+    def get_query_history(self, user_id=None, force_refresh=False, page_size=None, cursor=None):
         """獲取查詢歷史記錄，可選按用戶ID過濾
         
         Args:
             user_id (int, optional): 用戶ID。如果提供，只返回該用戶的歷史。
             force_refresh (bool, optional): 是否強制刷新快取。默認為False。
+            page_size (int, optional): 每頁筆數，未提供時返回全部
+            cursor (str, optional): 上一頁返回的分頁游標
+
+        Returns:
+            list: 未指定 page_size 時返回歷史記錄列表
+            tuple: 指定 page_size 時返回 (歷史記錄列表, 下一頁游標或 None)
+
+        Raises:
+            ValueError: 分頁游標格式不正確
         """
+        if page_size is not None:
+            return self._get_query_history_page(user_id, page_size, cursor)
+
         # 生成快取鍵
         cache_key = f'query_history_{user_id}' if user_id else 'query_history'
         
         # 檢查記憶體快取（如果不是強制刷新）
-        if not force_refresh and cache_key in self._query_cache:
-            cache_time, cache_data = self._query_cache[cache_key]
+        # 以 get 讀取：記憶體預算可能同時回收快取項目
+        cached = None if force_refresh else self._query_cache.get(cache_key)
+        if cached is not None:
+            cache_time, cache_data = cached
             if time.time() - cache_time < self._cache_timeout:
                 return cache_data
         
+        history, _ = self._get_query_history_page(user_id, None, None)
+        # 更新記憶體快取
+        self._cache_put(cache_key, history)
+        return history
+
+    def _get_query_history_page(self, user_id, page_size, cursor):
+        """以 (created_at, id) 做 keyset 分頁讀取查詢歷史"""
+        query = '''
+        SELECT id, company_ids, year_range, month_range, created_at
+        FROM query_history
+        WHERE ''' + ('user_id = ?' if user_id else '1 = 1')
+        params = [user_id] if user_id else []
+
+        if cursor:
+            created_at, last_id = decode_cursor(cursor)
+            query += ' AND (created_at < ? OR (created_at = ? AND id < ?))'
+            params.extend([created_at, created_at, last_id])
+
+        query += ' ORDER BY created_at DESC, id DESC'
+        if page_size is not None:
+            # 多取一筆判斷是否還有下一頁
+            query += ' LIMIT ?'
+            params.append(page_size + 1)
+
         try:
             with sqlite3.connect(self.db_path) as conn:
                 # 使用字典游標，使結果更易於處理
                 conn.row_factory = sqlite3.Row
-                cursor = conn.cursor()
-                
-                # 根據是否提供user_id來構建查詢
-                if user_id:
-                    cursor.execute('''
-                    SELECT company_ids, year_range, month_range 
-                    FROM query_history 
-                    WHERE user_id = ?
-                    ORDER BY created_at DESC
-                    ''', (user_id,))
-                else:
-                    cursor.execute('''
-                    SELECT company_ids, year_range, month_range 
-                    FROM query_history 
-                    ORDER BY created_at DESC
-                    ''')
-                
-                results = cursor.fetchall()
-                history = []
-                
-                for row in results:
-                    # 轉換為字典，確保資料結構一致
-                    history.append({
-                        'company_ids': row['company_ids'],
-                        'year_range': row['year_range'],
-                        'month_range': row['month_range']
-                    })
-                
-                # 更新記憶體快取
-                self._query_cache[cache_key] = (time.time(), history)
-                return history
+                rows = conn.execute(query, params).fetchall()
         except sqlite3.Error as e:
             logger.error(f"獲取查詢歷史時出錯: {e}")
-            return []
+            return [], None
+
+        next_cursor = None
+        if page_size is not None and len(rows) > page_size:
+            rows = rows[:page_size]
+            next_cursor = encode_cursor([rows[-1]['created_at'], rows[-1]['id']])
+
+        # 轉換為字典，確保資料結構一致
+        history = [
+            {
+                'company_ids': row['company_ids'],
+                'year_range': row['year_range'],
+                'month_range': row['month_range']
+            }
+            for row in rows
+        ]
+        return history, next_cursor
     
+    def get_popular_queries(self, limit=20, days=30):
+        """最近 days 天內查詢次數最多的查詢條件（合併所有用戶，預先抓取與啟動預熱用）
+
+        Returns:
+            list: [{'company_ids', 'year_range', 'month_range', 'users', 'hits', 'age_days'}, ...]，
+                依查詢次數與時間排序；age_days 為距最近一次查詢的天數
+        """
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                rows = conn.execute('''
+                SELECT company_ids, year_range, month_range, COUNT(*) AS users,
+                       SUM(IFNULL(hit_count, 1)) AS hits,
+                       MIN(julianday('now') - julianday(created_at)) AS age_days
+                FROM query_history
+                WHERE created_at >= datetime('now', ?)
+                GROUP BY company_ids, year_range, month_range
+                ORDER BY hits DESC, age_days ASC
+                LIMIT ?
+                ''', (f'-{int(days)} days', limit)).fetchall()
+        except sqlite3.Error as e:
+            logger.error(f"獲取熱門查詢時出錯: {e}")
+            return []
+        return [
+            {
+                'company_ids': row[0], 'year_range': row[1], 'month_range': row[2],
+                'users': row[3], 'hits': row[4], 'age_days': max(0.0, row[5])
+            }
+            for row in rows
+        ]
+
     # 新增用戶相關方法
     def get_user_by_id(self, user_id):
         """根據ID獲取用戶資料"""
@@ -354,31 +523,281 @@ class Database:
     
     @timer_decorator(log_level='debug', log_args=True)
     def insert_revenue_data(self, company_id, year, month, data):
-        """緩存公司數據"""
+        """緩存公司數據（啟用延遲寫入時先放入佇列，由寫入執行緒批次入庫）
+
+        Args:
+            data (RevenueRecord or dict): 營收資料，字典會轉為 RevenueRecord
+        """
+        data = RevenueRecord.coerce(data)
+        if self._write_queue is not None:
+            self._write_queue.put((company_id, year, month), data)
+            # 更新記憶體快取，讓讀取端立即看到待寫資料
+            self._cache_put(f'{company_id}_{year}_{month}', data)
+            return
+        try:
+            self._write_revenue_batch([((company_id, year, month), data)])
+        except sqlite3.Error as e:
+            logger.error(f"緩存數據時出錯: {e}")
+
+    def _write_revenue_batch(self, items):
+        """在單一交易中寫入多筆營收數據
+
+        Args:
+            items (list): [((company_id, year, month), RevenueRecord), ...]
+
+        Raises:
+            sqlite3.Error: 寫入失敗（如資料庫鎖定），由延遲寫入佇列重試
+        """
+        # 資料庫仍以舊版字典 JSON 保存，維持既有資料相容
+        rows = [
+            (company_id, year, month, json.dumps(data.to_dict(), ensure_ascii=False))
+            for (company_id, year, month), data in items
+        ]
+        with sqlite3.connect(self.db_path, timeout=30) as conn:
+            cursor = conn.cursor()
+            cursor.executemany('''
+            INSERT OR REPLACE INTO revenue_data (company_id, year, month, data)
+            VALUES (?, ?, ?, ?)
+            ''', rows)
+            # 同一交易內增量更新彙總表
+            self._update_revenue_rollups(cursor, items)
+            conn.commit()
+
+        # 更新記憶體快取
+        now = time.time()
+        for (company_id, year, month), data in items:
+            self._cache_put(f'{company_id}_{year}_{month}', data, now)
+        if len(rows) > 1:
+            logger.debug(f"批次寫入 {len(rows)} 筆營收數據")
+
+    def _update_revenue_rollups(self, cursor, items):
+        """增量更新營收彙總表，只重算受影響的年度、季度與近十二個月
+
+        Args:
+            cursor: 進行中交易的游標
+            items (list): [((company_id, year, month), RevenueRecord), ...]
+        """
+        cursor.executemany('''
+        INSERT OR REPLACE INTO revenue_monthly_rollup (company_id, year, month, revenue)
+        VALUES (?, ?, ?, ?)
+        ''', [
+            (company_id, year, month, data.revenue)
+            for (company_id, year, month), data in items
+        ])
+
+        # 受影響的公司年度，以及每家公司受影響的期間範圍（以 年*12+月 表示）
+        company_years = set()
+        periods = {}
+        for (company_id, year, month), _ in items:
+            company_years.add((company_id, year))
+            period = year * 12 + month
+            low, high = periods.get(company_id, (period, period))
+            periods[company_id] = (min(low, period), max(high, period))
+
+        for company_id, year in company_years:
+            cursor.execute('''
+            INSERT OR REPLACE INTO revenue_yearly_rollup (company_id, year, total, months, average)
+            SELECT company_id, year, SUM(revenue), COUNT(revenue), AVG(revenue)
+            FROM revenue_monthly_rollup
+            WHERE company_id = ? AND year = ?
+            GROUP BY company_id, year
+            ''', (company_id, year))
+            cursor.execute('''
+            INSERT OR REPLACE INTO revenue_quarterly_rollup (company_id, year, quarter, total, months)
+            SELECT company_id, year, (month - 1) / 3 + 1, SUM(revenue), COUNT(revenue)
+            FROM revenue_monthly_rollup
+            WHERE company_id = ? AND year = ?
+            GROUP BY company_id, year, (month - 1) / 3 + 1
+            ''', (company_id, year))
+            cursor.execute('''
+            UPDATE revenue_monthly_rollup SET ytd = (
+                SELECT SUM(m.revenue) FROM revenue_monthly_rollup m
+                WHERE m.company_id = revenue_monthly_rollup.company_id
+                AND m.year = revenue_monthly_rollup.year
+                AND m.month <= revenue_monthly_rollup.month
+            )
+            WHERE company_id = ? AND year = ?
+            ''', (company_id, year))
+
+        # 某月變動會影響其後十一個月的近十二個月營收；不足十二個月時為 NULL
+        for company_id, (low, high) in periods.items():
+            cursor.execute('''
+            UPDATE revenue_monthly_rollup SET ttm = (
+                SELECT CASE WHEN COUNT(m.revenue) = 12 THEN SUM(m.revenue) END
+                FROM revenue_monthly_rollup m
+                WHERE m.company_id = revenue_monthly_rollup.company_id
+                AND m.year * 12 + m.month BETWEEN
+                    revenue_monthly_rollup.year * 12 + revenue_monthly_rollup.month - 11
+                    AND revenue_monthly_rollup.year * 12 + revenue_monthly_rollup.month
+            )
+            WHERE company_id = ? AND year * 12 + month BETWEEN ? AND ?
+            ''', (company_id, low, high + 11))
+
+    def _rebuild_revenue_rollups(self, cursor):
+        """由 revenue_data 全量重建彙總表"""
+        cursor.execute('DELETE FROM revenue_monthly_rollup')
+        cursor.execute('DELETE FROM revenue_quarterly_rollup')
+        cursor.execute('DELETE FROM revenue_yearly_rollup')
+        cursor.execute('SELECT company_id, year, month, data FROM revenue_data')
+        items = [
+            ((company_id, year, month), RevenueRecord.from_dict(json.loads(data)))
+            for company_id, year, month, data in cursor.fetchall()
+        ]
+        if items:
+            self._update_revenue_rollups(cursor, items)
+        logger.info(f"已重建營收彙總表，共 {len(items)} 筆月資料")
+
+    @timer_decorator(log_level='debug', log_args=True)
+    def get_yearly_revenue_summary(self, company_id, years=None):
+        """獲取公司年度營收彙總
+
+        Args:
+            company_id (str): 公司代號
+            years (list, optional): 年份列表，未提供時返回所有年度
+
+        Returns:
+            list: [{'year', 'total', 'months', 'average'}, ...]，依年份排序
+        """
+        return self._select_rollup('''
+        SELECT year, total, months, average FROM revenue_yearly_rollup
+        WHERE company_id = ?
+        ''', company_id, years, 'year')
+
+    @timer_decorator(log_level='debug', log_args=True)
+    def get_quarterly_revenue_summary(self, company_id, years=None):
+        """獲取公司季度營收彙總
+
+        Returns:
+            list: [{'year', 'quarter', 'total', 'months'}, ...]，依年份、季度排序
+        """
+        return self._select_rollup('''
+        SELECT year, quarter, total, months FROM revenue_quarterly_rollup
+        WHERE company_id = ?
+        ''', company_id, years, 'year, quarter')
+
+    @timer_decorator(log_level='debug', log_args=True)
+    def get_monthly_revenue_rollup(self, company_id, years=None):
+        """獲取公司每月營收及年初至今累計（ytd）、近十二個月（ttm）營收
+
+        Returns:
+            list: [{'year', 'month', 'revenue', 'ytd', 'ttm'}, ...]，依年月排序
+        """
+        return self._select_rollup('''
+        SELECT year, month, revenue, ytd, ttm FROM revenue_monthly_rollup
+        WHERE company_id = ?
+        ''', company_id, years, 'year, month')
+
+    def _select_rollup(self, query, company_id, years, order_by):
+        """彙總表查詢共用邏輯"""
+        params = [company_id]
+        if years:
+            query += f" AND year IN ({', '.join('?' for _ in years)})"
+            params.extend(years)
+        query += f" ORDER BY {order_by}"
         try:
             with sqlite3.connect(self.db_path) as conn:
+                conn.row_factory = sqlite3.Row
                 cursor = conn.cursor()
-                cursor.execute('''
-                INSERT OR REPLACE INTO revenue_data (company_id, year, month, data)
-                VALUES (?, ?, ?, ?)
-                ''', (company_id, year, month, json.dumps(data, ensure_ascii=False)))
-                conn.commit()
-                
-                # 更新記憶體快取
-                cache_key = f'{company_id}_{year}_{month}'
-                self._query_cache[cache_key] = (time.time(), data)
+                cursor.execute(query, params)
+                return [dict(row) for row in cursor.fetchall()]
         except sqlite3.Error as e:
-            logger.error(f"緩存數據時出錯: {e}")
-    
+            logger.error(f"獲取營收彙總時出錯: {e}")
+            return []
+
+    def iter_revenue_rows(self, company_ids, years=None, months=None, batch_size=1000):
+        """
+        逐批讀取資料庫中的營收數據，供大量匯出使用
+
+        以 (公司代號, 年, 月) 做 keyset 分批查詢，每批使用短暫的連線並在產生前關閉，
+        匯出串流期間不持有讀取鎖，寫入端不會被慢速下載的客戶端卡住；記憶體用量與總筆數無關。
+
+        Args:
+            company_ids (list): 公司代號列表
+            years (list, optional): 年份列表，未提供時不限
+            months (list, optional): 月份列表，未提供時不限
+            batch_size (int): 每批筆數
+
+        Yields:
+            list: RevenueRecord 列表（依公司代號、年、月排序）
+        """
+        # 先寫入延遲寫入中的資料，確保匯出內容完整
+        self.flush_writes()
+
+        query = ("SELECT company_id, year, month, data FROM revenue_data "
+                 f"WHERE company_id IN ({', '.join('?' for _ in company_ids)})")
+        params = list(company_ids)
+        for column, values in (('year', years), ('month', months)):
+            if values:
+                query += f" AND {column} IN ({', '.join('?' for _ in values)})"
+                params.extend(values)
+
+        last_key = None
+        while True:
+            batch_query, batch_params = query, list(params)
+            if last_key is not None:
+                batch_query += " AND (company_id, year, month) > (?, ?, ?)"
+                batch_params.extend(last_key)
+            batch_query += " ORDER BY company_id, year, month LIMIT ?"
+            batch_params.append(batch_size)
+            try:
+                with sqlite3.connect(self.db_path) as conn:
+                    cursor = conn.cursor()
+                    cursor.execute(batch_query, batch_params)
+                    rows = cursor.fetchall()
+                conn.close()
+            except sqlite3.Error as e:
+                logger.error(f"匯出營收數據時出錯: {e}")
+                return
+            if not rows:
+                return
+            last_key = rows[-1][:3]
+            yield [RevenueRecord.from_dict(json.loads(row[3])) for row in rows]
+            if len(rows) < batch_size:
+                return
+
+    def ping(self, timeout=5):
+        """檢查資料庫可否連線與讀取（健康檢查用）"""
+        try:
+            with sqlite3.connect(self.db_path, timeout=timeout) as conn:
+                conn.execute('SELECT 1 FROM revenue_data LIMIT 1').fetchall()
+            return True
+        except sqlite3.Error as e:
+            logger.error(f"資料庫連線檢查失敗: {e}")
+            return False
+
+    def flush_writes(self):
+        """
+        立即寫入所有延遲寫入中的營收數據
+
+        Returns:
+            bool: 全部寫入成功（寫入失敗的資料留在佇列中稍後重試）
+        """
+        if self._write_queue is not None:
+            return self._write_queue.flush()
+        return True
+
+    def write_failures(self):
+        """延遲寫入重試後仍失敗的批次數與筆數"""
+        if self._write_queue is None:
+            return {'batches': 0, 'items': 0}
+        return {'batches': self._write_queue.failed_batches, 'items': self._write_queue.failed_items}
+
     @timer_decorator(log_level='debug', log_args=True)
     def get_revenue_data(self, company_id, year, month, max_age_days=30):
-        """獲取緩存的公司數據，延長數據有效期至30天"""
+        """獲取緩存的公司數據（RevenueRecord），延長數據有效期至30天"""
         # 生成快取鍵
         cache_key = f'{company_id}_{year}_{month}'
+
+        # 尚未寫入資料庫的延遲寫入資料
+        if self._write_queue is not None:
+            pending = self._write_queue.get_pending((company_id, year, month))
+            if pending is not None:
+                return pending
         
-        # 檢查記憶體快取
-        if cache_key in self._query_cache:
-            cache_time, cache_data = self._query_cache[cache_key]
+        # 檢查記憶體快取（以 get 讀取：記憶體預算可能同時回收快取項目）
+        cached = self._query_cache.get(cache_key)
+        if cached is not None:
+            cache_time, cache_data = cached
             if time.time() - cache_time < self._cache_timeout:
                 return cache_data
         
@@ -393,26 +812,367 @@ class Database:
                 
                 result = cursor.fetchone()
                 if result:
-                    data = json.loads(result[0])
+                    data = RevenueRecord.from_dict(json.loads(result[0]))
                     # 更新記憶體快取
-                    self._query_cache[cache_key] = (time.time(), data)
+                    self._cache_put(cache_key, data)
                     return data
                 return None
         except sqlite3.Error as e:
             logger.error(f"獲取緩存數據時出錯: {e}")
             return None
-    
-    @timer_decorator(log_level='info')        
+
+    @timer_decorator(log_level='debug', log_args=True)
+    def get_stale_revenue_data(self, company_id, year, month, max_stale_days=365):
+        """獲取已過期但仍在容許範圍內的公司數據（stale-while-revalidate 用）
+
+        Args:
+            max_stale_days (int): 資料可接受的最長天數，超過則視為不可用
+
+        Returns:
+            tuple: (RevenueRecord, 資料天數)，無可用數據時為 (None, None)
+        """
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                SELECT data, julianday('now') - julianday(created_at) FROM revenue_data
+                WHERE company_id = ? AND year = ? AND month = ?
+                AND (julianday('now') - julianday(created_at)) <= ?
+                ''', (company_id, year, month, max_stale_days))
+
+                result = cursor.fetchone()
+                if result:
+                    return RevenueRecord.from_dict(json.loads(result[0])), result[1]
+                return None, None
+        except sqlite3.Error as e:
+            logger.error(f"獲取過期緩存數據時出錯: {e}")
+            return None, None
+
+    def upsert_companies(self, companies, update_existing=True):
+        """
+        新增或更新公司名錄；產業別與市場別為 None 時保留原值
+
+        Args:
+            companies (list): [(company_id, name, industry, market), ...]
+            update_existing (bool): 已存在的公司是否更新（False 時只新增）
+        """
+        conflict = '''DO UPDATE SET
+                    name = excluded.name,
+                    industry = COALESCE(excluded.industry, companies.industry),
+                    market = COALESCE(excluded.market, companies.market),
+                    updated_at = CURRENT_TIMESTAMP''' if update_existing else 'DO NOTHING'
+        try:
+            with sqlite3.connect(self.db_path, timeout=30) as conn:
+                conn.executemany(f'''
+                INSERT INTO companies (company_id, name, industry, market)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(company_id) {conflict}
+                ''', companies)
+                conn.commit()
+                return True
+        except sqlite3.Error as e:
+            logger.error(f"更新公司名錄時出錯: {e}")
+            return False
+
+    def get_companies(self):
+        """獲取完整公司名錄
+
+        Returns:
+            list: [{'company_id', 'name', 'industry', 'market'}, ...]
+        """
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.row_factory = sqlite3.Row
+                rows = conn.execute('''
+                SELECT company_id, name, industry, market FROM companies ORDER BY company_id
+                ''').fetchall()
+                return [dict(row) for row in rows]
+        except sqlite3.Error as e:
+            logger.error(f"獲取公司名錄時出錯: {e}")
+            return []
+
+    def count_companies(self):
+        """公司名錄筆數"""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                return conn.execute('SELECT COUNT(*) FROM companies').fetchone()[0]
+        except sqlite3.Error as e:
+            logger.error(f"計算公司名錄筆數時出錯: {e}")
+            return 0
+
+    @timer_decorator(log_level='debug')
+    def get_cached_revenue_keys(self, company_ids, years, months, max_age_days):
+        """
+        批次查詢資料庫中已有可用資料的公司年月（供查詢規劃估計成本）
+
+        Returns:
+            set: {(company_id, year, month), ...}
+        """
+        query = f'''
+        SELECT company_id, year, month FROM revenue_data
+        WHERE company_id IN ({', '.join('?' for _ in company_ids)})
+        AND year IN ({', '.join('?' for _ in years)})
+        AND month IN ({', '.join('?' for _ in months)})
+        AND (julianday('now') - julianday(created_at)) <= ?
+        '''
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.execute(query, [*company_ids, *years, *months, max_age_days])
+                return set(cursor.fetchall())
+        except sqlite3.Error as e:
+            logger.error(f"查詢已快取資料時出錯: {e}")
+            return set()
+
+    def create_query_job(self, job_id, user_id, company_ids, year_range, month_range, plan=None):
+        """建立背景查詢工作"""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.execute('''
+                INSERT INTO query_jobs (id, user_id, company_ids, year_range, month_range, plan)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ''', (job_id, user_id, company_ids, year_range, month_range,
+                      json.dumps(plan, ensure_ascii=False) if plan else None))
+                conn.commit()
+                return True
+        except sqlite3.Error as e:
+            logger.error(f"建立背景查詢工作時出錯: {e}")
+            return False
+
+    def update_query_job(self, job_id, status, result_id=None, error=None):
+        """更新背景查詢工作狀態"""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.execute('''
+                UPDATE query_jobs
+                SET status = ?, result_id = COALESCE(?, result_id), error = ?, updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+                ''', (status, result_id, error, job_id))
+                conn.commit()
+                return True
+        except sqlite3.Error as e:
+            logger.error(f"更新背景查詢工作時出錯: {e}")
+            return False
+
+    def get_query_job(self, job_id):
+        """獲取背景查詢工作，不存在時返回 None"""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.row_factory = sqlite3.Row
+                row = conn.execute('SELECT * FROM query_jobs WHERE id = ?', (job_id,)).fetchone()
+                if row is None:
+                    return None
+                job = dict(row)
+                job['plan'] = json.loads(job['plan']) if job['plan'] else None
+                return job
+        except sqlite3.Error as e:
+            logger.error(f"獲取背景查詢工作時出錯: {e}")
+            return None
+
+    def count_active_query_jobs(self, user_id):
+        """計算用戶尚未完成的背景查詢工作數"""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                row = conn.execute('''
+                SELECT COUNT(*) FROM query_jobs
+                WHERE user_id = ? AND status IN ('queued', 'running')
+                ''', (user_id,)).fetchone()
+                return row[0]
+        except sqlite3.Error as e:
+            logger.error(f"計算背景查詢工作數時出錯: {e}")
+            return 0
+
+    def fail_interrupted_query_jobs(self, max_idle_seconds=3600):
+        """將超過 max_idle_seconds 未更新的未完成背景工作（執行中的行程已結束）標記為失敗"""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.execute('''
+                UPDATE query_jobs SET status = 'failed', error = '工作已中斷，請重新查詢', updated_at = CURRENT_TIMESTAMP
+                WHERE status IN ('queued', 'running')
+                AND (julianday('now') - julianday(updated_at)) * 86400 > ?
+                ''', (max_idle_seconds,))
+                conn.commit()
+                return cursor.rowcount
+        except sqlite3.Error as e:
+            logger.error(f"清理中斷的背景查詢工作時出錯: {e}")
+            return 0
+
+    @timer_decorator(log_level='debug')
+    def acquire_query_lease(self, query_key, owner, ttl):
+        """嘗試取得查詢租約
+
+        Args:
+            query_key (str): 查詢的唯一鍵
+            owner (str): 租約持有者識別（行程 + 隨機碼）
+            ttl (float): 租約有效秒數，逾時視為持有者已失效
+
+        Returns:
+            bool: True 表示由呼叫者負責計算；資料庫出錯時也返回 True，退回直接計算
+        """
+        now = time.time()
+        try:
+            with sqlite3.connect(self.db_path, timeout=30) as conn:
+                cursor = conn.cursor()
+                # 清除已過期的租約（持有者當機或結果已過期）
+                cursor.execute('''
+                DELETE FROM query_leases WHERE query_key = ? AND expires_at < ?
+                ''', (query_key, now))
+                cursor.execute('''
+                INSERT OR IGNORE INTO query_leases (query_key, owner, status, expires_at)
+                VALUES (?, ?, 'running', ?)
+                ''', (query_key, owner, now + ttl))
+                acquired = cursor.rowcount == 1
+                conn.commit()
+                return acquired
+        except sqlite3.Error as e:
+            logger.error(f"取得查詢租約時出錯: {e}")
+            return True
+
+    @timer_decorator(log_level='debug')
+    def complete_query_lease(self, query_key, owner, result, result_ttl):
+        """標記租約完成並保存結果（zlib 壓縮的 JSON），讓等待中的相同查詢直接取用"""
+        payload = zlib.compress(json.dumps(result, ensure_ascii=False).encode('utf-8'))
+        try:
+            with sqlite3.connect(self.db_path, timeout=30) as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                UPDATE query_leases
+                SET status = 'done', result = ?, expires_at = ?
+                WHERE query_key = ? AND owner = ?
+                ''', (payload, time.time() + result_ttl, query_key, owner))
+                conn.commit()
+        except sqlite3.Error as e:
+            logger.error(f"完成查詢租約時出錯: {e}")
+
+    @timer_decorator(log_level='debug')
+    def release_query_lease(self, query_key, owner):
+        """釋放租約（計算失敗時使用），讓等待者可以重新嘗試"""
+        try:
+            with sqlite3.connect(self.db_path, timeout=30) as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                DELETE FROM query_leases WHERE query_key = ? AND owner = ?
+                ''', (query_key, owner))
+                conn.commit()
+        except sqlite3.Error as e:
+            logger.error(f"釋放查詢租約時出錯: {e}")
+
+    @timer_decorator(log_level='debug')
+    def discard_query_result(self, query_key):
+        """刪除已完成租約保存的結果（資料更新後使用），下一次相同查詢重新計算"""
+        try:
+            with sqlite3.connect(self.db_path, timeout=30) as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                DELETE FROM query_leases WHERE query_key = ? AND status = 'done'
+                ''', (query_key,))
+                conn.commit()
+        except sqlite3.Error as e:
+            logger.error(f"刪除查詢租約結果時出錯: {e}")
+
+    @timer_decorator(log_level='debug')
+    def get_query_lease(self, query_key, include_result=False):
+        """獲取未過期的租約狀態（唯讀，等待者輪詢用）
+
+        Args:
+            include_result (bool): 是否讀取並解壓結果；輪詢時只讀狀態，完成後再讀一次結果
+
+        Returns:
+            dict or None: {'status': 'running' | 'done', 'result': 結果或 None}
+        """
+        column = 'result' if include_result else 'NULL'
+        try:
+            with sqlite3.connect(self.db_path, timeout=30) as conn:
+                cursor = conn.cursor()
+                cursor.execute(f'''
+                SELECT status, {column} FROM query_leases
+                WHERE query_key = ? AND expires_at >= ?
+                ''', (query_key, time.time()))
+                row = cursor.fetchone()
+                if not row:
+                    return None
+                result = row[1]
+                if isinstance(result, bytes):
+                    result = zlib.decompress(result).decode('utf-8')
+                return {
+                    'status': row[0],
+                    'result': json.loads(result) if result is not None else None
+                }
+        except sqlite3.Error as e:
+            logger.error(f"獲取查詢租約時出錯: {e}")
+            return None
+
+    def _cache_put(self, key, value, cached_at=None):
+        """寫入記憶體快取；達上限時先移除過期項目，仍不足再移除最舊的 10%"""
+        cache = self._query_cache
+        if key not in cache and len(cache) >= self._cache_max_entries:
+            now = time.time()
+            for old_key in [k for k, (t, _) in list(cache.items()) if now - t >= self._cache_timeout]:
+                cache.pop(old_key, None)
+            if len(cache) >= self._cache_max_entries:
+                oldest = sorted(list(cache.items()), key=lambda item: item[1][0])
+                for old_key, _ in oldest[:max(1, len(oldest) // 10)]:
+                    cache.pop(old_key, None)
+        cache[key] = (cached_at or time.time(), value)
+
+    def memory_cache_entries(self):
+        """記憶體快取項目數"""
+        return len(self._query_cache)
+
+    def estimate_memory_cache_bytes(self):
+        """記憶體快取的估計用量（抽樣推算）"""
+        return estimate_size(self._query_cache)
+
+    def evict_memory_cache(self, bytes_to_free):
+        """
+        由最舊的項目開始移除記憶體快取，直到估計回收 bytes_to_free
+
+        Returns:
+            int: 估計回收的 bytes
+        """
+        freed = 0
+        for key, item in sorted(list(self._query_cache.items()), key=lambda item: item[1][0]):
+            if freed >= bytes_to_free:
+                break
+            if self._query_cache.pop(key, None) is not None:
+                freed += estimate_size(key) + estimate_size(item)
+        return freed
+
+    @timer_decorator(log_level='info')
     def clear_memory_cache(self):
         """清除記憶體快取"""
         self._query_cache.clear()
         logger.info("記憶體快取已清除")
-        self._query_cache = {}
-        self._cache_timeout = 600  # 10分鐘快取過期
-    
 
-        """清除記憶體快取"""
-        self._query_cache.clear()
-        logger.info("記憶體快取已清除")
-        
-    
\ No newline at end of file
+
+# 共用的資料庫實例（延遲建立）
+_shared_db = None
+_shared_db_lock = threading.Lock()
+
+
+def database_path():
+    """資料庫檔案路徑：DATABASE_DIR 環境變數，預設為專案目錄下的 data 資料夾"""
+    base = os.environ.get('DATABASE_DIR') or os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data'
+    )
+    os.makedirs(base, exist_ok=True)
+    return os.path.join(base, 'data.db')
+
+
+def get_db():
+    """
+    取得共用的 Database 實例，第一次呼叫時才建立
+
+    app、爬蟲與用戶驗證共用同一個實例（同一份記憶體快取與延遲寫入佇列）。
+    """
+    global _shared_db
+    if _shared_db is None:
+        with _shared_db_lock:
+            if _shared_db is None:
+                _shared_db = Database(
+                    database_path(),
+                    write_behind=True,
+                    batch_size=Config.WRITE_BEHIND_BATCH_SIZE,
+                    flush_interval=Config.WRITE_BEHIND_FLUSH_INTERVAL
+                )
+    return _shared_db
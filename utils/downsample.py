@@ -0,0 +1,124 @@
+import logging
+
+import numpy as np
+
+# 配置日誌
+logger = logging.getLogger(__name__)
+
+
+def lttb_indices(y, n_out):
+    """
+    Largest-Triangle-Three-Buckets 降採樣，返回保留點的索引
+
+    x 軸為等距索引（月份類別），每個分桶內以向量運算選出與前一個保留點、
+    下一桶平均點構成最大三角形面積的點，保留峰谷形狀。
+
+    Args:
+        y (numpy.ndarray): 一維數值陣列（不可含 NaN）
+        n_out (int): 輸出點數（含首尾兩點）
+
+    Returns:
+        numpy.ndarray: 依序排列的保留點索引
+    """
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    x = np.arange(n, dtype=float)
+    # 中間 n-2 個點平均分成 n_out-2 個桶
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    selected = np.empty(n_out, dtype=int)
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    # 下一桶的平均點可預先以累加和計算（最後一桶的下一桶即為最後一點）
+    cumsum = np.concatenate(([0.0], np.cumsum(y)))
+    next_start = edges[1:]
+    next_end = np.append(edges[2:], n)
+    next_avg_x = (next_start + next_end - 1) / 2.0
+    next_avg_y = (cumsum[next_end] - cumsum[next_start]) / (next_end - next_start)
+
+    prev = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        bx = x[start:end]
+        by = y[start:end]
+        area = np.abs(
+            (x[prev] - next_avg_x[i]) * (by - y[prev]) -
+            (x[prev] - bx) * (next_avg_y[i] - y[prev])
+        )
+        prev = start + int(np.argmax(area))
+        selected[i + 1] = prev
+
+    return selected
+
+
+def _downsample_series_lttb(data, max_points):
+    """對單一系列做 LTTB，返回 Highcharts 的 [類別索引, 數值] 點列表"""
+    values = np.array([np.nan if value is None else value for value in data], dtype=float)
+    valid = np.flatnonzero(~np.isnan(values))
+    if len(valid) <= max_points:
+        return [[int(i), float(values[i])] for i in valid]
+    keep = valid[lttb_indices(values[valid], max_points)]
+    return [[int(i), float(values[i])] for i in keep]
+
+
+def _quarter_label(category):
+    year, month = category.split('-')
+    return f"{year}-Q{(int(month) - 1) // 3 + 1}"
+
+
+def _aggregate_quarterly(chart_data, how):
+    """月資料彙總為季資料（營收加總、增長率平均），缺值不計入"""
+    categories = chart_data['categories']
+    labels = [_quarter_label(category) for category in categories]
+    quarter_index = {}
+    for label in labels:
+        quarter_index.setdefault(label, len(quarter_index))
+    quarters = list(quarter_index)
+    group = np.array([quarter_index[label] for label in labels], dtype=int)
+    series = []
+    for item in chart_data['series']:
+        values = np.array([np.nan if value is None else value for value in item['data']], dtype=float)
+        mask = ~np.isnan(values)
+        sums = np.bincount(group[mask], weights=values[mask], minlength=len(quarters))
+        counts = np.bincount(group[mask], minlength=len(quarters))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            aggregated = sums if how == 'sum' else sums / counts
+        aggregated = np.where(counts > 0, aggregated, np.nan)
+        series.append({
+            'name': item['name'],
+            'data': [value if value == value else None for value in aggregated.tolist()]
+        })
+    return {'categories': quarters, 'series': series}
+
+
+def downsample_chart(chart_data, max_points, method='lttb', how='sum'):
+    """
+    將圖表數據降採樣至每條系列最多 max_points 點
+
+    Args:
+        chart_data (dict): {'categories': [...], 'series': [{'name', 'data'}, ...]}
+        max_points (int): 每條系列的最大點數
+        method (str): 'lttb'（保留形狀，點改為 [類別索引, 數值]）或 'quarterly'（月彙總為季，
+            季資料仍超過 max_points 時再以 LTTB 降採樣）
+        how (str): quarterly 時的彙總方式，'sum'（營收）或 'mean'（增長率）
+
+    Returns:
+        dict: 降採樣後的圖表數據；點數未超過上限時原樣返回
+    """
+    if not max_points or len(chart_data['categories']) <= max_points:
+        return chart_data
+
+    if method == 'quarterly':
+        chart_data = _aggregate_quarterly(chart_data, how)
+        if len(chart_data['categories']) <= max_points:
+            return chart_data
+
+    return {
+        'categories': chart_data['categories'],
+        'series': [
+            {'name': item['name'], 'data': _downsample_series_lttb(item['data'], max_points)}
+            for item in chart_data['series']
+        ]
+    }
@@ -0,0 +1,95 @@
+import gzip
+import json
+import hashlib
+import logging
+
+from flask import Response, request
+
+# orjson 序列化較快且直接輸出 UTF-8 bytes，未安裝時退回標準 json
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# brotli 為選用，未安裝時只提供 gzip
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# 配置日誌
+logger = logging.getLogger(__name__)
+
+# 小於此大小的回應不壓縮（壓縮標頭的成本高於節省）
+MIN_COMPRESS_SIZE = 1024
+
+
+def dumps(obj):
+    """將物件序列化為 UTF-8 JSON bytes"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+class EncodedResponse:
+    """
+    預先序列化的 JSON 回應
+
+    建立時一次完成 JSON 編碼、gzip / brotli 壓縮與 ETag 計算，
+    放入快取後每次命中只需依 Accept-Encoding 選擇內容，不再重新序列化。
+
+    Example:
+        payload = EncodedResponse(result)
+        cache.set(key, payload)
+        return payload.to_response()
+    """
+
+    __slots__ = ('body', 'gzip_body', 'br_body', 'etag')
+
+    def __init__(self, obj):
+        self.body = dumps(obj)
+        self.gzip_body = None
+        self.br_body = None
+        if len(self.body) >= MIN_COMPRESS_SIZE:
+            self.gzip_body = gzip.compress(self.body, compresslevel=6, mtime=0)
+            if brotli is not None:
+                self.br_body = brotli.compress(self.body, quality=5)
+        # 強 ETag：以未壓縮內容的雜湊為基礎，各編碼版本再加上後綴區分
+        self.etag = hashlib.blake2b(self.body, digest_size=16).hexdigest()
+
+    def _select(self):
+        """依 Accept-Encoding 選擇內容，返回 (內容, Content-Encoding, ETag)"""
+        accept = request.accept_encodings
+        if self.br_body is not None and accept['br']:
+            return self.br_body, 'br', f'{self.etag}-br'
+        if self.gzip_body is not None and accept['gzip']:
+            return self.gzip_body, 'gzip', f'{self.etag}-gzip'
+        return self.body, None, self.etag
+
+    def _matches(self):
+        """If-None-Match 是否符合任一編碼版本（內容相同，只是傳輸編碼不同）"""
+        if_none_match = request.if_none_match
+        if if_none_match.star_tag:
+            return True
+        return any(
+            if_none_match.contains(tag)
+            for tag in (self.etag, f'{self.etag}-gzip', f'{self.etag}-br')
+        )
+
+    def to_response(self, status=200):
+        """
+        建立 Flask 回應；客戶端的 ETag 相符時返回 304 Not Modified
+
+        Returns:
+            flask.Response: JSON 回應
+        """
+        body, encoding, etag = self._select()
+        if status == 200 and self._matches():
+            response = Response(status=304)
+        else:
+            response = Response(body, status=status, mimetype='application/json')
+            if encoding:
+                response.headers['Content-Encoding'] = encoding
+        response.set_etag(etag)
+        response.headers['Vary'] = 'Accept-Encoding'
+        return response
@@ -0,0 +1,133 @@
+import io
+import csv
+import logging
+import importlib.util
+
+# pyarrow 為選用，未安裝時只提供 CSV 匯出；於第一次匯出 Parquet 時才載入
+_PYARROW_AVAILABLE = importlib.util.find_spec('pyarrow') is not None
+
+# 配置日誌
+logger = logging.getLogger(__name__)
+
+# CSV 欄位：沿用網頁表格的中文欄名，數值不含千分位以便試算表直接計算
+CSV_HEADER = [
+    '公司代號', '公司名稱', '月份', '當月營收', '上月營收', '去年當月營收',
+    '上月比較增減(%)', '去年同月增減(%)'
+]
+
+# Excel 依 BOM 判斷 UTF-8，否則中文會顯示為亂碼
+UTF8_BOM = '\ufeff'
+
+
+def parquet_available():
+    """是否可匯出 Parquet（需安裝 pyarrow）"""
+    return _PYARROW_AVAILABLE
+
+
+def _csv_value(value):
+    return '' if value is None else value
+
+
+def stream_csv(batches):
+    """
+    將營收資料批次串流為 CSV
+
+    Args:
+        batches (iterable): 每次產生一批 RevenueRecord 列表
+
+    Yields:
+        str: CSV 文字片段（第一段含 BOM 與標題列）
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_HEADER)
+    yield UTF8_BOM + buffer.getvalue()
+
+    for records in batches:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(
+            (
+                record.company_id, record.company_name, record.period,
+                _csv_value(record.revenue), _csv_value(record.last_month_revenue),
+                _csv_value(record.last_year_revenue), _csv_value(record.mom_change),
+                _csv_value(record.yoy_change)
+            )
+            for record in records
+        )
+        yield buffer.getvalue()
+
+
+class _ChunkSink(io.RawIOBase):
+    """只保留尚未送出的位元組，供 ParquetWriter 邊寫邊串流"""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        """取出目前累積的位元組並清空"""
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _parquet_schema(pa):
+    return pa.schema([
+        ('company_id', pa.string()),
+        ('company_name', pa.string()),
+        ('year', pa.int16()),
+        ('month', pa.int8()),
+        ('revenue', pa.int64()),
+        ('last_month_revenue', pa.int64()),
+        ('last_year_revenue', pa.int64()),
+        ('mom_change', pa.float64()),
+        ('yoy_change', pa.float64()),
+    ])
+
+
+def stream_parquet(batches):
+    """
+    將營收資料批次串流為 Parquet，每批寫成一個 row group
+
+    Args:
+        batches (iterable): 每次產生一批 RevenueRecord 列表
+
+    Yields:
+        bytes: Parquet 檔案片段
+    """
+    if not _PYARROW_AVAILABLE:
+        raise RuntimeError('伺服器未安裝 pyarrow，無法匯出 Parquet')
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = _parquet_schema(pa)
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression='snappy')
+    try:
+        for records in batches:
+            table = pa.Table.from_pydict(
+                {name: [getattr(record, name) for record in records] for name in schema.names},
+                schema=schema
+            )
+            writer.write_table(table)
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
+    finally:
+        # 寫入檔尾（metadata）後送出剩餘內容
+        writer.close()
+    yield sink.drain()
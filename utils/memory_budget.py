@@ -0,0 +1,318 @@
+import gc
+import os
+import sys
+import time
+import ctypes
+import logging
+import threading
+import tracemalloc
+
+# 配置日誌
+logger = logging.getLogger(__name__)
+
+# cgroup v2 / v1 的記憶體上限與目前用量
+_CGROUP_LIMIT_FILES = ('/sys/fs/cgroup/memory.max', '/sys/fs/cgroup/memory/memory.limit_in_bytes')
+_CGROUP_USAGE_FILES = ('/sys/fs/cgroup/memory.current', '/sys/fs/cgroup/memory/memory.usage_in_bytes')
+# cgroup v1 未設定上限時的值（接近 2^63）
+_UNLIMITED = 1 << 60
+
+
+def _read_int(paths):
+    for path in paths:
+        try:
+            with open(path) as f:
+                value = f.read().strip()
+        except OSError:
+            continue
+        if value.isdigit():
+            return int(value)
+        return None  # cgroup v2 的 "max"
+    return None
+
+
+def cgroup_memory():
+    """
+    容器（cgroup）的記憶體用量與上限，非容器環境或未設定上限時為 None
+
+    Returns:
+        tuple: (目前用量 bytes, 上限 bytes)
+    """
+    limit = _read_int(_CGROUP_LIMIT_FILES)
+    if limit is not None and limit >= _UNLIMITED:
+        limit = None
+    return _read_int(_CGROUP_USAGE_FILES), limit
+
+
+def process_rss():
+    """目前行程的常駐記憶體（bytes），無法取得時返回 None"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        import resource
+        # 非 Linux 僅能取得峰值（macOS 單位為 bytes）
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+    except (ImportError, OSError):
+        return None
+
+
+def estimate_size(obj, sample=64, _depth=0):
+    """
+    粗估物件（含內容）的記憶體用量
+
+    容器只抽樣前 sample 個元素再依數量推算，計算成本與快取大小無關。
+    """
+    size = sys.getsizeof(obj)
+    if _depth >= 4:
+        return size
+    if isinstance(obj, (str, bytes, bytearray, int, float, bool)) or obj is None:
+        return size
+    if isinstance(obj, dict):
+        items = list(obj.items())[:sample]
+        if items:
+            sampled = sum(estimate_size(k, sample, _depth + 1) + estimate_size(v, sample, _depth + 1)
+                          for k, v in items)
+            size += sampled * len(obj) // len(items)
+        return size
+    if isinstance(obj, (list, tuple, set, frozenset)):
+        items = list(obj)[:sample] if not isinstance(obj, (list, tuple)) else obj[:sample]
+        if items:
+            sampled = sum(estimate_size(item, sample, _depth + 1) for item in items)
+            size += sampled * len(obj) // len(items)
+        return size
+    slots = getattr(type(obj), '__slots__', None)
+    if slots:
+        return size + sum(estimate_size(getattr(obj, name, None), sample, _depth + 1) for name in slots)
+    if hasattr(obj, '__dict__'):
+        return size + estimate_size(vars(obj), sample, _depth + 1)
+    return size
+
+
+def _malloc_trim():
+    """將 glibc 已釋放的記憶體歸還作業系統（非 glibc 環境略過）"""
+    try:
+        ctypes.CDLL('libc.so.6').malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
+
+
+class CacheLayer:
+    """
+    一層可回收的記憶體快取
+
+    Attributes:
+        name (str): 名稱
+        entries (callable): 返回項目數
+        estimate (callable): 返回估計 bytes
+        evict (callable): evict(bytes_to_free) 回收至少指定 bytes（由舊到新），返回實際回收的 bytes；
+                          None 表示只統計、不回收
+    """
+
+    def __init__(self, name, entries, estimate, evict=None):
+        self.name = name
+        self.entries = entries
+        self.estimate = estimate
+        self.evict = evict
+        self.evicted_bytes = 0
+        self.evictions = 0
+
+
+class MemoryBudget:
+    """
+    行程內快取的記憶體預算
+
+    行程 RSS 超過 budget，或容器用量超過 cgroup 上限的 high_watermark 時，
+    依登錄順序回收快取，直到估計用量回到 target_ratio 以下。
+
+    Example:
+        memory_budget.register('flask_cache', entries, estimate, evict)
+        memory_budget.start(interval=5)
+    """
+
+    def __init__(self, budget_bytes=None, high_watermark=0.85, target_ratio=0.7, cooldown=30):
+        """
+        Args:
+            budget_bytes (int, optional): 單一行程的 RSS 上限，None 表示不限制
+            high_watermark (float): 容器用量達 cgroup 上限的此比例時開始回收
+            target_ratio (float): 回收至上限的此比例
+            cooldown (float): 兩次自動回收的最短間隔秒數（RSS 不一定會立即下降，避免連續清空快取）
+        """
+        self.budget_bytes = budget_bytes
+        self.high_watermark = high_watermark
+        self.target_ratio = target_ratio
+        self.cooldown = cooldown
+        self.layers = []
+        self.last_enforced = None
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def register(self, name, entries, estimate, evict=None):
+        """登錄快取層；先登錄的層先回收"""
+        self.layers = [layer for layer in self.layers if layer.name != name]
+        self.layers.append(CacheLayer(name, entries, estimate, evict))
+
+    def _bytes_over(self):
+        """超出預算的 bytes（含回收到 target 的餘裕），未超出時返回 0"""
+        over = 0
+        rss = process_rss()
+        if self.budget_bytes and rss and rss > self.budget_bytes:
+            over = rss - int(self.budget_bytes * self.target_ratio)
+        usage, limit = cgroup_memory()
+        if usage and limit and usage > limit * self.high_watermark:
+            over = max(over, usage - int(limit * self.target_ratio))
+        return over
+
+    def enforce(self, force_bytes=None):
+        """
+        檢查預算並在超出時回收快取
+
+        Args:
+            force_bytes (int, optional): 直接回收指定 bytes（不檢查用量）
+
+        Returns:
+            int: 估計回收的 bytes
+        """
+        with self._lock:
+            if force_bytes is None and self.last_enforced and \
+                    time.time() - self.last_enforced['time'] < self.cooldown:
+                return 0
+            to_free = force_bytes if force_bytes is not None else self._bytes_over()
+            if to_free <= 0:
+                return 0
+            freed = 0
+            for layer in self.layers:
+                if layer.evict is None or freed >= to_free:
+                    continue
+                try:
+                    layer_freed = layer.evict(to_free - freed)
+                except Exception as e:
+                    logger.error(f"回收快取 {layer.name} 時出錯: {e}")
+                    continue
+                if layer_freed:
+                    layer.evicted_bytes += layer_freed
+                    layer.evictions += 1
+                    freed += layer_freed
+            gc.collect()
+            _malloc_trim()
+            self.last_enforced = {'time': time.time(), 'requested_bytes': to_free, 'freed_bytes': freed}
+        logger.warning(f"記憶體超出預算，已回收快取約 {freed / 1024 / 1024:.1f} MB"
+                       f"（目標 {to_free / 1024 / 1024:.1f} MB）")
+        return freed
+
+    def configure(self, budget_bytes=None, high_watermark=0.85, target_ratio=0.7):
+        """設定預算（app 啟動時依 Config 呼叫）"""
+        self.budget_bytes = budget_bytes
+        self.high_watermark = high_watermark
+        self.target_ratio = target_ratio
+
+    def start(self, interval=5.0):
+        """啟動背景檢查（每個 worker 一個，gevent 下為 greenlet）"""
+        if self._thread is not None:
+            return
+
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.enforce()
+                except Exception as e:
+                    logger.error(f"記憶體預算檢查時出錯: {e}")
+
+        self._thread = threading.Thread(target=run, name='memory-budget', daemon=True)
+        self._thread.start()
+
+    def status(self):
+        """各快取層的項目數、估計 bytes 與回收紀錄，以及行程與容器的記憶體用量"""
+        layers = []
+        for layer in self.layers:
+            try:
+                entries, estimated = layer.entries(), layer.estimate()
+            except Exception as e:
+                entries, estimated = None, None
+                logger.error(f"統計快取 {layer.name} 時出錯: {e}")
+            layers.append({
+                'name': layer.name,
+                'entries': entries,
+                'estimated_bytes': estimated,
+                'evictable': layer.evict is not None,
+                'evictions': layer.evictions,
+                'evicted_bytes': layer.evicted_bytes
+            })
+        usage, limit = cgroup_memory()
+        return {
+            'pid': os.getpid(),
+            'rss_bytes': process_rss(),
+            'budget_bytes': self.budget_bytes,
+            'cgroup_usage_bytes': usage,
+            'cgroup_limit_bytes': limit,
+            'high_watermark': self.high_watermark,
+            'last_enforced': self.last_enforced,
+            'layers': layers,
+            'tracemalloc': tracemalloc.is_tracing()
+        }
+
+
+def tracemalloc_snapshot(limit=25, group_by='lineno'):
+    """
+    目前 tracemalloc 追蹤到的前幾大配置位置（需先 tracemalloc.start()）
+
+    Returns:
+        dict: {'traced_bytes', 'peak_bytes', 'top': [{'location', 'size_bytes', 'count'}, ...]}
+    """
+    if not tracemalloc.is_tracing():
+        raise ValueError('tracemalloc 尚未啟動')
+    snapshot = tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    ))
+    current, peak = tracemalloc.get_traced_memory()
+    return {
+        'traced_bytes': current,
+        'peak_bytes': peak,
+        'top': [
+            {'location': str(stat.traceback), 'size_bytes': stat.size, 'count': stat.count}
+            for stat in snapshot.statistics(group_by)[:limit]
+        ]
+    }
+
+
+def simple_cache_layer(backend):
+    """
+    Flask-Caching SimpleCache 的統計與回收函數（值已序列化為 bytes，大小可精確計算）
+
+    Returns:
+        tuple: (entries, estimate, evict)
+    """
+    def entries():
+        return len(backend._cache)
+
+    def estimate():
+        return sum(sys.getsizeof(key) + len(value) for key, (_, value) in list(backend._cache.items()))
+
+    def evict(bytes_to_free):
+        # 先移除已過期，再依到期時間由早到晚移除（到期時間 0 表示永不過期，最後移除）
+        now = time.time()
+
+        def order(item):
+            expires = item[1][0]
+            return (0 if 0 < expires < now else 1, expires or float('inf'))
+
+        items = sorted(list(backend._cache.items()), key=order)
+        freed = 0
+        for key, (_, value) in items:
+            if freed >= bytes_to_free:
+                break
+            if backend._cache.pop(key, None) is not None:
+                freed += sys.getsizeof(key) + len(value)
+        return freed
+
+    return entries, estimate, evict
+
+
+# 全域記憶體預算（app 啟動時設定上限並登錄各快取層）
+memory_budget = MemoryBudget()
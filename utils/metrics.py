@@ -0,0 +1,160 @@
+import os
+import threading
+from bisect import bisect_left
+
+# 延遲直方圖的上界（秒），涵蓋記憶體快取命中到多次重試的網路請求
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0
+)
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape_label(value)}"' for key, value in labels) + '}'
+
+
+class Histogram:
+    """
+    固定區間的延遲直方圖：每次記錄只做一次二分搜尋與計數
+
+    Attributes:
+        counts (list): 各區間（非累計）的次數，最後一格為超出最大上界
+        total (float): 所有記錄值的總和
+        count (int): 記錄次數
+    """
+
+    __slots__ = ('buckets', 'counts', 'total', 'count', '_lock')
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.total += value
+            self.count += 1
+
+    def snapshot(self):
+        """
+        Returns:
+            tuple: ([(上界, 累計次數), ...], 總和, 次數)
+        """
+        with self._lock:
+            counts = list(self.counts)
+            total, count = self.total, self.count
+        cumulative = []
+        running = 0
+        for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+            running += bucket_count
+            cumulative.append((bound, running))
+        return cumulative, total, count
+
+
+class MetricsRegistry:
+    """
+    行程內的指標登錄表，以 Prometheus 文字格式輸出
+
+    gunicorn 每個 worker 各有一份，輸出時附上 pid 標籤區分。
+
+    Example:
+        metrics.observe('utils.scraper.fetch_url', 0.42)
+        metrics.observe('utils.scraper.fetch_url', 1.3, error=True)
+        metrics.register_gauge('app_errors', '累計錯誤數', lambda: system_status['error_count'])
+        text = metrics.render()
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._histograms = {}
+        self._errors = {}
+        self._gauges = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, name):
+        """取得（必要時建立）函數的延遲直方圖"""
+        histogram = self._histograms.get(name)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(name, Histogram(self.buckets))
+        return histogram
+
+    def observe(self, name, seconds, error=False):
+        """記錄一次函數呼叫的耗時，error 為 True 時同時累計錯誤次數"""
+        self.histogram(name).observe(seconds)
+        if error:
+            with self._lock:
+                self._errors[name] = self._errors.get(name, 0) + 1
+
+    def register_gauge(self, name, help_text, getter):
+        """
+        登錄於輸出時才取值的指標
+
+        Args:
+            name (str): 指標名稱（Prometheus 命名規則）
+            help_text (str): 說明
+            getter (callable): 返回目前數值，取值失敗或返回 None 時略過此指標
+        """
+        self._gauges[name] = (help_text, getter)
+
+    def render(self):
+        """以 Prometheus 文字格式（0.0.4）輸出所有指標"""
+        pid = ('pid', os.getpid())
+        lines = [
+            '# HELP function_duration_seconds 函數執行時間',
+            '# TYPE function_duration_seconds histogram',
+        ]
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            errors = sorted(self._errors.items())
+            gauges = sorted(self._gauges.items())
+
+        for name, histogram in histograms:
+            cumulative, total, count = histogram.snapshot()
+            function = ('function', name)
+            for bound, running in cumulative:
+                labels = _format_labels([function, ('le', _format_value(bound)), pid])
+                lines.append(f'function_duration_seconds_bucket{labels} {running}')
+            labels = _format_labels([function, pid])
+            lines.append(f'function_duration_seconds_sum{labels} {_format_value(total)}')
+            lines.append(f'function_duration_seconds_count{labels} {count}')
+
+        lines.append('# HELP function_errors_total 函數拋出例外的次數')
+        lines.append('# TYPE function_errors_total counter')
+        for name, count in errors:
+            lines.append(f'function_errors_total{_format_labels([("function", name), pid])} {count}')
+
+        for name, (help_text, getter) in gauges:
+            try:
+                value = getter()
+            except Exception:
+                continue
+            # 無法取得（如非容器環境的 cgroup 記憶體）時略過，None 不是合法的 Prometheus 數值
+            if value is None:
+                continue
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} gauge')
+            lines.append(f'{name}{_format_labels([pid])} {_format_value(value)}')
+
+        return '\n'.join(lines) + '\n'
+
+
+# 全域指標登錄表（timer_decorator 記錄於此，/metrics 輸出）
+metrics = MetricsRegistry()
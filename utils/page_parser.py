@@ -0,0 +1,161 @@
+import os
+import pickle
+import logging
+import tempfile
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+
+from config import Config
+from utils.records import parse_int, parse_float
+
+# 配置日誌
+logger = logging.getLogger(__name__)
+
+# 解析用的行程池（延遲建立）；gevent worker 下 BeautifulSoup 解析會佔住事件迴圈，
+# 移到獨立行程後同一 worker 的其他連線（keep-alive、進度查詢）不受影響
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def parse_revenue_page(page):
+    """
+    解析月營收彙總頁面的所有公司資料（於子行程執行，只依賴 bs4 與數值轉換）
+
+    Args:
+        page (bytes): 頁面原始內容
+
+    Returns:
+        list: [(公司代號, 公司名稱, 當月營收, 上月營收, 去年當月營收, 上月比較增減, 去年同月增減), ...]
+    """
+    # bs4 只在解析時載入：行程池模式下 web worker 本身不需要載入
+    from bs4 import BeautifulSoup
+
+    # 頁面為 Big5 但未宣告編碼，先以 latin-1 保留原始位元組，公司名稱再轉回 Big5
+    soup = BeautifulSoup(page.decode('latin-1'), 'html.parser')
+    target_table = soup.find('table')
+    if not target_table:
+        return []
+
+    rows = []
+    for row in target_table.find_all('tr')[2:]:  # 忽略前兩行
+        columns = row.find_all('td')
+        if len(columns) < 7:
+            continue
+        rows.append((
+            columns[0].text.strip(),
+            columns[1].text.strip().encode('latin-1').decode('big5', 'ignore'),
+            parse_int(columns[2].text.strip()),
+            parse_int(columns[3].text.strip()),
+            parse_int(columns[4].text.strip()),
+            parse_float(columns[5].text.strip()),
+            parse_float(columns[6].text.strip())
+        ))
+    return rows
+
+
+def _parse_file(path):
+    """
+    子行程：讀取頁面檔案並解析，結果以 pickle 寫回同一檔案
+
+    頁面與結果經由暫存檔交換，行程池的管線只傳送檔名：gevent worker 中行程池的
+    內部執行緒為 greenlet，管線寫入超過緩衝區（64KB）時會阻塞整個事件迴圈，
+    子行程同時在等待父行程讀取結果，兩端互相等待而卡死。
+    """
+    with open(path, 'rb') as f:
+        rows = parse_revenue_page(f.read())
+    with open(path, 'wb') as f:
+        pickle.dump(rows, f, protocol=pickle.HIGHEST_PROTOCOL)
+    return path
+
+
+def _unlink_quietly(path):
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+
+def _get_pool():
+    """取得解析行程池；PARSE_PROCESSES 為 0 時返回 None（於目前行程解析）"""
+    global _pool
+    if Config.PARSE_PROCESSES <= 0:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            # spawn：子行程不繼承 gevent 的 monkey patch 與已開啟的資料庫連線
+            _pool = ProcessPoolExecutor(
+                max_workers=Config.PARSE_PROCESSES,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+            logger.info(f"已建立頁面解析行程池，共 {Config.PARSE_PROCESSES} 個行程")
+        return _pool
+
+
+def _discard_pool(pool):
+    """行程池損壞（子行程被終止）時丟棄，下次呼叫重新建立"""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False)
+
+
+def parse_page(page):
+    """
+    解析月營收頁面：送入行程池解析，等待期間不佔用事件迴圈
+
+    行程池無法使用時退回目前行程解析；解析逾時返回 None（不在目前行程重新解析，
+    避免同一個異常頁面再佔住事件迴圈）。
+
+    Args:
+        page (bytes): 頁面原始內容
+
+    Returns:
+        list or None: 與 parse_revenue_page 相同的資料列，解析逾時返回 None
+    """
+    pool = _get_pool()
+    if pool is None:
+        return parse_revenue_page(page)
+    fd, path = tempfile.mkstemp(prefix='page_', suffix='.bin')
+    # 逾時後子行程可能仍在寫入暫存檔，改由該工作完成時刪除
+    owned = True
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(page)
+        future = pool.submit(_parse_file, path)
+        try:
+            future.result(timeout=Config.PARSE_TIMEOUT)
+        except FutureTimeoutError:
+            if not future.cancel():
+                owned = False
+                future.add_done_callback(lambda _: _unlink_quietly(path))
+            logger.error(f"頁面解析超過 {Config.PARSE_TIMEOUT} 秒，放棄此頁面")
+            return None
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+    except BrokenProcessPool as e:
+        logger.error(f"頁面解析行程池已損壞，改於目前行程解析: {e}")
+        _discard_pool(pool)
+        return parse_revenue_page(page)
+    finally:
+        if owned:
+            _unlink_quietly(path)
+
+
+def warm_up():
+    """預先啟動解析行程池的子行程（啟動時呼叫，第一次抓取不需等待子行程啟動）"""
+    pool = _get_pool()
+    if pool is not None:
+        pool.submit(parse_revenue_page, b'').result(timeout=Config.PARSE_TIMEOUT)
+
+
+def shutdown():
+    """關閉解析行程池"""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=True)
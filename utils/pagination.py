@@ -0,0 +1,81 @@
+import json
+import base64
+
+# 單頁筆數上限，避免客戶端以超大頁面繞過分頁
+MAX_PAGE_SIZE = 1000
+
+
+def encode_cursor(values):
+    """將排序鍵編碼為不透明的分頁游標"""
+    payload = json.dumps(list(values), ensure_ascii=False, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """解析分頁游標，返回排序鍵 tuple；格式錯誤時拋出 ValueError"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+    except Exception:
+        raise ValueError('無效的分頁游標')
+    if not isinstance(values, list):
+        raise ValueError('無效的分頁游標')
+    return tuple(values)
+
+
+def parse_page_size(value, default=None, max_size=MAX_PAGE_SIZE):
+    """
+    解析每頁筆數
+
+    Returns:
+        int or None: 每頁筆數；未提供且無預設值時返回 None（不分頁）
+
+    Raises:
+        ValueError: 格式不正確或超出範圍
+    """
+    if value in (None, ''):
+        return default
+    try:
+        page_size = int(value)
+    except (TypeError, ValueError):
+        raise ValueError('page_size 必須為整數')
+    if not 1 <= page_size <= max_size:
+        raise ValueError(f'page_size 必須介於 1 與 {max_size} 之間')
+    return page_size
+
+
+def paginate_sorted(items, key, page_size, cursor=None):
+    """
+    對已依 key 排序的列表做 keyset 分頁
+
+    以二分搜尋找出排序鍵大於游標的第一筆，結果不受前面資料增減影響。
+
+    Args:
+        items (list): 已依 key 遞增排序的列表
+        key (callable): 取得排序鍵（tuple）的函數
+        page_size (int): 每頁筆數
+        cursor (str, optional): 上一頁返回的游標
+
+    Returns:
+        tuple: (本頁資料, 下一頁游標或 None)
+    """
+    start = 0
+    if cursor:
+        after = decode_cursor(cursor)
+        low, high = 0, len(items)
+        try:
+            while low < high:
+                mid = (low + high) // 2
+                if tuple(key(items[mid])) <= after:
+                    low = mid + 1
+                else:
+                    high = mid
+        except TypeError:
+            raise ValueError('無效的分頁游標')
+        start = low
+
+    page = items[start:start + page_size]
+    next_cursor = None
+    if start + page_size < len(items):
+        next_cursor = encode_cursor(key(page[-1]))
+    return page, next_cursor
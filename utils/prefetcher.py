@@ -0,0 +1,194 @@
+import os
+import time
+import uuid
+import logging
+import datetime
+import threading
+from zoneinfo import ZoneInfo
+
+# 配置日誌
+logger = logging.getLogger(__name__)
+
+# 跨 worker 協調上游抓取的租約鍵
+REFRESH_LEASE_KEY = 'prefetch_refresh'
+
+
+def parse_hours(hours_input):
+    """
+    解析離峰時段設定
+
+    Args:
+        hours_input (str): 逗號分隔的小時或範圍，如 "1-6" 或 "22-5"（跨午夜），空字串表示不限時段
+
+    Returns:
+        set or None: 允許的小時（0-23），不限時段時返回 None
+
+    Raises:
+        ValueError: 格式不正確
+    """
+    hours_input = (hours_input or '').strip()
+    if not hours_input:
+        return None
+    hours = set()
+    for part in hours_input.split(','):
+        if '-' in part:
+            start, end = (int(value) for value in part.split('-'))
+        else:
+            start = end = int(part)
+        if not (0 <= start <= 23 and 0 <= end <= 23):
+            raise ValueError(f'小時需介於 0 至 23: {part}')
+        hour = start
+        hours.add(hour)
+        while hour != end:
+            hour = (hour + 1) % 24
+            hours.add(hour)
+    return hours
+
+
+class QueryPrefetcher:
+    """
+    依查詢歷史預先更新熱門查詢的資料並建立快取
+
+    1. 以所有用戶的查詢次數排名，並依距最近一次查詢的天數（半衰期）遞減
+    2. 重新抓取排名前段查詢中過期或缺少的營收資料，每輪抓取的月份頁面數不超過預算；
+       多個 worker 以資料庫租約協調，同一期間只由一個 worker 向上游抓取
+    3. 呼叫 warm 建立查詢結果與圖表快取（每個 worker 各自的記憶體快取）
+
+    資料過期又超出預算的查詢略過，不以過期資料預熱（避免觸發預算外的背景更新）。
+
+    Example:
+        prefetcher = QueryPrefetcher(db, planner, refresh=partial(fetch_and_process, priority=PREFETCH),
+                                     warm=prefetch_query,
+                                     max_age_days=30,
+                                     fetch_count=lambda: crawl_scheduler.stats['fetched'])
+        prefetcher.start(interval=3600, limit=20, days=30, upstream_budget=200, hours=parse_hours('1-6'),
+                         timezone='Asia/Taipei')
+    """
+
+    def __init__(self, db, planner, refresh, warm, max_age_days, half_life_days=7.0, fetch_count=None):
+        """
+        Args:
+            db (Database): 查詢歷史、資料新鮮度與租約表的資料庫物件
+            planner (QueryPlanner): 展開並驗證查詢條件
+            refresh (callable): refresh(company_id, year, month)，向上游抓取並入庫
+                （經由抓取排程器，同一月份頁面只抓取一次）
+            warm (callable): warm(company_ids_input, year_range_input, month_range_input, refreshed)，
+                建立快取並返回結果筆數
+            max_age_days (float): 營收資料有效天數，超過即需重新抓取
+            half_life_days (float): 查詢熱度的半衰期（天）
+            fetch_count (callable, optional): 返回抓取排程器累計向上游抓取的頁面數，以實際抓取數計算預算；
+                未提供時以需更新的月份頁面數估計
+        """
+        self.db = db
+        self.planner = planner
+        self.refresh = refresh
+        self.warm = warm
+        self.max_age_days = max_age_days
+        self.half_life_days = half_life_days
+        self.fetch_count = fetch_count
+        self.last_run = None
+        self._owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def rank(self, limit, days):
+        """
+        熱門查詢排名：查詢次數 × 0.5 ^ (距最近一次查詢天數 / 半衰期)
+
+        候選取查詢次數最多的 limit × 5 筆，再依熱度重新排序。
+
+        Returns:
+            list: get_popular_queries 的項目加上 'score'，依熱度由高到低
+        """
+        candidates = self.db.get_popular_queries(limit * 5, days)
+        for candidate in candidates:
+            decay = 0.5 ** (candidate['age_days'] / self.half_life_days) if self.half_life_days > 0 else 1.0
+            candidate['score'] = candidate['hits'] * decay
+        candidates.sort(key=lambda candidate: candidate['score'], reverse=True)
+        return candidates[:limit]
+
+    def run_once(self, limit, days, upstream_budget):
+        """
+        預先抓取一輪
+
+        Args:
+            limit (int): 處理的熱門查詢數
+            days (int): 只採計最近 days 天內的查詢歷史
+            upstream_budget (int): 本輪最多向上游抓取的月份頁面數（0 表示只預熱資料已有效的查詢）；
+                依月份頁面逐頁更新，每頁更新前檢查實際抓取數，預算用完即停止
+
+        Returns:
+            dict: {'queries', 'warmed', 'refreshed', 'fetches', 'over_budget', 'skipped', 'records'}
+        """
+        stats = {'queries': 0, 'warmed': 0, 'refreshed': 0, 'fetches': 0, 'over_budget': 0, 'skipped': 0,
+                 'records': 0}
+        with self._lock:
+            for candidate in self.rank(limit, days):
+                stats['queries'] += 1
+                args = (candidate['company_ids'], candidate['year_range'], candidate['month_range'])
+                try:
+                    company_ids, years, months = self.planner.expand(*args)
+                    fresh_keys = self.db.get_cached_revenue_keys(company_ids, years, months, self.max_age_days)
+                    # 依月份頁面分組：同一頁面的公司連續更新，頁面只抓取一次
+                    pages = {}
+                    for year in years:
+                        for month in months:
+                            for company_id in company_ids:
+                                if (company_id, year, month) not in fresh_keys:
+                                    pages.setdefault((year, month), []).append(company_id)
+                    if len(pages) > upstream_budget - stats['fetches']:
+                        stats['over_budget'] += 1
+                        continue
+                    completed = True
+                    for (year, month), page_company_ids in pages.items():
+                        if stats['fetches'] >= upstream_budget:
+                            completed = False
+                            break
+                        fetched_before = self.fetch_count() if self.fetch_count else None
+                        for company_id in page_company_ids:
+                            self.refresh(company_id, year, month)
+                        stats['fetches'] += (self.fetch_count() - fetched_before) if self.fetch_count else 1
+                    if pages:
+                        stats['refreshed'] += 1
+                        # 寫入資料庫，其他 worker 預熱時即可讀到
+                        self.db.flush_writes()
+                    if not completed:
+                        stats['over_budget'] += 1
+                        continue
+                    stats['records'] += self.warm(*args, refreshed=bool(pages))
+                except Exception as e:
+                    logger.warning(f"預先抓取查詢 {args} 時出錯: {e}")
+                    stats['skipped'] += 1
+                    continue
+                stats['warmed'] += 1
+        return stats
+
+    def start(self, interval, limit, days, upstream_budget, hours=None, timezone='Asia/Taipei'):
+        """
+        啟動背景預先抓取（每個 worker 一個，gevent 下為 greenlet）
+
+        Args:
+            interval (float): 每輪間隔秒數，也是上游抓取租約的有效秒數
+            hours (set, optional): 允許執行的小時（parse_hours 的結果），None 表示不限時段
+            timezone (str): 判斷離峰時段的時區（容器預設為 UTC，離峰時段以台灣時間為準）
+        """
+        if self._thread is not None:
+            return
+        zone = ZoneInfo(timezone)
+
+        def run():
+            while True:
+                time.sleep(interval)
+                if hours is not None and datetime.datetime.now(zone).hour not in hours:
+                    continue
+                try:
+                    # 取得租約的 worker 使用上游預算，其他 worker 只預熱自己的快取
+                    leader = self.db.acquire_query_lease(REFRESH_LEASE_KEY, self._owner, interval)
+                    stats = self.run_once(limit, days, upstream_budget if leader else 0)
+                    self.last_run = dict(stats, time=time.time(), leader=leader)
+                    logger.info(f"預先抓取完成: {self.last_run}")
+                except Exception as e:
+                    logger.error(f"預先抓取時出錯: {e}")
+
+        self._thread = threading.Thread(target=run, name='query-prefetcher', daemon=True)
+        self._thread.start()
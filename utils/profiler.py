@@ -0,0 +1,141 @@
+import os
+import sys
+import time
+import _thread
+import logging
+import threading
+from collections import Counter
+
+# 配置日誌
+logger = logging.getLogger(__name__)
+
+# 閒置中的堆疊頂端（事件迴圈等待、鎖／佇列等待），預設不計入取樣結果
+_IDLE_LEAVES = {
+    ('hub.py', 'run'),
+    ('hub.py', 'wait'),
+    ('threading.py', 'wait'),
+    ('queue.py', 'get'),
+    ('selectors.py', 'select'),
+    ('connection.py', 'wait'),
+    ('socket.py', 'accept'),
+    ('profiler.py', 'run'),  # 等待取樣結束的呼叫端
+}
+
+
+def _native(module, name, default):
+    """取得未被 gevent monkey patch 的原始函數；取樣必須在真實執行緒中進行，
+    否則 CPU 密集的 greenlet 佔住事件迴圈時取樣器也無法執行"""
+    try:
+        from gevent import monkey
+    except ImportError:
+        return default
+    return monkey.get_original(module, name)
+
+
+class SamplingProfiler:
+    """
+    統計式取樣分析器：以真實執行緒定時讀取各執行緒的 Python 堆疊
+
+    gevent worker 中所有 greenlet 共用主執行緒，主執行緒的堆疊即為當下執行中的 greenlet。
+    輸出 collapsed stack 格式（flamegraph.pl、speedscope 可直接讀取）。
+
+    Example:
+        profiler = SamplingProfiler(interval=0.01)
+        collapsed = profiler.run(seconds=10)
+    """
+
+    def __init__(self, interval=0.01, include_idle=False, max_depth=128):
+        """
+        Args:
+            interval (float): 取樣間隔秒數
+            include_idle (bool): 是否計入閒置中（等待 I/O、鎖）的堆疊
+            max_depth (int): 每個堆疊最多記錄的層數
+        """
+        self.interval = interval
+        self.include_idle = include_idle
+        self.max_depth = max_depth
+        self.samples = Counter()
+        self.sample_count = 0
+        self.idle_count = 0
+        self._code_labels = {}
+        self._done = False
+
+    def _label(self, code):
+        label = self._code_labels.get(code)
+        if label is None:
+            label = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+            self._code_labels[code] = label
+        return label
+
+    def _is_idle(self, frame):
+        return (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name) in _IDLE_LEAVES
+
+    def _sample(self, own_ident, thread_names):
+        for ident, frame in sys._current_frames().items():
+            if ident == own_ident:
+                continue
+            self.sample_count += 1
+            if not self.include_idle and self._is_idle(frame):
+                self.idle_count += 1
+                continue
+            stack = []
+            while frame is not None and len(stack) < self.max_depth:
+                stack.append(self._label(frame.f_code))
+                frame = frame.f_back
+            stack.append(thread_names.get(ident, f'thread-{ident}'))
+            self.samples[';'.join(reversed(stack))] += 1
+
+    def _run(self, seconds, thread_names):
+        sleep = _native('time', 'sleep', time.sleep)
+        own_ident = _native('_thread', 'get_ident', _thread.get_ident)()
+        deadline = time.perf_counter() + seconds
+        try:
+            while time.perf_counter() < deadline:
+                self._sample(own_ident, thread_names)
+                sleep(self.interval)
+        except Exception as e:
+            logger.error(f"取樣分析時出錯: {e}")
+        finally:
+            self._done = True
+
+    def run(self, seconds):
+        """
+        取樣 seconds 秒並返回 collapsed stack 文字
+
+        取樣在真實執行緒中進行；呼叫端以（gevent 下為協作式的）time.sleep 輪詢等待。
+        """
+        # gevent 下 threading 的 ident 為 greenlet 代號，呼叫端所在的真實執行緒另外標示
+        thread_names = {thread.ident: thread.name.replace(';', '_') for thread in threading.enumerate()}
+        caller_ident = _native('_thread', 'get_ident', _thread.get_ident)()
+        thread_names.setdefault(caller_ident, 'MainThread')
+        self._done = False
+        _native('_thread', 'start_new_thread', _thread.start_new_thread)(self._run, (seconds, thread_names))
+        while not self._done:
+            time.sleep(min(0.1, seconds))
+        logger.info(f"取樣分析完成：{seconds} 秒，{self.sample_count} 個樣本（閒置 {self.idle_count}）")
+        return self.collapsed()
+
+    def collapsed(self):
+        """collapsed stack 格式：每行「根;...;葉 次數」，依次數遞減排序"""
+        return ''.join(f'{stack} {count}\n' for stack, count in self.samples.most_common())
+
+
+# 同一 worker 同時只允許一個取樣分析
+_profile_lock = threading.Lock()
+
+
+def profile(seconds, interval=0.01, include_idle=False):
+    """
+    對目前的 worker 行程取樣分析
+
+    Returns:
+        SamplingProfiler: 已完成取樣的分析器，取樣進行中時返回 None
+    """
+    if not _profile_lock.acquire(blocking=False):
+        return None
+    try:
+        profiler = SamplingProfiler(interval=interval, include_idle=include_idle)
+        profiler.run(seconds)
+        return profiler
+    finally:
+        _profile_lock.release()
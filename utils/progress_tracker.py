@@ -3,7 +3,6 @@ import time
 import logging
 
 # 配置日誌
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # 全局進度追蹤器
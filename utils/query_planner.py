@@ -0,0 +1,323 @@
+import os
+import uuid
+import datetime
+import logging
+import threading
+from contextlib import contextmanager
+
+# 配置日誌
+logger = logging.getLogger(__name__)
+
+# 查詢計畫的處理方式
+ANSWER = 'answer'  # 直接同步回應
+CHUNK = 'chunk'    # 同步回應，但分批送入爬蟲避免一次排入大量任務
+JOB = 'job'        # 轉為背景工作，客戶端輪詢 /api/jobs/<id>
+REJECT = 'reject'  # 拒絕並說明原因
+
+
+def parse_range_bounds(range_input):
+    """
+    解析 "111-112" 或 "111" 格式的範圍，只返回起訖值，不展開成列表
+
+    Returns:
+        tuple: (start, end)
+
+    Raises:
+        ValueError: 格式不正確
+    """
+    if '-' in range_input:
+        start, end = map(int, range_input.split('-'))
+    else:
+        start = end = int(range_input)
+    return start, end
+
+
+class QueryRejected(ValueError):
+    """查詢超出可處理範圍（沿用 ValueError，API 以 400 回應）"""
+
+
+class AsyncJobRequired(Exception):
+    """查詢需要轉為背景工作執行"""
+
+    def __init__(self, plan):
+        super().__init__(plan.message)
+        self.plan = plan
+
+
+class QuotaExceeded(Exception):
+    """用戶同時進行中的查詢數超過配額"""
+
+
+class QueryPlan:
+    """
+    查詢計畫：展開後的查詢條件、成本估計與處理方式
+
+    Attributes:
+        company_ids (list): 公司代號
+        years (list): 民國年份
+        months (list): 月份
+        tasks (int): 公司 × 年 × 月 的任務數
+        cached (int): 資料庫中已有可用資料的任務數
+        upstream_fetches (int): 需向公開資訊觀測站取得資料的任務數
+        upstream_pages (int): 需抓取的不重複月份頁面數（抓取排程器對相同頁面只抓一次，以此計算成本）
+        unknown_ids (list): 不在公司名錄中的代號（仍照常抓取，由月份頁面確認並收錄）
+        action (str): answer / chunk / job / reject
+        message (str): 給使用者的說明
+    """
+
+    def __init__(self, company_ids, years, months, tasks, cached, upstream_fetches, upstream_pages):
+        self.company_ids = company_ids
+        self.years = years
+        self.months = months
+        self.tasks = tasks
+        self.cached = cached
+        self.upstream_fetches = upstream_fetches
+        self.upstream_pages = upstream_pages
+        self.unknown_ids = []
+        self.action = ANSWER
+        self.message = ''
+        self.chunk_size = None
+
+    def chunks(self):
+        """
+        依月份頁面分批的查詢條件，每批包含所有公司，任務數不超過 chunk_size（單一頁面超過時每批一個頁面）
+
+        每個月份頁面只出現在一個批次中，頁面數超過抓取排程器的頁面快取時也不會重複抓取。
+
+        Yields:
+            tuple: (company_ids, years, months)
+        """
+        if not self.chunk_size:
+            yield self.company_ids, self.years, self.months
+            return
+        pages_per_chunk = max(1, self.chunk_size // len(self.company_ids))
+        if pages_per_chunk >= len(self.months):
+            years_per_chunk = pages_per_chunk // len(self.months)
+            for start in range(0, len(self.years), years_per_chunk):
+                yield self.company_ids, self.years[start:start + years_per_chunk], self.months
+            return
+        for year in self.years:
+            for start in range(0, len(self.months), pages_per_chunk):
+                yield self.company_ids, [year], self.months[start:start + pages_per_chunk]
+
+    def to_dict(self):
+        return {
+            'action': self.action,
+            'message': self.message,
+            'tasks': self.tasks,
+            'cached': self.cached,
+            'upstream_fetches': self.upstream_fetches,
+            'upstream_pages': self.upstream_pages,
+            'unknown_ids': self.unknown_ids
+        }
+
+
+def current_roc_year():
+    return datetime.date.today().year - 1911
+
+
+class QueryPlanner:
+    """
+    查詢成本規劃與准入控制
+
+    1. 展開並驗證年份（公開資訊觀測站提供的民國年）、月份與公司代號格式
+    2. 以資料庫既有資料估計需向上游抓取的月份頁面數
+    3. 依成本決定同步回應、分批、轉為背景工作或拒絕
+
+    Example:
+        planner = QueryPlanner(db, Config, company_index)
+        plan = planner.plan('2330,2317', '110-112', '1-12')
+    """
+
+    def __init__(self, db, config, company_index=None):
+        """
+        Args:
+            db (Database): 用於估計快取命中的資料庫物件
+            config: 設定類別（Config）
+            company_index (CompanyIndex, optional): 公司名錄，提供時在查詢計畫中標示名錄中不存在的公司代號
+        """
+        self.db = db
+        self.company_index = company_index
+        self.min_year = config.MOPS_MIN_YEAR
+        self.max_companies = config.MAX_QUERY_COMPANIES
+        self.max_tasks = config.MAX_QUERY_TASKS
+        self.chunk_tasks = config.QUERY_CHUNK_TASKS
+        self.sync_fetch_limit = config.SYNC_FETCH_LIMIT
+        self.async_fetch_limit = config.ASYNC_FETCH_LIMIT
+        self.max_age_days = config.REVENUE_MAX_AGE_DAYS
+        self.max_stale_days = config.REVENUE_MAX_STALE_DAYS if config.STALE_WHILE_REVALIDATE else None
+
+    def expand(self, company_ids_input, year_range_input, month_range_input):
+        """
+        展開並驗證查詢條件
+
+        Returns:
+            tuple: (company_ids, years, months)
+
+        Raises:
+            ValueError: 格式不正確或超出公開資訊觀測站提供的範圍
+        """
+        company_ids = list(dict.fromkeys(
+            company_id.strip() for company_id in company_ids_input.split(',') if company_id.strip()
+        ))
+        if not company_ids:
+            raise ValueError('请提供公司代号')
+        invalid_ids = [company_id for company_id in company_ids if not company_id.isalnum() or len(company_id) > 10]
+        if invalid_ids:
+            raise ValueError(f"公司代號格式不正確: {', '.join(invalid_ids[:5])}")
+        if len(company_ids) > self.max_companies:
+            raise QueryRejected(f'一次最多查詢 {self.max_companies} 家公司（目前 {len(company_ids)} 家）')
+        # 先檢查起訖值再展開，避免過大的範圍在驗證前就建立龐大的列表
+        try:
+            year_start, year_end = parse_range_bounds(year_range_input)
+            month_start, month_end = parse_range_bounds(month_range_input)
+        except (TypeError, ValueError):
+            raise ValueError('年份或月份格式不正確，請使用如 111-112 或 1-12 的格式')
+        if year_start > year_end or month_start > month_end:
+            raise ValueError('缺少必要参数或参数格式不正確')
+
+        latest_year = current_roc_year()
+        if year_start < self.min_year or year_end > latest_year:
+            raise ValueError(
+                f'年份需介於民國 {self.min_year} 至 {latest_year} 年（公開資訊觀測站提供的範圍），'
+                f'目前為 {year_start}-{year_end}'
+            )
+        if month_start < 1 or month_end > 12:
+            raise ValueError('月份需介於 1 至 12')
+        return company_ids, list(range(year_start, year_end + 1)), list(range(month_start, month_end + 1))
+
+    def plan(self, company_ids_input, year_range_input, month_range_input, force_refresh=False):
+        """
+        建立查詢計畫
+
+        Returns:
+            QueryPlan: 查詢計畫
+
+        Raises:
+            ValueError: 查詢條件不正確（含 QueryRejected）
+        """
+        company_ids, years, months = self.expand(company_ids_input, year_range_input, month_range_input)
+        tasks = len(company_ids) * len(years) * len(months)
+        if tasks > self.max_tasks:
+            raise QueryRejected(
+                f'查詢範圍過大：{len(company_ids)} 家公司 × {len(years)} 年 × {len(months)} 月'
+                f' = {tasks} 筆，上限為 {self.max_tasks} 筆，請縮小範圍'
+            )
+
+        cached_keys = set() if force_refresh else self.db.get_cached_revenue_keys(
+            company_ids, years, months, self.max_stale_days or self.max_age_days
+        )
+        missing_pages = set()
+        upstream_fetches = 0
+        for company_id in company_ids:
+            for year in years:
+                for month in months:
+                    if (company_id, year, month) not in cached_keys:
+                        upstream_fetches += 1
+                        missing_pages.add((year, month))
+
+        upstream_pages = len(missing_pages)
+        plan = QueryPlan(
+            company_ids, years, months, tasks, tasks - upstream_fetches,
+            upstream_fetches, upstream_pages
+        )
+        if self.company_index is not None:
+            # 名錄可能尚未收錄新上市或已下市的公司，不拒絕：抓取的月份頁面會確認並收錄，
+            # 成本與其他代號相同，以月份頁面數計算並受上限控制
+            self.company_index.refresh_if_stale()
+            plan.unknown_ids = self.company_index.unknown_ids(company_ids)
+
+        if upstream_pages > self.async_fetch_limit:
+            plan.action = REJECT
+            plan.message = (f'此查詢需向公開資訊觀測站抓取 {upstream_pages} 個月份頁面，'
+                            f'超過上限 {self.async_fetch_limit} 個，請縮小範圍')
+        elif upstream_pages > self.sync_fetch_limit:
+            plan.action = JOB
+            plan.message = f'此查詢需抓取 {upstream_pages} 個月份頁面，已轉為背景工作執行'
+        elif tasks > self.chunk_tasks:
+            plan.action = CHUNK
+            plan.chunk_size = self.chunk_tasks
+        logger.info(f"查詢計畫: {plan.to_dict()}")
+        return plan
+
+
+class UserQuota:
+    """
+    每位用戶同時進行中的查詢數配額，避免單一用戶佔滿爬蟲
+
+    提供 db 時以資料庫租約表（query_leases）的名額列計數，所有 gunicorn worker 共用同一個上限；
+    每個名額是一筆 quota:<name>:<用戶>:<序號> 租約，持有者當機時於 ttl 秒後失效。
+    未提供 db 時只在目前行程內計數。
+
+    Example:
+        quota = UserQuota(2, db=db, name='query')
+        with quota.acquire(user_key):
+            run_query()
+    """
+
+    def __init__(self, max_concurrent, label='查詢', db=None, name='query', ttl=600):
+        """
+        Args:
+            max_concurrent (int): 每位用戶同時進行中的上限
+            label (str): 錯誤訊息中的名稱，如「查詢」、「匯出」
+            db (Database, optional): 提供時跨 worker 計數（租約表）
+            name (str): 租約鍵中的配額名稱，不同配額互不影響
+            ttl (float): 名額租約的有效秒數，需大於單次查詢或匯出的最長耗時
+        """
+        self.max_concurrent = max_concurrent
+        self.label = label
+        self.db = db
+        self.name = name
+        self.ttl = ttl
+        self._active = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def acquire(self, user_key):
+        """
+        佔用一個名額
+
+        Raises:
+            QuotaExceeded: 該用戶進行中的查詢已達上限
+        """
+        with self._lock:
+            active = self._active.get(user_key, 0)
+            if active >= self.max_concurrent:
+                raise self._exceeded()
+            self._active[user_key] = active + 1
+        slot = None
+        try:
+            if self.db is not None:
+                slot = self._acquire_slot(user_key)
+            yield
+        finally:
+            if slot is not None:
+                self.db.release_query_lease(*slot)
+            with self._lock:
+                remaining = self._active.get(user_key, 1) - 1
+                if remaining:
+                    self._active[user_key] = remaining
+                else:
+                    self._active.pop(user_key, None)
+
+    def _acquire_slot(self, user_key):
+        """
+        於租約表取得一個名額（資料庫出錯時 acquire_query_lease 返回 True，不阻擋查詢）
+
+        Returns:
+            tuple: (租約鍵, 持有者)
+        """
+        owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        for index in range(self.max_concurrent):
+            slot_key = f"quota:{self.name}:{user_key}:{index}"
+            if self.db.acquire_query_lease(slot_key, owner, self.ttl):
+                return slot_key, owner
+        raise self._exceeded()
+
+    def _exceeded(self):
+        return QuotaExceeded(f'同時進行中的{self.label}已達上限 {self.max_concurrent} 個，請等待完成後再試')
+
+    def active(self, user_key):
+        """目前行程中該用戶佔用的名額數"""
+        with self._lock:
+            return self._active.get(user_key, 0)
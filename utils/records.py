@@ -0,0 +1,133 @@
+from decimal import Decimal
+from operator import attrgetter
+
+# API 與資料庫 JSON 使用的欄位（舊版字典格式）
+LEGACY_FIELDS = (
+    '公司代號', '公司名稱', '當月營收', '上月營收', '去年當月營收',
+    '上月比較增減(%)', '去年同月增減(%)', '月份'
+)
+
+
+def parse_int(value):
+    """將含千分位逗號的營收字串轉為整數，無法解析時返回 None"""
+    if isinstance(value, int):
+        return value
+    try:
+        text = str(value).replace(',', '').strip()
+        return int(text) if text.lstrip('-').isdigit() else int(float(text))
+    except (TypeError, ValueError, OverflowError):
+        return None
+
+
+def parse_float(value):
+    """將百分比字串轉為浮點數，無法解析時返回 None"""
+    if isinstance(value, float):
+        return value
+    try:
+        return float(str(value).replace(',', '').strip())
+    except (TypeError, ValueError):
+        return None
+
+
+def _format_int(value):
+    return '' if value is None else f'{value:,}'
+
+
+def _format_pct(value):
+    # 公開資訊觀測站的增減百分比為小數兩位；來源位數較多時以最短表示保留原精度
+    if value is None:
+        return ''
+    text = f'{value:.2f}'
+    return text if float(text) == value else format(Decimal(repr(value)), 'f')
+
+
+class RevenueRecord:
+    """
+    單筆月營收資料：以 __slots__ 保存已解析的數值欄位
+
+    從解析 HTML 到回應 API 都使用此型別，只在 API 邊界（to_dict）
+    才轉回舊版的中文鍵字典與千分位字串，排序與分組不再重複解析字串。
+
+    Example:
+        record = RevenueRecord.from_dict(item)
+        record.revenue        # 123456（整數）
+        record.to_dict()      # {'公司代號': '2330', ..., '當月營收': '123,456', ...}
+    """
+
+    __slots__ = (
+        'company_id', 'company_name', 'year', 'month', 'revenue',
+        'last_month_revenue', 'last_year_revenue', 'mom_change', 'yoy_change'
+    )
+
+    def __init__(self, company_id, company_name, year, month, revenue=None,
+                 last_month_revenue=None, last_year_revenue=None, mom_change=None, yoy_change=None):
+        self.company_id = company_id
+        self.company_name = company_name
+        self.year = year
+        self.month = month
+        self.revenue = revenue
+        self.last_month_revenue = last_month_revenue
+        self.last_year_revenue = last_year_revenue
+        self.mom_change = mom_change
+        self.yoy_change = yoy_change
+
+    @classmethod
+    def from_dict(cls, item):
+        """由舊版字典（API / 資料庫 JSON 格式）建立"""
+        year, month = item['月份'].split('-')
+        return cls(
+            item['公司代號'],
+            item.get('公司名稱', ''),
+            int(year),
+            int(month),
+            parse_int(item.get('當月營收')),
+            parse_int(item.get('上月營收')),
+            parse_int(item.get('去年當月營收')),
+            parse_float(item.get('上月比較增減(%)')),
+            parse_float(item.get('去年同月增減(%)'))
+        )
+
+    @classmethod
+    def coerce(cls, data):
+        """接受 RevenueRecord 或舊版字典，統一轉為 RevenueRecord"""
+        return data if isinstance(data, cls) else cls.from_dict(data)
+
+    @property
+    def period(self):
+        """月份字串，例如 '112-01'"""
+        return f'{self.year}-{self.month:02d}'
+
+    def to_dict(self):
+        """轉為舊版字典格式（只在 API 邊界與資料庫 JSON 使用）"""
+        return {
+            '公司代號': self.company_id,
+            '公司名稱': self.company_name,
+            '當月營收': _format_int(self.revenue),
+            '上月營收': _format_int(self.last_month_revenue),
+            '去年當月營收': _format_int(self.last_year_revenue),
+            '上月比較增減(%)': _format_pct(self.mom_change),
+            '去年同月增減(%)': _format_pct(self.yoy_change),
+            '月份': self.period
+        }
+
+    def __eq__(self, other):
+        if not isinstance(other, RevenueRecord):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __repr__(self):
+        return f'RevenueRecord({self.company_id} {self.period} revenue={self.revenue})'
+
+
+# 排序鍵：公司代號、年、月（數值排序，不再比較月份字串）
+record_sort_key = attrgetter('company_id', 'year', 'month')
+
+
+def to_records(items):
+    """將字典或 RevenueRecord 混合的列表統一轉為 RevenueRecord 列表"""
+    return [RevenueRecord.coerce(item) for item in items]
+
+
+def to_dicts(records):
+    """將 RevenueRecord 列表轉為 API 回應用的字典列表"""
+    return [record.to_dict() for record in records]
@@ -1,7 +1,5 @@
 # 在 utils/scraper.py 文件中修改進度追蹤相關代碼
 
-import requests
-from bs4 import BeautifulSoup
 from concurrent.futures import ThreadPoolExecutor
 import logging
 import os
@@ -10,23 +8,26 @@ import time
 from functools import lru_cache
 import random
 import threading
-from utils.database import Database
+from collections import Counter, OrderedDict, deque
+from config import Config
+from utils.database import get_db
+from utils.records import RevenueRecord
+from utils.page_parser import parse_page
+from utils.company_index import company_index
+from utils.memory_budget import estimate_size
 # 導入新的進度追蹤器
 from utils.progress_tracker import initialize, update_company, increment, complete, error, get_status
 # 導入計時裝飾器
 from utils.timer_decorator import timer_decorator
+from utils import tracing
 
 # 配置日誌
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 # 建立快取目錄
 CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'cache')
 os.makedirs(CACHE_DIR, exist_ok=True)
 
-#  建立 db 實例
-db_path = os.path.join(os.environ.get("DATABASE_DIR", "./data"), "data.db")
-db = Database(db_path)
 # 添加请求限制和退避策略
 REQUEST_DELAY = 0.001  # 基本延遲時間 (秒)
 MAX_WORKERS = 8  # 降低並行請求數
@@ -67,11 +68,248 @@ class AdaptiveThrottler:
 # 初始化throttler
 throttler = AdaptiveThrottler(initial_workers=3)
 
+# 抓取優先順序（數字越小越優先）：用戶查詢、過期資料背景更新、熱門查詢預先抓取、大型背景查詢
+INTERACTIVE = 0
+REVALIDATE = 1
+PREFETCH = 2
+BACKFILL = 3
+PRIORITY_NAMES = {INTERACTIVE: 'interactive', REVALIDATE: 'revalidate', PREFETCH: 'prefetch', BACKFILL: 'backfill'}
+
+
+class _PageRequest:
+    """排隊或抓取中的月份頁面，所有等待者共用同一份解析結果"""
+
+    def __init__(self, key, priority):
+        self.key = key
+        self.priority = priority
+        self.started = False
+        self.rows = None
+        self.event = threading.Event()
+
+
+class CrawlScheduler:
+    """
+    月營收頁面的抓取排程器：行程內所有向公開資訊觀測站的請求都經由此處
+
+    1. 以頁面（年、月）為單位：相同頁面不論排隊或抓取中只抓取、解析一次，結果供所有等待者共用，
+       完成後保留 page_ttl 秒，同一查詢的其他公司不必重新抓取
+    2. 依優先順序取出：用戶查詢 → 過期資料更新 → 預先抓取 → 大型背景查詢；
+       排隊中的頁面被更高優先的請求需要時提升順序
+    3. 同一優先順序內依用戶輪流取出，單一用戶的大量頁面不會擋住其他用戶
+    4. 同時抓取數依 throttler 調整；預先抓取與大型背景查詢至少保留一個名額給用戶查詢與過期資料更新
+
+    Example:
+        rows = crawl_scheduler.fetch_rows(112, 1, priority=INTERACTIVE, user_key='ip:127.0.0.1')
+    """
+
+    def __init__(self, throttler, page_ttl=120, page_cache_size=24, wait_timeout=600):
+        """
+        Args:
+            throttler (AdaptiveThrottler): 提供目前允許的同時抓取數
+            page_ttl (float): 已解析頁面保留秒數
+            page_cache_size (int): 最多保留的頁面數
+            wait_timeout (float): 等待單一頁面的最長秒數
+        """
+        self.throttler = throttler
+        self.page_ttl = page_ttl
+        self.page_cache_size = page_cache_size
+        self.wait_timeout = wait_timeout
+        # 各優先順序的佇列：用戶識別 → 該用戶排隊中的頁面（OrderedDict 的順序即輪流順序）
+        self._queues = {priority: OrderedDict() for priority in sorted(PRIORITY_NAMES)}
+        self._requests = {}
+        self._pages = OrderedDict()
+        self._active = 0
+        self._active_background = 0
+        self._cond = threading.Condition()
+        self._threads = []
+        self.stats = Counter()
+
+    def fetch_rows(self, year, month, priority=INTERACTIVE, user_key=None):
+        """
+        取得月份頁面的解析結果，排隊等待抓取
+
+        Args:
+            priority (int): INTERACTIVE / REVALIDATE / PREFETCH / BACKFILL
+            user_key (str, optional): 同一優先順序內輪流的用戶識別
+
+        Returns:
+            list or None: parse_page 的資料列，抓取或解析失敗時返回 None
+        """
+        key = (year, month)
+        with self._cond:
+            cached = self._pages.get(key)
+            if cached is not None and time.time() - cached[0] < self.page_ttl:
+                self.stats['page_hits'] += 1
+                return cached[1]
+            request = self._requests.get(key)
+            if request is None:
+                request = self._requests[key] = _PageRequest(key, priority)
+                self._enqueue(request, priority, user_key)
+                self.stats[f'queued_{PRIORITY_NAMES[priority]}'] += 1
+            else:
+                self.stats['deduplicated'] += 1
+                if priority < request.priority and not request.started:
+                    # 提升至較高優先的佇列，原佇列取出時略過
+                    request.priority = priority
+                    self._enqueue(request, priority, user_key)
+                    self.stats['promoted'] += 1
+            self._start_workers()
+            self._cond.notify_all()
+
+        with tracing.span('crawl_wait', priority=PRIORITY_NAMES[priority]):
+            if not request.event.wait(self.wait_timeout):
+                logger.warning(f"等待頁面 {year}/{month} 逾時")
+                return None
+        return request.rows
+
+    def _enqueue(self, request, priority, user_key):
+        users = self._queues[priority]
+        users.setdefault(user_key or 'system', deque()).append(request)
+
+    def _next_request(self):
+        """依優先順序與用戶輪流取出下一個頁面；名額已滿時返回 None（需持有 _cond）"""
+        limit = self.throttler.get_current_workers()
+        if self._active >= limit:
+            return None
+        background_limit = max(1, limit - 1)
+        for priority, users in self._queues.items():
+            if priority >= PREFETCH and self._active_background >= background_limit:
+                return None
+            while users:
+                user_key, queue = next(iter(users.items()))
+                request = queue.popleft()
+                # 該用戶移到隊尾，輪到下一位用戶
+                del users[user_key]
+                if queue:
+                    users[user_key] = queue
+                if request.started or request.priority != priority:
+                    continue
+                return request
+        return None
+
+    def _start_workers(self):
+        """第一次抓取時啟動抓取執行緒（gevent worker 下為 greenlet，需持有 _cond）"""
+        if self._threads:
+            return
+        for i in range(self.throttler.max_workers):
+            thread = threading.Thread(target=self._work, name=f'crawl-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _work(self):
+        while True:
+            with self._cond:
+                request = self._next_request()
+                while request is None:
+                    # 定期重新檢查：throttler 調整名額時不會通知
+                    self._cond.wait(timeout=1.0)
+                    request = self._next_request()
+                request.started = True
+                background = request.priority >= PREFETCH
+                self._active += 1
+                self._active_background += background
+
+            rows = None
+            try:
+                rows = self._fetch(*request.key)
+            except Exception as e:
+                logger.error(f"抓取頁面 {request.key} 時發生錯誤: {e}")
+            finally:
+                with self._cond:
+                    self._active -= 1
+                    self._active_background -= background
+                    self._requests.pop(request.key, None)
+                    if rows is not None:
+                        self._pages[request.key] = (time.time(), rows)
+                        self._pages.move_to_end(request.key)
+                        while len(self._pages) > self.page_cache_size:
+                            self._pages.popitem(last=False)
+                    self.stats['fetched' if rows is not None else 'failed'] += 1
+                    self._cond.notify_all()
+                request.rows = rows
+                request.event.set()
+
+    def _fetch(self, year, month):
+        """抓取並解析月份頁面（解析於行程池執行），同時收錄頁面上所有公司至名錄"""
+        url = Config.MOPS_PAGE_URL.format(year=year, month=month)
+        logger.info(f"🌐 抓取頁面：{year}/{month}")
+        page = fetch_url(url)
+        if not page:
+            logger.warning(f"❌ 抓取失敗：{year}/{month}")
+            self.throttler.report_failure()
+            return None
+        rows = parse_page(page)
+        if rows is None:
+            logger.warning(f"❌ 解析逾時：{year}/{month}")
+            return None
+        company_index.register([(row[0], row[1]) for row in rows])
+        self.throttler.report_success()
+        return rows
+
+    def status(self):
+        """各優先順序排隊中的頁面數、抓取中數量與累計統計"""
+        with self._cond:
+            queued = {
+                PRIORITY_NAMES[priority]: sum(
+                    1 for queue in users.values() for request in queue
+                    if not request.started and request.priority == priority
+                )
+                for priority, users in self._queues.items()
+            }
+            return {
+                'queued': queued,
+                'active': self._active,
+                'active_background': self._active_background,
+                'limit': self.throttler.get_current_workers(),
+                'cached_pages': len(self._pages),
+                'stats': dict(self.stats)
+            }
+
+    def page_entries(self):
+        """保留中的已解析頁面數"""
+        return len(self._pages)
+
+    def estimate_page_bytes(self):
+        """保留中已解析頁面的估計用量"""
+        return estimate_size(self._pages)
+
+    def evict_pages(self, bytes_to_free):
+        """
+        由最舊的頁面開始移除，直到估計回收 bytes_to_free
+
+        Returns:
+            int: 估計回收的 bytes
+        """
+        freed = 0
+        with self._cond:
+            while self._pages and freed < bytes_to_free:
+                _, item = self._pages.popitem(last=False)
+                freed += estimate_size(item)
+        return freed
+
+    def clear_pages(self):
+        """清除保留中的已解析頁面（效能測試量測冷抓取用）"""
+        with self._cond:
+            self._pages.clear()
+
+
+crawl_scheduler = CrawlScheduler(
+    throttler, page_ttl=Config.CRAWL_PAGE_TTL, page_cache_size=Config.CRAWL_PAGE_CACHE_SIZE
+)
+
+# 背景更新過期資料（stale-while-revalidate）
+_revalidate_executor = ThreadPoolExecutor(max_workers=2)
+_revalidating = set()
+_revalidating_lock = threading.Lock()
+
 
 # 使用退避策略的請求函數
 @timer_decorator(log_level='debug')
 def fetch_url(url, timeout=30):  # 增加默認超時時間
-    """獲取URL內容，帶有重試機制、退避策略和更寬鬆的超時設置"""
+    """獲取URL內容（原始位元組），帶有重試機制、退避策略和更寬鬆的超時設置"""
+    # requests 於第一次抓取時才載入，縮短 worker 啟動時間
+    import requests
+
     headers = {
         'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
         'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
@@ -91,9 +329,11 @@ def fetch_url(url, timeout=30):  # 增加默認超時時間
                 # 指數退避 + 隨機抖動
                 jitter = random.uniform(0.5, 1.5)
                 delay = base_delay * (2 ** attempt) * jitter
-                time.sleep(delay)
-            
-            response = session.get(url, timeout=timeout, headers=headers)
+                with tracing.span('backoff_sleep', attempt=attempt):
+                    time.sleep(delay)
+
+            with tracing.span('http_get', attempt=attempt + 1):
+                response = session.get(url, timeout=timeout, headers=headers)
             response.raise_for_status()
             
             # 檢查內容是否有效 (避免獲取到錯誤頁面)
@@ -102,8 +342,9 @@ def fetch_url(url, timeout=30):  # 增加默認超時時間
                     logger.error(f"網站返回錯誤頁面: {url}")
                     return None
                 continue  # 重試
-                
-            return response.text
+
+            # 返回原始位元組，由解析行程池處理編碼與解析
+            return response.content
             
         except requests.RequestException as e:
             logger.warning(f"第{attempt+1}次請求失敗: {url}, 錯誤: {e}")
@@ -111,57 +352,26 @@ def fetch_url(url, timeout=30):  # 增加默認超時時間
                 logger.error(f"請求失敗: {url}, 錯誤: {e}")
                 return None
 
-@timer_decorator(log_level='debug')
-def get_company_basic_data(company_id, year, month, html_content):
-    """從HTML內容解析特定公司的數據"""
-    if not html_content:
-        return {}
+def find_company_record(company_id, year, month, rows):
+    """從月份頁面的解析結果取出特定公司的數據
 
-    try:
-        soup = BeautifulSoup(html_content, 'html.parser')
-        target_table = soup.find('table')
-
-        if target_table:
-            rows = target_table.find_all('tr')[2:]  # 忽略前兩行
-
-            for row in rows:
-                columns = row.find_all('td')
-                if columns:
-                    fetched_company_id = columns[0].text.strip()
-                    if fetched_company_id == company_id:
-                        company_name = columns[1].text.strip().encode('latin-1').decode('big5', 'ignore')
-                        monthly_revenue = columns[2].text.strip()
-                        last_month_revenue = columns[3].text.strip()
-                        last_year_month_revenue = columns[4].text.strip()
-                        monthly_growth_rate = columns[5].text.strip()
-                        last_year_growth_rate = columns[6].text.strip()
-
-                        data = {
-                            '公司代號': fetched_company_id,
-                            '公司名稱': company_name,
-                            '當月營收': monthly_revenue,
-                            '上月營收': last_month_revenue,
-                            '去年當月營收': last_year_month_revenue,
-                            '上月比較增減(%)': monthly_growth_rate,
-                            '去年同月增減(%)': last_year_growth_rate,
-                            '月份': f'{year}-{month:02d}'
-                        }
-                        
-                        return data
-    except Exception as e:
-        logger.error(f"解析數據時發生錯誤: {e}")
-
-    return {}
+    Returns:
+        RevenueRecord or None: 找不到該公司時返回 None
+    """
+    for row in rows:
+        if row[0] == company_id:
+            return RevenueRecord(row[0], row[1], year, month, *row[2:])
+    return None
 
 @timer_decorator(log_level='info')
-def process_company_data(args):
+def process_company_data(args, force_fresh=False, stale_items=None, priority=INTERACTIVE, user_key=None):
     """統一入口：處理單一公司某月資料（含快取/爬取/入庫）"""
     company_id, year, month = args
     update_company(company_id, year, month)
 
     data = (
-        load_valid_db(company_id, year, month) or
-        fetch_and_process(company_id, year, month)
+        load_valid_db(company_id, year, month, force_fresh, stale_items) or
+        fetch_and_process(company_id, year, month, priority, user_key)
     )
 
     increment()
@@ -169,7 +379,7 @@ def process_company_data(args):
 
 
 @timer_decorator(log_level='debug')
-def load_valid_db(company_id, year, month):
+def load_valid_db(company_id, year, month, force_fresh=False, stale_items=None):
     """
     從資料庫讀取資料
     
@@ -177,58 +387,110 @@ def load_valid_db(company_id, year, month):
         company_id (str): 公司代碼
         year (int): 年份
         month (int): 月份
+        force_fresh (bool): 是否忽略資料庫、強制即時抓取
+        stale_items (list, optional): 收集使用了過期資料的項目
     
     Returns:
-        dict or None: 有效的資料庫數據，若無效則返回 None
+        RevenueRecord or None: 有效的資料庫數據，若無效則返回 None
     """
+    if force_fresh:
+        return None
+
     # 直接從資料庫讀取資料
-    db_data = db.get_revenue_data(company_id, year, month)
+    db_data = get_db().get_revenue_data(company_id, year, month, max_age_days=Config.REVENUE_MAX_AGE_DAYS)
     
     # 如果資料存在，直接返回
     if db_data:
-        logger.info(f"📦 使用資料庫數據：{company_id} {year}/{month}")
+        logger.debug(f"📦 使用資料庫數據：{company_id} {year}/{month}")
         return db_data
+
+    # 過期但仍在容許範圍內的資料：先返回，再於背景更新
+    if Config.STALE_WHILE_REVALIDATE:
+        stale_data, age_days = get_db().get_stale_revenue_data(
+            company_id, year, month, max_stale_days=Config.REVENUE_MAX_STALE_DAYS
+        )
+        if stale_data:
+            logger.info(f"♻️ 使用過期資料庫數據（{age_days:.1f} 天）：{company_id} {year}/{month}")
+            if stale_items is not None:
+                stale_items.append(f"{company_id} {year}-{month:02d}")
+            schedule_revalidation(company_id, year, month)
+            return stale_data
     
     # 若無資料，返回 None
     return None
 
+
+def schedule_revalidation(company_id, year, month):
+    """將過期資料排入背景更新，同一筆資料同時只排一次"""
+    key = (company_id, year, month)
+    with _revalidating_lock:
+        if key in _revalidating:
+            return
+        _revalidating.add(key)
+    _revalidate_executor.submit(_revalidate, key)
+
+
+def _revalidate(key):
+    """背景重新抓取過期資料並入庫"""
+    company_id, year, month = key
+    try:
+        fetch_and_process(company_id, year, month, priority=REVALIDATE)
+    except Exception as e:
+        logger.error(f"背景更新資料時發生錯誤: {company_id} {year}/{month}: {e}")
+    finally:
+        with _revalidating_lock:
+            _revalidating.discard(key)
+
 @timer_decorator(log_level='info', log_args=True)
-def fetch_and_process(company_id, year, month):
-    """無快取時，進行抓取 + 解析 + 入庫"""
-    url = f"https://mopsov.twse.com.tw/nas/t21/sii/t21sc03_{year}_{month}_0.html"
+def fetch_and_process(company_id, year, month, priority=INTERACTIVE, user_key=None):
+    """無快取時，經由抓取排程器取得月份頁面 + 取出該公司 + 入庫
+
+    Args:
+        priority (int): 抓取優先順序（INTERACTIVE / REVALIDATE / PREFETCH / BACKFILL）
+        user_key (str, optional): 同一優先順序內輪流的用戶識別
+    """
     logger.info(f"🌐 開始爬蟲：{company_id} {year}/{month}")
 
-    html = fetch_url(url)
-    if not html:
+    rows = crawl_scheduler.fetch_rows(year, month, priority, user_key)
+    if rows is None:
         logger.warning(f"❌ 抓取失敗：{company_id} {year}/{month}")
-        throttler.report_failure()
         return None
 
-    data = get_company_basic_data(company_id, year, month, html)
+    data = find_company_record(company_id, year, month, rows)
     if not data:
         logger.warning(f"⚠️ 解析結果為空：{company_id} {year}/{month}")
-        throttler.report_failure()
         return None
 
     # ✅ 寫入快取與資料庫
     # 移除 save_to_file_cache，改為直接寫入資料庫
     # save_to_file_cache(company_id, year, month, data)
-    db.insert_revenue_data(company_id, year, month, data)
-    throttler.report_success()
+    get_db().insert_revenue_data(company_id, year, month, data)
 
     return data
 
 # 修改 get_company_data 函数
 @timer_decorator(log_level='info', log_args=True)
-def get_company_data(company_ids, year_range, month_range):
-    """并行抓取指定公司在指定年月范围内的数据"""
+def get_company_data(company_ids, year_range, month_range, force_fresh=False, stale_items=None,
+                     priority=INTERACTIVE, user_key=None):
+    """并行抓取指定公司在指定年月范围内的数据
+
+    Args:
+        force_fresh (bool): 是否忽略资料库快取、强制即时抓取
+        stale_items (list, optional): 收集以过期资料回应的项目（背景会更新）
+        priority (int): 向上游抓取的优先顺序（背景查询工作为 BACKFILL）
+        user_key (str, optional): 抓取排程器中轮流的用户识别
+
+    Returns:
+        list: RevenueRecord 列表
+    """
     # 初始化进度追踪
     total_tasks = len(company_ids) * len(year_range) * len(month_range)
     initialize(total_tasks)
     
-    # 生成所有任务参数
-    tasks = [(company_id, year, month) for company_id in company_ids 
-             for year in year_range for month in month_range]
+    # 生成所有任务参数：依月份頁面排序（同一頁面的公司相鄰），
+    # 每個頁面抓取後立即被所有公司取用，頁面數超過排程器的頁面快取時也不會重複抓取
+    tasks = [(company_id, year, month) for year in year_range for month in month_range
+             for company_id in company_ids]
     
     results = []
     
@@ -236,7 +498,12 @@ def get_company_data(company_ids, year_range, month_range):
         # 使用线程池并行执行，但限制同时执行的任务数量
         with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
             # 提交所有任务
-            future_to_task = {executor.submit(process_company_data, task): task for task in tasks}
+            future_to_task = {
+                executor.submit(
+                    tracing.bind(process_company_data), task, force_fresh, stale_items, priority, user_key
+                ): task
+                for task in tasks
+            }
             
             # 收集结果
             for future in future_to_task:
@@ -2,21 +2,26 @@ import time
 import functools
 import logging
 
+from config import Config
+from utils.metrics import metrics
+from utils import tracing
+
 # 配置日誌
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def timer_decorator(log_level='info', log_args=False):
+def timer_decorator(log_level='info', log_args=False, slow_threshold=None):
     """
-    計時裝飾器：測量函數執行時間並記錄到日誌
-    
+    計時裝飾器：將函數執行時間記錄到指標直方圖（/metrics），只有慢呼叫與例外寫入日誌；
+    在追蹤中的請求內呼叫時，同時記錄為一個 span
+
     Args:
-        log_level (str): 日誌級別 ('debug', 'info', 'warning', 'error')
-        log_args (bool): 是否記錄函數參數
-    
+        log_level (str): 慢呼叫日誌級別 ('debug', 'info', 'warning', 'error')，最低為 warning
+        log_args (bool): 慢呼叫日誌是否記錄函數參數
+        slow_threshold (float, optional): 慢呼叫門檻（秒），預設為 Config.SLOW_CALL_THRESHOLD
+
     Returns:
         function: 裝飾器函數
-    
+
     Example:
         @timer_decorator(log_level='info', log_args=True)
         def my_function(x, y):
@@ -24,63 +29,48 @@ def timer_decorator(log_level='info', log_args=False):
             return x + y
     """
     def decorator(func):
+        # 函數名稱於裝飾時決定一次，每次呼叫只做計時與直方圖計數
+        name = f"{func.__module__}.{func.__qualname__}"
+        span_name = func.__qualname__
+        histogram = metrics.histogram(name)
+        threshold = Config.SLOW_CALL_THRESHOLD if slow_threshold is None else slow_threshold
+        level = max(logging.getLevelName(log_level.upper()) if isinstance(log_level, str) else logging.INFO,
+                    logging.WARNING)
+
         @functools.wraps(func)
         def wrapper(*args, **kwargs):
-            # 記錄開始時間
-            start_time = time.time()
-            
-            # 記錄函數執行開始
-            func_name = func.__qualname__  # 獲取完整函數名（包括類名）
-            module_name = func.__module__  # 獲取模組名
-            
-            # 準備日誌訊息
-            start_msg = f"開始執行 {module_name}.{func_name}"
-            
-            # 如果需要記錄參數
-            if log_args and (args or kwargs):
-                args_str = ', '.join(repr(arg) for arg in args)
-                kwargs_str = ', '.join(f"{k}={repr(v)}" for k, v in kwargs.items())
-                params = []
-                if args_str:
-                    params.append(args_str)
-                if kwargs_str:
-                    params.append(kwargs_str)
-                params_str = ', '.join(params)
-                start_msg += f" 參數：{params_str}"
-            
-            # 根據指定級別記錄日誌
-            log_func = getattr(logger, log_level.lower(), logger.info)
-            log_func(start_msg)
-            
+            span = tracing.start_span(span_name)
+            start_time = time.perf_counter()
             try:
-                # 執行被裝飾的函數
                 result = func(*args, **kwargs)
-                
-                # 計算執行時間
-                end_time = time.time()
-                execution_time = end_time - start_time
-                
-                # 記錄執行結束和時間
-                log_func(f"完成執行 {module_name}.{func_name} - 耗時: {execution_time:.6f} 秒")
-                
-                return result
             except Exception as e:
-                # 計算執行時間（即使發生異常）
-                end_time = time.time()
-                execution_time = end_time - start_time
-                
-                # 記錄異常信息
-                logger.error(f"執行 {module_name}.{func_name} 時發生錯誤 - 耗時: {execution_time:.6f} 秒 - 錯誤: {str(e)}")
-                
-                # 重新拋出異常
+                execution_time = time.perf_counter() - start_time
+                if span is not None:
+                    span.end(error=e)
+                metrics.observe(name, execution_time, error=True)
+                logger.error(f"執行 {name} 時發生錯誤 - 耗時: {execution_time:.6f} 秒 - 錯誤: {str(e)}")
                 raise
-        
+
+            execution_time = time.perf_counter() - start_time
+            if span is not None:
+                span.end()
+            histogram.observe(execution_time)
+            if execution_time >= threshold:
+                message = f"慢呼叫 {name} - 耗時: {execution_time:.6f} 秒"
+                # 只有慢呼叫才格式化參數
+                if log_args and (args or kwargs):
+                    params = [repr(arg) for arg in args]
+                    params.extend(f"{k}={repr(v)}" for k, v in kwargs.items())
+                    message += f" 參數：{', '.join(params)}"
+                logger.log(level, message)
+            return result
+
         return wrapper
-    
+
     # 支持不帶參數的裝飾器用法
     if callable(log_level):
         func = log_level
         log_level = 'info'
         return decorator(func)
-    
+
     return decorator
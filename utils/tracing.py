@@ -0,0 +1,339 @@
+import os
+import json
+import time
+import queue
+import random
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+
+
+# 配置日誌
+logger = logging.getLogger(__name__)
+
+# 目前的 span；contextvars 在 gevent greenlet 之間各自獨立，
+# 送入執行緒池的工作需以 bind() 帶入呼叫端的 context
+_current_span = contextvars.ContextVar('current_span', default=None)
+
+# 單一追蹤最多保留的 span 數，避免大型查詢（數千個任務）佔用過多記憶體
+MAX_SPANS = 5000
+# Server-Timing 標頭最多列出的項目數（依耗時排序）
+SERVER_TIMING_LIMIT = 12
+
+
+def _new_id(bits):
+    return f'{random.getrandbits(bits):0{bits // 4}x}'
+
+
+class Trace:
+    """
+    單一請求（或背景工作）的追蹤：trace_id 與所有已結束的 span
+
+    Attributes:
+        trace_id (str): 32 字元十六進位追蹤代號（W3C trace context 格式）
+        spans (list): 已結束的 Span
+        dropped (int): 超過 MAX_SPANS 而未保留的 span 數
+    """
+
+    def __init__(self, trace_id=None):
+        self.trace_id = trace_id or _new_id(128)
+        self.spans = []
+        self.dropped = 0
+        self._lock = threading.Lock()
+
+    def add(self, span):
+        with self._lock:
+            if len(self.spans) < MAX_SPANS:
+                self.spans.append(span)
+            else:
+                self.dropped += 1
+
+    def breakdown(self):
+        """
+        依 span 名稱彙總耗時（並行執行的 span 會重疊，加總可能大於請求總時間）
+
+        Returns:
+            list: [(名稱, 總毫秒, 次數), ...]，依總耗時遞減排序
+        """
+        totals = {}
+        with self._lock:
+            spans = list(self.spans)
+        for span in spans:
+            total, count = totals.get(span.name, (0.0, 0))
+            totals[span.name] = (total + span.duration * 1000, count + 1)
+        return sorted(
+            ((name, total, count) for name, (total, count) in totals.items()),
+            key=lambda item: item[1], reverse=True
+        )
+
+
+class Span:
+    """一段計時的工作，結束時加入所屬的 Trace"""
+
+    __slots__ = ('trace', 'name', 'span_id', 'parent_id', 'attributes', 'start_ns', 'duration',
+                 'error', '_start', '_token')
+
+    def __init__(self, trace, name, parent_id=None, attributes=None):
+        self.trace = trace
+        self.name = name
+        self.span_id = _new_id(64)
+        self.parent_id = parent_id
+        self.attributes = attributes or {}
+        self.start_ns = time.time_ns()
+        self.duration = 0.0
+        self.error = None
+        self._start = time.perf_counter()
+        self._token = _current_span.set(self)
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def end(self, error=None):
+        self.duration = time.perf_counter() - self._start
+        if error is not None:
+            self.error = str(error)
+        try:
+            _current_span.reset(self._token)
+        except (ValueError, RuntimeError):
+            # 在不同的 context 結束（例如串流回應的 generator），直接清除
+            _current_span.set(None)
+        self.trace.add(self)
+
+    def to_dict(self):
+        return {
+            'trace_id': self.trace.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'start_ns': self.start_ns,
+            'duration_ms': round(self.duration * 1000, 3),
+            'attributes': self.attributes,
+            'error': self.error
+        }
+
+
+def current_span():
+    """目前的 span，不在追蹤中時返回 None"""
+    return _current_span.get()
+
+
+def current_trace_id():
+    span = _current_span.get()
+    return span.trace.trace_id if span is not None else None
+
+
+def start_trace(name, traceparent=None, **attributes):
+    """
+    開始新的追蹤並返回根 span（需呼叫 end() 結束）
+
+    Args:
+        name (str): 根 span 名稱
+        traceparent (str, optional): W3C traceparent 標頭，沿用上游的 trace_id 與 parent span
+    """
+    trace_id = parent_id = None
+    if traceparent:
+        parts = traceparent.split('-')
+        if len(parts) == 4 and len(parts[1]) == 32 and len(parts[2]) == 16:
+            trace_id, parent_id = parts[1], parts[2]
+    return Span(Trace(trace_id), name, parent_id, attributes)
+
+
+def start_span(name, **attributes):
+    """於目前的追蹤下開始子 span；不在追蹤中時返回 None"""
+    parent = _current_span.get()
+    if parent is None:
+        return None
+    return Span(parent.trace, name, parent.span_id, attributes)
+
+
+@contextmanager
+def span(name, **attributes):
+    """
+    子 span 的 context manager，不在追蹤中時不做任何事
+
+    Example:
+        with tracing.span('cache.get', key=cache_key):
+            cached = cache.get(cache_key)
+    """
+    child = start_span(name, **attributes)
+    if child is None:
+        yield None
+        return
+    try:
+        yield child
+    except BaseException as e:
+        child.end(error=e)
+        raise
+    child.end()
+
+
+@contextmanager
+def trace(name, **attributes):
+    """
+    背景工作等非請求流程的追蹤，結束時匯出
+
+    Example:
+        with tracing.trace('query_job', job_id=job_id):
+            run()
+    """
+    root = start_trace(name, **attributes)
+    try:
+        yield root
+    except BaseException as e:
+        root.end(error=e)
+        export(root)
+        raise
+    root.end()
+    export(root)
+
+
+def bind(func):
+    """
+    將函數綁定到呼叫端的 context，送入執行緒池後 span 仍歸屬同一追蹤
+
+    Example:
+        executor.submit(tracing.bind(process_company_data), task)
+    """
+    if _current_span.get() is None:
+        return func
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.copy().run(func, *args, **kwargs)
+
+
+def server_timing(root):
+    """
+    產生 Server-Timing 標頭值：請求總耗時與各階段彙總（名稱;dur=總毫秒;desc="次數"）
+    """
+    entries = [f'total;dur={root.duration * 1000:.1f}']
+    for name, total, count in root.trace.breakdown():
+        if name == root.name:
+            continue
+        entries.append(f'{name};dur={total:.1f};desc="x{count}"')
+        if len(entries) > SERVER_TIMING_LIMIT:
+            break
+    return ', '.join(entries)
+
+
+# ---- 匯出 ----
+
+class _Exporter:
+    """背景執行緒批次匯出已完成的追蹤；佇列已滿時丟棄，不影響請求"""
+
+    def __init__(self, write, max_queue=1000):
+        self._write = write
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = threading.Thread(target=self._run, name='trace-exporter', daemon=True)
+        self._thread.start()
+
+    def submit(self, trace):
+        try:
+            self._queue.put_nowait(trace)
+        except queue.Full:
+            logger.debug(f"追蹤匯出佇列已滿，丟棄 {trace.trace_id}")
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < 100:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._write(batch)
+            except Exception as e:
+                logger.warning(f"匯出追蹤時出錯: {e}")
+
+
+def _file_writer(path):
+    """以 JSON Lines 寫入本機檔案，每行一個 span"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    def write(traces):
+        with open(path, 'a', encoding='utf-8') as f:
+            for item in traces:
+                for span_ in item.spans:
+                    f.write(json.dumps(span_.to_dict(), ensure_ascii=False, default=str) + '\n')
+    return write
+
+
+def _otlp_attribute(key, value):
+    if isinstance(value, bool):
+        return {'key': key, 'value': {'boolValue': value}}
+    if isinstance(value, int):
+        return {'key': key, 'value': {'intValue': str(value)}}
+    if isinstance(value, float):
+        return {'key': key, 'value': {'doubleValue': value}}
+    return {'key': key, 'value': {'stringValue': str(value)}}
+
+
+def to_otlp(traces, service_name='twse-revenue'):
+    """轉為 OTLP/HTTP JSON 格式（ExportTraceServiceRequest）"""
+    spans = []
+    for item in traces:
+        for span_ in item.spans:
+            otlp_span = {
+                'traceId': item.trace_id,
+                'spanId': span_.span_id,
+                'name': span_.name,
+                'kind': 1,
+                'startTimeUnixNano': str(span_.start_ns),
+                'endTimeUnixNano': str(span_.start_ns + int(span_.duration * 1e9)),
+                'attributes': [_otlp_attribute(key, value) for key, value in span_.attributes.items()],
+                'status': {'code': 2, 'message': span_.error} if span_.error else {'code': 1}
+            }
+            if span_.parent_id:
+                otlp_span['parentSpanId'] = span_.parent_id
+            spans.append(otlp_span)
+    return {
+        'resourceSpans': [{
+            'resource': {'attributes': [_otlp_attribute('service.name', service_name)]},
+            'scopeSpans': [{'scope': {'name': __name__}, 'spans': spans}]
+        }]
+    }
+
+
+def _otlp_writer(endpoint, service_name):
+    """POST 至 OTLP/HTTP 收集器（例如 http://localhost:4318/v1/traces）"""
+    import requests
+    session = requests.Session()
+
+    def write(traces):
+        response = session.post(endpoint, json=to_otlp(traces, service_name), timeout=5)
+        response.raise_for_status()
+    return write
+
+
+_exporter = None
+_sample_rate = 0.0
+
+
+def configure(exporter=None, file_path=None, otlp_endpoint=None, sample_rate=1.0,
+              service_name='twse-revenue'):
+    """
+    設定追蹤匯出方式
+
+    Args:
+        exporter (str): 'file'、'otlp'，或 None（只產生 Server-Timing，不匯出）
+        file_path (str): exporter 為 file 時的 JSON Lines 檔案路徑
+        otlp_endpoint (str): exporter 為 otlp 時的收集器網址
+        sample_rate (float): 匯出的請求比例（0-1）
+    """
+    global _exporter, _sample_rate
+    _sample_rate = sample_rate
+    if exporter == 'file' and file_path:
+        _exporter = _Exporter(_file_writer(file_path))
+    elif exporter == 'otlp' and otlp_endpoint:
+        _exporter = _Exporter(_otlp_writer(otlp_endpoint, service_name))
+    else:
+        _exporter = None
+    logger.info(f"追蹤匯出: {exporter or '停用'}（取樣率 {sample_rate}）")
+
+
+def export(root):
+    """依取樣率匯出已結束的追蹤"""
+    if _exporter is not None and random.random() < _sample_rate:
+        _exporter.submit(root.trace)
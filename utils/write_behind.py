@@ -0,0 +1,198 @@
+import time
+import atexit
+import logging
+import threading
+from collections import OrderedDict
+
+# 配置日誌
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindQueue:
+    """
+    延遲寫入佇列：由單一寫入執行緒將待寫資料分批寫入
+
+    - 同一個鍵在寫入前被多次更新時只保留最新值
+    - 待寫數量達到 batch_size 或距第一筆待寫超過 flush_interval 秒時寫入一批
+    - 只由單一寫入執行緒寫入；flush 通知寫入執行緒並等待寫完
+    - 行程結束時（atexit）會把剩餘資料全部寫完
+    - 寫入失敗（如資料庫鎖定）時退避重試，仍失敗則放回待寫佇列（已有較新值的鍵除外），下一批再寫
+    - 寫入執行緒在第一次 put 時才啟動，避免 gunicorn --preload 時在 master 行程建立執行緒
+
+    Example:
+        queue = WriteBehindQueue(lambda items: save_many(items), batch_size=200)
+        queue.put(('2330', 112, 1), data)
+    """
+
+    def __init__(self, flush_func, batch_size=200, flush_interval=0.5, name='write-behind',
+                 retries=3, retry_delay=0.5):
+        """
+        Args:
+            flush_func (callable): 接收 [(key, value), ...] 並在同一個交易中寫入，失敗時需拋出例外
+            batch_size (int): 每批最多寫入的筆數
+            flush_interval (float): 待寫資料最長等待秒數
+            name (str): 寫入執行緒名稱
+            retries (int): 單批寫入失敗後的重試次數
+            retry_delay (float): 第一次重試前等待秒數，之後逐次加倍
+        """
+        self.flush_func = flush_func
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.name = name
+        self.retries = retries
+        self.retry_delay = retry_delay
+        # 重試後仍失敗、放回佇列的批次數與筆數
+        self.failed_batches = 0
+        self.failed_items = 0
+        self._pending = OrderedDict()
+        self._flushing = {}
+        self._first_pending_at = None
+        self._cond = threading.Condition()
+        self._thread = None
+        self._closed = False
+        # 等待中的 flush 數：大於 0 時寫入執行緒不等 flush_interval，立即寫入
+        self._draining = 0
+        atexit.register(self.close)
+
+    def put(self, key, value):
+        """加入待寫資料"""
+        with self._cond:
+            closed = self._closed
+            if not closed:
+                self._pending[key] = value
+                self._pending.move_to_end(key)
+                if self._first_pending_at is None:
+                    self._first_pending_at = time.monotonic()
+                self._ensure_thread()
+                if len(self._pending) >= self.batch_size:
+                    self._cond.notify_all()
+        if closed:
+            # 已關閉時直接同步寫入，避免資料遺失
+            if not self._write([(key, value)]):
+                logger.error(f"{self.name} 已關閉，無法寫入 {key}")
+
+    def get_pending(self, key):
+        """查詢尚未寫入資料庫的資料，讓讀取端可以看到待寫內容"""
+        with self._cond:
+            if key in self._pending:
+                return self._pending[key]
+            return self._flushing.get(key)
+
+    def pending_count(self):
+        """目前待寫（含寫入中）的筆數"""
+        with self._cond:
+            return len(self._pending) + len(self._flushing)
+
+    def flush(self, timeout=None):
+        """
+        等待寫入執行緒寫完所有待寫資料（不在呼叫端執行緒寫入，維持單一寫入者，
+        同一個鍵的新舊值不會並行提交而讓舊值覆蓋新值）
+
+        Args:
+            timeout (float, optional): 最長等待秒數，None 表示等到寫完或寫入失敗
+
+        Returns:
+            bool: 全部寫入成功；寫入失敗或逾時時返回 False（失敗的資料已放回待寫佇列）
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            if not self._pending and not self._flushing:
+                return True
+            failures = self.failed_batches
+            self._draining += 1
+            self._ensure_thread()
+            self._cond.notify_all()
+            try:
+                while (self._pending or self._flushing) and self.failed_batches == failures:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                return not self._pending and not self._flushing
+            finally:
+                self._draining -= 1
+
+    def close(self):
+        """停止寫入執行緒，結束前寫完剩餘資料"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout=10)
+        remaining = self.pending_count()
+        if remaining:
+            logger.error(f"{self.name} 關閉時仍有 {remaining} 筆資料未寫入")
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def _take_batch(self, size):
+        """從待寫佇列取出一批資料（呼叫時需持有鎖）"""
+        batch = []
+        while self._pending and len(batch) < size:
+            batch.append(self._pending.popitem(last=False))
+        self._flushing.update(batch)
+        self._first_pending_at = time.monotonic() if self._pending else None
+        return batch
+
+    def _ready(self):
+        """距離寫入下一批還需等待的秒數，0 以下表示立即寫入（呼叫時需持有鎖，且有待寫資料）"""
+        if self._closed or self._draining or len(self._pending) >= self.batch_size:
+            return 0
+        return self.flush_interval - (time.monotonic() - self._first_pending_at)
+
+    def _run(self):
+        """唯一的寫入執行緒：關閉時寫完剩餘資料才結束"""
+        while True:
+            with self._cond:
+                while True:
+                    if not self._pending:
+                        if self._closed:
+                            return
+                        self._cond.wait()
+                        continue
+                    remaining = self._ready()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = self._take_batch(self.batch_size)
+            if not self._write_and_release(batch) and self._closed:
+                # 關閉中仍寫入失敗：不再重試，由 close 記錄未寫入的筆數
+                return
+
+    def _write_and_release(self, batch):
+        """寫入一批，失敗時放回待寫佇列；返回是否成功"""
+        written = False
+        try:
+            written = self._write(batch)
+        finally:
+            with self._cond:
+                if not written:
+                    self.failed_batches += 1
+                    self.failed_items += len(batch)
+                    for key, value in batch:
+                        # 寫入期間已有較新值的鍵以新值為準
+                        if key not in self._pending:
+                            self._pending[key] = value
+                    if self._pending and self._first_pending_at is None:
+                        self._first_pending_at = time.monotonic()
+                for key, _ in batch:
+                    self._flushing.pop(key, None)
+                # 喚醒等待 flush 的呼叫端
+                self._cond.notify_all()
+        return written
+
+    def _write(self, batch):
+        """寫入一批，失敗時退避重試；返回是否成功"""
+        for attempt in range(self.retries + 1):
+            try:
+                self.flush_func(batch)
+                return True
+            except Exception as e:
+                logger.error(f"{self.name} 批次寫入 {len(batch)} 筆資料時出錯（第 {attempt + 1} 次）: {e}")
+            if attempt < self.retries:
+                time.sleep(self.retry_delay * (2 ** attempt))
+        return False